@@ -1,66 +1,348 @@
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutTimeoutError
-from .models import AnalysisJob
-from .gemini import generate_resume_analysis, generate_full_resume, generate_cover_letter
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
 
-def _run_analysis(job_id, generate_full_resume_flag, generate_cover_letter_flag):
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+
+from .cancellation import CancelToken, JobCancelled
+from .models import AnalysisJob, GenerationChunk
+from .gemini import (
+    PROMPT_BUILDERS,
+    generate_combined,
+    generate_cover_letter,
+    generate_full_resume,
+    generate_resume_analysis,
+    stream_generation,
+)
+from .cache import get_generation_cache
+from .metrics import ANALYSIS_JOBS, JobTimings
+from .preprocessing import estimate_tokens, preprocess_inputs
+from .scoring import score_match
+from .ratelimit import PRIORITY_STANDARD
+
+# Seconds a whole analysis job may run, from the moment a worker starts it; generations and
+# LLM calls get whatever is left. Keep it below ANALYSIS_QUEUE["LEASE_SECONDS"], or another
+# worker may reclaim a job that is still running.
+DEFAULT_JOB_TIMEOUT = 100
+
+# Jobs a worker may still start or write to. CANCELLED and the finished statuses are final.
+ACTIVE_STATUSES = ('PENDING', 'IN_PROGRESS')
+
+# Seconds each generation may take before it is abandoned and reported as timed out.
+DEFAULT_GENERATION_TIMEOUTS = {
+    'analysis_result': 30,
+    'generated_resume': 45,
+    'generated_cover_letter': 45,
+}
+
+GENERATION_LABELS = {
+    'analysis_result': 'analysis',
+    'generated_resume': 'full resume',
+    'generated_cover_letter': 'cover letter',
+}
+
+
+DEFAULT_STREAMING_SETTINGS = {
+    "ENABLED": False,
+    "FLUSH_CHARS": 200,
+    "FLUSH_SECONDS": 0.25,
+    "POLL_INTERVAL": 0.25,
+    # Longest time /jobs/<id>/poll holds a request open before answering 304.
+    "LONG_POLL_TIMEOUT": 25,
+}
+
+
+def job_timeout():
+    return getattr(settings, 'ANALYSIS_JOB_TIMEOUT', DEFAULT_JOB_TIMEOUT)
+
+
+def generation_timeout(field):
+    return getattr(settings, 'ANALYSIS_GENERATION_TIMEOUTS', {}).get(field, DEFAULT_GENERATION_TIMEOUTS[field])
+
+
+def generation_mode():
     """
-    The core analysis logic that will be run in a separate thread.
+    'separate' sends one prompt per result; 'combined' asks for all of a job's results in one prompt.
     """
+    return getattr(settings, 'ANALYSIS_GENERATION_MODE', 'separate')
+
+
+def streaming_setting(name):
+    return getattr(settings, 'ANALYSIS_STREAMING', {}).get(name, DEFAULT_STREAMING_SETTINGS[name])
+
+
+def streaming_generator(job_id, field, priority=PRIORITY_STANDARD, timeout=None, cancelled=None):
+    """
+    Returns a generation function that streams `field` from Gemini and returns the full text.
+
+    Chunks are buffered and relayed as GenerationChunk rows, which `api.views.stream_job`
+    pushes to clients as server-sent events while the generation is still running.
+    """
+    def generate(job_description, resume_text):
+        flush_chars = streaming_setting("FLUSH_CHARS")
+        flush_seconds = streaming_setting("FLUSH_SECONDS")
+        parts, buffer, last_flush = [], [], time.monotonic()
+
+        def flush():
+            if buffer:
+                GenerationChunk.objects.create(job_id=job_id, field=field, text=''.join(buffer))
+                buffer.clear()
+
+        chunks = stream_generation(
+            field, job_description, resume_text, priority=priority, timeout=timeout, cancelled=cancelled
+        )
+        for text in chunks:
+            parts.append(text)
+            buffer.append(text)
+            if sum(map(len, buffer)) >= flush_chars or time.monotonic() - last_flush >= flush_seconds:
+                flush()
+                last_flush = time.monotonic()
+        flush()
+        return ''.join(parts)
+
+    return generate
+
+
+def _close_connections_after(func):
+    def run(*args):
+        try:
+            return func(*args)
+        finally:
+            # Generation threads are short-lived; don't leak their DB connections.
+            connections.close_all()
+    return run
+
+
+def run_generations(generations, job_description, resume_text, on_result, token=None):
+    """
+    Runs the given generations concurrently, each against its own timeout.
+
+    `generations` maps a result field name to a generator function. `on_result(field, text, ok)`
+    is called from the calling thread as soon as each generation finishes, fails or times out,
+    so callers can persist partial results. Returns a dict of field -> ok.
+
+    With a CancelToken, timeouts are capped at the job's deadline and the wait is abandoned
+    (raising JobCancelled) as soon as the token is cancelled.
+    """
+    outcomes = {}
+    if not generations:
+        return outcomes
+
+    executor = ThreadPoolExecutor(max_workers=len(generations), thread_name_prefix='generation')
     try:
-        job = AnalysisJob.objects.get(id=job_id)
-        job.status = 'IN_PROGRESS'
-        job.save()
+        started = time.monotonic()
+        futures = {
+            executor.submit(_close_connections_after(func), job_description, resume_text): field
+            for field, func in generations.items()
+        }
+        deadlines = {
+            future: started + (token.remaining(generation_timeout(field)) if token else generation_timeout(field))
+            for future, field in futures.items()
+        }
+        pending = set(futures)
 
-        # Sanitize and limit input size (as per instructions)
-        job_description = job.job_description[:20000]
-        resume_text = job.resume_text[:20000]
+        while pending:
+            timeout = max(0, min(deadlines[future] for future in pending) - time.monotonic())
+            if token is not None:
+                token.check()
+                timeout = min(timeout, token.poll_interval)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
 
-        # Always generate basic analysis
-        analysis_result = generate_resume_analysis(job_description, resume_text)
-        job.analysis_result = analysis_result
+            for future in done:
+                field = futures[future]
+                try:
+                    text, ok = future.result(), True
+                except Exception as e:
+                    text, ok = f"An error occurred while generating the {GENERATION_LABELS[field]}: {e}", False
+                outcomes[field] = ok
+                on_result(field, text, ok)
 
-        # Generate premium content if flags are set
-        if generate_full_resume_flag:
-            full_resume = generate_full_resume(job_description, resume_text)
-            job.generated_resume = full_resume
+            now = time.monotonic()
+            for future in [f for f in pending if deadlines[f] <= now]:
+                pending.discard(future)
+                future.cancel()
+                field = futures[future]
+                outcomes[field] = False
+                on_result(field, f"Generating the {GENERATION_LABELS[field]} timed out. Please try again.", False)
+    finally:
+        # Don't block on generations that overran their timeout; their results are discarded.
+        executor.shutdown(wait=False, cancel_futures=True)
+    return outcomes
 
-        if generate_cover_letter_flag:
-            cover_letter = generate_cover_letter(job_description, resume_text)
-            job.generated_cover_letter = cover_letter
 
-        job.status = 'COMPLETED'
-        job.save()
-        return job
-    except Exception as e:
-        # Mark job as failed if any exception occurs during generation
-        job = AnalysisJob.objects.get(id=job_id)
-        job.status = 'FAILED'
-        job.analysis_result = f"An unexpected error occurred: {str(e)}"
-        job.save()
-        # Re-raise the exception so the executor knows the task failed
-        raise
-
-def run_analysis_synchronously(job, generate_full_resume_flag, generate_cover_letter_flag):
+def run_combined_generation(generations, job_description, resume_text, on_result, priority=PRIORITY_STANDARD, token=None):
     """
-    Runs the AI analysis in a thread with a timeout.
-    Updates the job status to FAILED if a timeout or any other exception occurs.
+    Requests every field in `generations` from a single combined prompt, then falls back to
+    `run_generations` for any section that is missing from the response or if the call fails.
+    Same `on_result` contract, `token` handling and return value as `run_generations`.
     """
-    with ThreadPoolExecutor(max_workers=1) as executor:
-        future = executor.submit(
-            _run_analysis, 
-            job.id, 
-            generate_full_resume_flag, 
-            generate_cover_letter_flag
+    fields = list(generations)
+    try:
+        timeout = max(generation_timeout(field) for field in fields)
+        sections = generate_combined(
+            job_description,
+            resume_text,
+            fields,
+            priority=priority,
+            timeout=token.remaining(timeout) if token else timeout,
+            cancelled=token.is_cancelled if token else None,
         )
-        try:
-            # Set a timeout (e.g., 30 seconds) for the analysis
-            return future.result(timeout=30)
-        except FutTimeoutError:
-            job.status = 'FAILED'
-            job.analysis_result = 'Processing timed out. Please try again.'
-            job.save()
-            raise Exception("Processing timed out.")
-        except Exception as e:
-            # The _run_analysis function will have already marked the job as FAILED.
-            # We just re-raise the exception to the mutation.
-            raise e
+    except Exception:
+        sections = {}
+    if token is not None:
+        token.check()
+
+    outcomes = {}
+    for field in fields:
+        if field in sections:
+            outcomes[field] = True
+            on_result(field, sections[field], True)
+    missing = {field: func for field, func in generations.items() if field not in sections}
+    outcomes.update(run_generations(missing, job_description, resume_text, on_result, token))
+    return outcomes
+
+
+def _update_running_job(token, **fields):
+    """
+    Writes `fields` to the job only while it is still IN_PROGRESS. Once it has been
+    cancelled or failed elsewhere the write is dropped and the job stops with JobCancelled,
+    so a late worker never overwrites a final status.
+    """
+    updated = AnalysisJob.objects.filter(pk=token.job_id, status='IN_PROGRESS').update(
+        **fields, updated_at=timezone.now(), version=F('version') + 1
+    )
+    if not updated:
+        token.cancel(CancelToken.CANCELLED)
+        raise JobCancelled(CancelToken.CANCELLED)
+
+
+def _run_analysis(job_id, generate_full_resume_flag, generate_cover_letter_flag, priority=PRIORITY_STANDARD, queue_wait=None, token=None):
+    """
+    The core analysis logic that will be run in a separate thread.
+    `priority` selects the outbound rate limiter lane for the job's LLM calls; `queue_wait`
+    is how long (seconds) the job waited in the queue, for the timings.
+
+    `token` (a CancelToken, by default one expiring after ANALYSIS_JOB_TIMEOUT) is checked
+    between stages and passed down to every generation and LLM call. A cancelled job is left
+    CANCELLED; one that runs out of time is marked FAILED. Neither raises, since retrying
+    wouldn't help. Any other error propagates with the job's status untouched: the queue
+    decides between a retry and FAILED (see api.queue.fail_task).
+
+    Per-stage timings and per-generation latency and estimated token counts are stored in
+    `job.stats["timings"]` and fed to the histograms in api.metrics.
+    """
+    if token is None:
+        token = CancelToken(job_id, deadline=time.monotonic() + job_timeout())
+    timings = JobTimings(queue_wait)
+    job = None
+    try:
+        with timings.stage('db_load'):
+            job = AnalysisJob.objects.select_related('job_description_ref').get(id=job_id)
+            # Only the status changes, and only if the job wasn't cancelled while queued.
+            started = AnalysisJob.objects.filter(pk=job_id, status__in=ACTIVE_STATUSES).update(
+                status='IN_PROGRESS', updated_at=timezone.now(), version=F('version') + 1
+            )
+            if not started:
+                raise JobCancelled(CancelToken.CANCELLED)
+
+        # Always generate basic analysis; premium content only if the flags are set.
+        generators = {'analysis_result': generate_resume_analysis}
+        if generate_full_resume_flag:
+            generators['generated_resume'] = generate_full_resume
+        if generate_cover_letter_flag:
+            generators['generated_cover_letter'] = generate_cover_letter
+
+        with timings.stage('preprocessing'):
+            # Normalize, strip boilerplate and fit both inputs to the prompt token budget.
+            job_description, resume_text, preprocessing_stats = preprocess_inputs(
+                job.job_description, job.resume_text, prompt_count=len(generators)
+            )
+        with timings.stage('scoring'):
+            job.ats_score = score_match(job.job_description, job.resume_text)
+        job.stats = {**job.stats, 'preprocessing': preprocessing_stats}
+        token.check()
+        with timings.stage('db_save'):
+            # The local score is saved before any LLM call, so it survives LLM timeouts and failures.
+            _update_running_job(token, stats=job.stats, ats_score=job.ats_score)
+
+        streaming = streaming_setting("ENABLED")
+        if streaming:
+            GenerationChunk.objects.filter(job_id=job.pk).delete()
+        # Every LLM call gets the time left before the job's deadline and stops once the job is cancelled.
+        generations = {
+            field: (
+                streaming_generator(job.pk, field, priority, token.remaining(generation_timeout(field)), token.is_cancelled)
+                if streaming else
+                partial(func, priority=priority, timeout=token.remaining(generation_timeout(field)), cancelled=token.is_cancelled)
+            )
+            for field, func in generators.items()
+        }
+
+        cache = get_generation_cache()
+
+        def input_tokens(field):
+            return estimate_tokens(PROMPT_BUILDERS[field](job_description, resume_text))
+
+        def save_result(field, text, ok):
+            timings.generation(
+                field,
+                time.perf_counter() - generation_started,
+                ok,
+                input_tokens(field),
+                estimate_tokens(text) if ok else 0,
+                error=None if ok else text,
+            )
+            setattr(job, field, text)
+            with timings.stage('db_save'):
+                _update_running_job(token, **{field: text})
+            if ok:
+                cache.set(field, job_description, resume_text, text)
+
+        # Identical inputs are served from the cache without calling Gemini again.
+        outcomes = {}
+        with timings.stage('cache_lookup'):
+            for field in list(generations):
+                cached = cache.get(field, job_description, resume_text)
+                if cached is not None:
+                    del generations[field]
+                    setattr(job, field, cached)
+                    outcomes[field] = True
+                    timings.generation(field, 0.0, True, input_tokens(field), estimate_tokens(cached), cached=True)
+        if outcomes:
+            with timings.stage('db_save'):
+                _update_running_job(token, **{field: getattr(job, field) for field in outcomes})
+
+        generation_started = time.perf_counter()
+        with timings.stage('generation'):
+            if not streaming and generation_mode() == 'combined' and len(generations) > 1:
+                outcomes.update(run_combined_generation(generations, job_description, resume_text, save_result, priority, token))
+            else:
+                outcomes.update(run_generations(generations, job_description, resume_text, save_result, token))
+
+        # A job is usable as long as one of its generations succeeded.
+        job.status = 'COMPLETED' if any(outcomes.values()) else 'FAILED'
+        # The final save itself is only in the histogram, not in the stored timings.
+        job.stats = {**job.stats, 'timings': timings.as_dict()}
+        with timings.stage('db_save'):
+            _update_running_job(token, status=job.status, stats=job.stats)
+        ANALYSIS_JOBS.inc(status=job.status)
+        if streaming:
+            # Stream clients get the final text from the job once they see the terminal status.
+            GenerationChunk.objects.filter(job_id=job.pk).delete()
+        return job
+    except JobCancelled as e:
+        if e.reason == CancelToken.TIMED_OUT:
+            stats = job.stats if job is not None else {}
+            AnalysisJob.objects.filter(pk=job_id, status__in=ACTIVE_STATUSES).update(
+                status='FAILED',
+                analysis_result='Processing timed out. Please try again.',
+                stats={**stats, 'timings': timings.as_dict(), 'error': {'type': 'TimedOut', 'message': str(e)}},
+                updated_at=timezone.now(),
+                version=F('version') + 1,
+            )
+        ANALYSIS_JOBS.inc(status='FAILED' if e.reason == CancelToken.TIMED_OUT else 'CANCELLED')
+        GenerationChunk.objects.filter(job_id=job_id).delete()
+        return None
@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def create_job_partitions(sender, **kwargs):
+    from django.utils import timezone
+    from .retention import ensure_job_partitions
+    ensure_job_partitions(timezone.now())
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Connects the signals that keep the JWT user cache in step with users and subscriptions.
+        from . import auth  # noqa: F401
+        # `migrate` runs on every deploy: keep the upcoming monthly job partitions in place.
+        post_migrate.connect(create_job_partitions, sender=self)
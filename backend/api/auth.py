@@ -0,0 +1,228 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from graphql import OperationType
+from graphql.language.ast import FieldNode
+from graphql_jwt.backends import JSONWebTokenBackend
+from graphql_jwt.middleware import JSONWebTokenMiddleware as BaseJSONWebTokenMiddleware
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.utils import get_credentials, get_payload, get_user_by_payload
+
+from .models import Subscription
+
+DEFAULT_AUTH_CACHE_SETTINGS = {
+    "ENABLED": True,
+    # Seconds a verified token's user (and plan) is reused without verifying the token or
+    # querying the database again; never past the token's own expiry.
+    "TTL": 30,
+    # Least recently used tokens are evicted past this many entries.
+    "MAX_ENTRIES": 10000,
+}
+
+# Operations (by name) and root mutation fields that are served without authentication.
+PUBLIC_OPERATIONS = frozenset({'tokenAuth', 'verifyToken', 'refreshToken', 'createUser', '__schema'})
+
+
+def auth_cache_setting(name):
+    return getattr(settings, 'AUTH_CACHE', {}).get(name, DEFAULT_AUTH_CACHE_SETTINGS[name])
+
+
+def get_user_by_natural_key(username):
+    """
+    JWT_GET_USER_BY_NATURAL_KEY_HANDLER: loads the authenticated user together with their
+    subscription, which nearly every operation checks.
+    """
+    UserModel = get_user_model()
+    try:
+        return UserModel._default_manager.select_related('subscription').get(**{UserModel.USERNAME_FIELD: username})
+    except UserModel.DoesNotExist:
+        return None
+
+
+def _copy_user(user):
+    # Requests get their own instances: resolvers may modify the user or its subscription.
+    user = copy.copy(user)
+    subscription = user._state.fields_cache.get('subscription')
+    if subscription is not None:
+        user._state.fields_cache['subscription'] = copy.copy(subscription)
+    return user
+
+
+class TokenUserCache:
+    """
+    Bounded LRU of verified JWT -> user (with the subscription preloaded). Entries are
+    dropped when the user or their subscription is saved or deleted in this process and on
+    logout; writes elsewhere (other processes, bulk updates) are picked up within TTL.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        # Bearer tokens aren't kept in memory longer than the request.
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+        return _copy_user(user)
+
+    def set(self, token, user, token_expires=None):
+        """
+        `token_expires` is the token's `exp` claim (a Unix timestamp), if it has one.
+        """
+        ttl = auth_cache_setting("TTL")
+        if token_expires is not None:
+            ttl = min(ttl, token_expires - time.time())
+        if ttl <= 0:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (_copy_user(user), time.monotonic() + ttl)
+            self._keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > auth_cache_setting("MAX_ENTRIES"):
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys_by_user.get(entry[0].pk)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_user[entry[0].pk]
+
+    def invalidate_token(self, token):
+        with self._lock:
+            self._drop(self._key(token))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenUserCache()
+
+
+def cached_token_user(token):
+    """
+    The user for an already verified `token`, or None on a miss (or with the cache off).
+    """
+    if not auth_cache_setting("ENABLED"):
+        return None
+    return token_cache.get(token)
+
+
+class CachedJSONWebTokenBackend(JSONWebTokenBackend):
+    """
+    graphql_jwt's backend with `token_cache` in front: a hit skips signature verification
+    and the user/subscription query.
+    """
+
+    def authenticate(self, request=None, **kwargs):
+        if request is None or getattr(request, "_jwt_token_auth", False):
+            return None
+        token = get_credentials(request, **kwargs)
+        if token is None:
+            return None
+        user = cached_token_user(token)
+        if user is None:
+            payload = get_payload(token, request)
+            user = get_user_by_payload(payload)
+            if user is not None and auth_cache_setting("ENABLED"):
+                token_cache.set(token, user, payload.get('exp'))
+        return user
+
+
+def allow_any(info, **kwargs):
+    """
+    JWT_ALLOW_ANY_HANDLER: public operations are served without authenticating the token.
+    Depends only on the operation, so JSONWebTokenMiddleware asks once per operation.
+    """
+    operation = info.operation
+    if operation.name is not None and operation.name.value in PUBLIC_OPERATIONS:
+        return True
+    return operation.operation == OperationType.MUTATION and any(
+        isinstance(field, FieldNode) and field.name.value in PUBLIC_OPERATIONS
+        for field in operation.selection_set.selections
+    )
+
+
+def set_response_cookie(request, key, value=None, delete=False, **kwargs):
+    """
+    Mutations only see the request; this records a cookie (or its deletion) that
+    api.views.PersistedGraphQLView applies to the response.
+    """
+    if not hasattr(request, 'response_cookies'):
+        request.response_cookies = []
+    request.response_cookies.append((key, value, delete, kwargs))
+
+
+def apply_response_cookies(request, response):
+    for key, value, delete, kwargs in getattr(request, 'response_cookies', ()):
+        if delete:
+            response.delete_cookie(key, **kwargs)
+        else:
+            response.set_cookie(key, value, **kwargs)
+    return response
+
+
+class JSONWebTokenMiddleware(BaseJSONWebTokenMiddleware):
+    """
+    graphql_jwt's middleware with one allow-any decision per operation, stored on the
+    request. The base class keeps its cache on the middleware instance, which graphene-django
+    creates per request, and only remembers positive answers per root field, so a private
+    operation called the handler again for every field it resolved. allow_any depends only
+    on the operation, so both answers are kept and the handler runs once.
+    """
+
+    def authenticate_context(self, info, **kwargs):
+        request = info.context
+        decisions = getattr(request, '_jwt_allow_any', None)
+        if decisions is None:
+            decisions = request._jwt_allow_any = {}
+        operation = id(info.operation)
+        if operation not in decisions:
+            decisions[operation] = jwt_settings.JWT_ALLOW_ANY_HANDLER(info, **kwargs)
+        return not decisions[operation]
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def _invalidate_subscription_user(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def _invalidate_user(sender, instance, **kwargs):
+    # Deactivation, password changes and deletions take effect immediately in this process.
+    token_cache.invalidate_user(instance.pk)
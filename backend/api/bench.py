@@ -0,0 +1,198 @@
+import asyncio
+import json
+import math
+import random
+import sys
+import threading
+import time
+
+from .llm import BaseProvider
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of `values` (0 < pct <= 100).
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+UNITS = {"ms": 1000, "us": 1000000}
+
+
+def summarize(seconds, unit="ms"):
+    """
+    Latency summary in milliseconds (or microseconds, `unit="us"`) for a list of durations in seconds.
+    """
+    millis = [value * UNITS[unit] for value in seconds]
+    return {
+        "count": len(millis),
+        "mean": round(sum(millis) / len(millis), 3) if millis else None,
+        "p50": round(percentile(millis, 50), 3) if millis else None,
+        "p95": round(percentile(millis, 95), 3) if millis else None,
+        "p99": round(percentile(millis, 99), 3) if millis else None,
+        "max": round(max(millis), 3) if millis else None,
+    }
+
+
+def write_report(report, output=None):
+    """
+    Writes a benchmark report as JSON to `output` (a path) or stdout, so runs from
+    different commits can be diffed or compared by a script.
+    """
+    if output:
+        with open(output, "w") as handle:
+            json.dump(report, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+
+
+def sample_text(words, seed):
+    """
+    Deterministic filler text of roughly `words` words with resume/job-description vocabulary.
+    """
+    vocabulary = (
+        "Python Django PostgreSQL GraphQL REST APIs backend services design testing deployment "
+        "Docker Kubernetes AWS leadership mentoring agile delivery performance scalability "
+        "experience years team product customers data pipelines reliability monitoring"
+    ).split()
+    rng = random.Random(seed)
+    lines = []
+    for start in range(0, words, 12):
+        lines.append(" ".join(rng.choice(vocabulary) for _ in range(min(12, words - start))))
+    return "\n".join(lines)
+
+
+class CountingProvider(BaseProvider):
+    """
+    Wraps a provider and counts the calls made through it.
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _count(self):
+        with self._lock:
+            self.calls += 1
+
+    def generate(self, prompt, timeout):
+        self._count()
+        return self.provider.generate(prompt, timeout)
+
+    def stream(self, prompt, timeout):
+        self._count()
+        return self.provider.stream(prompt, timeout)
+
+    def is_transient(self, error):
+        return self.provider.is_transient(error)
+
+
+def run_load(operation, requests, concurrency):
+    """
+    Calls `operation(worker, index)` `requests` times from `concurrency` threads and returns
+    {"seconds": [...], "queries": [...], "errors": int, "wall": seconds}. `operation` returns
+    True on success; the database queries it runs are counted on the calling thread's connection.
+    """
+    from django.db import connection, connections
+    from django.test.utils import CaptureQueriesContext
+
+    results = {"seconds": [], "queries": [], "errors": 0}
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker(worker_index):
+        try:
+            while True:
+                with lock:
+                    index = next(counter, None)
+                if index is None:
+                    return
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    try:
+                        ok = operation(worker_index, index)
+                    except Exception:
+                        ok = False
+                    elapsed = time.perf_counter() - started
+                with lock:
+                    results["seconds"].append(elapsed)
+                    results["queries"].append(len(queries))
+                    results["errors"] += 0 if ok else 1
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results["wall"] = time.perf_counter() - started
+    return results
+
+
+def run_load_async(operation, requests, concurrency):
+    """
+    Like `run_load`, but `operation(worker, index)` is a coroutine function and the
+    `concurrency` workers are tasks on one event loop, as in a single ASGI worker process.
+    Queries aren't counted: they run on threads owned by the async ORM.
+    """
+    results = {"seconds": [], "queries": [], "errors": 0}
+    counter = iter(range(requests))
+
+    async def worker(worker_index):
+        for index in counter:
+            started = time.perf_counter()
+            try:
+                ok = await operation(worker_index, index)
+            except Exception:
+                ok = False
+            results["seconds"].append(time.perf_counter() - started)
+            results["errors"] += 0 if ok else 1
+
+    async def main():
+        await asyncio.gather(*(worker(index) for index in range(concurrency)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    results["wall"] = time.perf_counter() - started
+    return results
+
+
+def summarize_load(results):
+    queries = results["queries"]
+    return {
+        "latency_ms": summarize(results["seconds"]),
+        "throughput_rps": round(len(results["seconds"]) / results["wall"], 2) if results["wall"] else None,
+        "errors": results["errors"],
+        "queries_per_request": {
+            "mean": round(sum(queries) / len(queries), 2) if queries else None,
+            "max": max(queries) if queries else None,
+        },
+    }
+
+
+def compare_reports(baseline, report, threshold):
+    """
+    Lists operations whose p95 latency grew by more than `threshold` (a fraction) or that
+    run more queries per request than in `baseline`.
+    """
+    regressions = []
+    for name, current in report.get("operations", {}).items():
+        previous = baseline.get("operations", {}).get(name)
+        if previous is None:
+            continue
+        before, after = previous["latency_ms"]["p95"], current["latency_ms"]["p95"]
+        if before and after and after > before * (1 + threshold):
+            regressions.append({"operation": name, "metric": "p95_ms", "baseline": before, "current": after})
+        before, after = previous["queries_per_request"]["mean"], current["queries_per_request"]["mean"]
+        if before is not None and after is not None and after > before:
+            regressions.append({"operation": name, "metric": "queries_per_request", "baseline": before, "current": after})
+    return regressions
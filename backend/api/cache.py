@@ -0,0 +1,224 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .metrics import GENERATION_CACHE_LOOKUPS, GENERATION_CACHE_MISSES
+from .models import GenerationCacheEntry
+from .gemini import PROMPT_TEMPLATE_VERSION
+
+DEFAULT_CACHE_SETTINGS = {
+    "BACKENDS": [
+        {"BACKEND": "api.cache.LocMemBackend", "OPTIONS": {"MAX_ENTRIES": 512}},
+        {"BACKEND": "api.cache.DatabaseBackend"},
+    ],
+    "TTL": 60 * 60 * 24 * 7,
+}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_input(text):
+    """
+    Collapses whitespace so trivially different pastes of the same text share a cache entry.
+    """
+    return _WHITESPACE_RE.sub(" ", text or "").strip()
+
+
+def make_cache_key(generation_type, job_description, resume_text, prompt_version=PROMPT_TEMPLATE_VERSION):
+    digest = hashlib.sha256()
+    for part in (prompt_version, generation_type, normalize_input(job_description), normalize_input(resume_text)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LocMemBackend:
+    """
+    In-process LRU tier with a per-entry TTL.
+    """
+    name = "locmem"
+
+    def __init__(self, MAX_ENTRIES=512):
+        self.max_entries = MAX_ENTRIES
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, generation_type, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keep_prompt_version=None):
+        # Keys embed the prompt version, so stale entries can't be hit; just drop everything.
+        with self._lock:
+            self._entries.clear()
+
+    def purge_expired(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]
+            for key in expired:
+                del self._entries[key]
+        return len(expired)
+
+
+class DatabaseBackend:
+    """
+    Tier stored in `GenerationCacheEntry`, shared by every web and worker process. Expired
+    rows are never read; each process deletes up to PURGE_BATCH_SIZE of them on a `set`
+    at most every PURGE_INTERVAL seconds, so the table doesn't grow without bound.
+    """
+    name = "database"
+
+    def __init__(self, PURGE_INTERVAL=300, PURGE_BATCH_SIZE=500):
+        self.purge_interval = PURGE_INTERVAL
+        self.purge_batch_size = PURGE_BATCH_SIZE
+        self._next_purge = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return (
+            GenerationCacheEntry.objects.filter(key=key, expires_at__gt=timezone.now())
+            .values_list("value", flat=True)
+            .first()
+        )
+
+    def set(self, key, value, generation_type, ttl):
+        GenerationCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={
+                "generation_type": generation_type,
+                "prompt_version": PROMPT_TEMPLATE_VERSION,
+                "value": value,
+                "expires_at": timezone.now() + timedelta(seconds=ttl),
+            },
+        )
+        with self._lock:
+            due = time.monotonic() >= self._next_purge
+            if due:
+                self._next_purge = time.monotonic() + self.purge_interval
+        if due:
+            self.purge_expired(limit=self.purge_batch_size)
+
+    def invalidate(self, keep_prompt_version=None):
+        entries = GenerationCacheEntry.objects.all()
+        if keep_prompt_version is not None:
+            entries = entries.exclude(prompt_version=keep_prompt_version)
+        entries.delete()
+
+    def purge_expired(self, limit=None):
+        expired = GenerationCacheEntry.objects.filter(expires_at__lte=timezone.now())
+        if limit is not None:
+            expired = GenerationCacheEntry.objects.filter(pk__in=list(expired.values_list("pk", flat=True)[:limit]))
+        return expired.delete()[0]
+
+
+class GenerationCache:
+    """
+    Tiered cache of generation results, checked fastest tier first. A hit in a slower
+    tier is copied into the faster ones.
+    """
+
+    def __init__(self, backends, ttl):
+        self.backends = backends
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counters = {}
+        self.reset_stats()
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+
+    def get(self, generation_type, job_description, resume_text):
+        key = make_cache_key(generation_type, job_description, resume_text)
+        for index, backend in enumerate(self.backends):
+            value = backend.get(key)
+            if value is not None:
+                self._count(f"{backend.name}_hits")
+                GENERATION_CACHE_LOOKUPS.inc(tier=backend.name, result="hit")
+                for faster in self.backends[:index]:
+                    faster.set(key, value, generation_type, self.ttl)
+                return value
+            self._count(f"{backend.name}_misses")
+            GENERATION_CACHE_LOOKUPS.inc(tier=backend.name, result="miss")
+        self._count("misses")
+        GENERATION_CACHE_MISSES.inc()
+        return None
+
+    def set(self, generation_type, job_description, resume_text, value):
+        key = make_cache_key(generation_type, job_description, resume_text)
+        for backend in self.backends:
+            backend.set(key, value, generation_type, self.ttl)
+
+    def invalidate(self, stale_only=False):
+        """
+        Drops cached generations. With `stale_only`, entries for the current prompt
+        version are kept in the shared tier.
+        """
+        for backend in self.backends:
+            backend.invalidate(keep_prompt_version=PROMPT_TEMPLATE_VERSION if stale_only else None)
+
+    def purge_expired(self):
+        """
+        Deletes entries past their TTL from every tier; returns how many.
+        """
+        return sum(backend.purge_expired() for backend in self.backends)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def reset_stats(self):
+        with self._lock:
+            self._counters = {"misses": 0}
+            for backend in self.backends:
+                self._counters[f"{backend.name}_hits"] = 0
+                self._counters[f"{backend.name}_misses"] = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_generation_cache():
+    """
+    Returns the process-wide generation cache configured by `settings.GENERATION_CACHE`.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            config = {**DEFAULT_CACHE_SETTINGS, **getattr(settings, "GENERATION_CACHE", {})}
+            backends = [
+                import_string(entry["BACKEND"])(**entry.get("OPTIONS", {}))
+                for entry in config["BACKENDS"]
+            ]
+            _cache = GenerationCache(backends, config["TTL"])
+        return _cache
+
+
+def reset_generation_cache():
+    global _cache
+    with _cache_lock:
+        _cache = None
@@ -0,0 +1,72 @@
+import threading
+import time
+
+from .models import AnalysisJob
+
+# Seconds between database checks for a cancelAnalysisJob issued from another process.
+CANCEL_POLL_INTERVAL = 1.0
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a running analysis once its CancelToken is cancelled. `reason` is
+    CancelToken.CANCELLED or CancelToken.TIMED_OUT.
+    """
+
+    def __init__(self, reason):
+        super().__init__(f"Analysis job {reason}.")
+        self.reason = reason
+
+
+class CancelToken:
+    """
+    Carries an analysis job's deadline and cancellation through every stage, generation
+    thread and LLM call. Work checks it cooperatively (`check()` between stages,
+    `is_cancelled` before each LLM attempt and stream chunk) and sizes its timeouts with
+    `remaining()`, so nothing outlives the deadline.
+
+    A token is cancelled by `cancel()` in this process, by the deadline passing, or by the
+    job being set to CANCELLED in the database (looked up at most every CANCEL_POLL_INTERVAL).
+    """
+
+    CANCELLED = 'cancelled'
+    TIMED_OUT = 'timed out'
+
+    def __init__(self, job_id, deadline=None, poll_interval=CANCEL_POLL_INTERVAL):
+        self.job_id = job_id
+        # time.monotonic() value, or None for no deadline.
+        self.deadline = deadline
+        self.poll_interval = poll_interval
+        self.reason = None
+        self._event = threading.Event()
+        self._checked_at = time.monotonic()
+
+    def cancel(self, reason=CANCELLED):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def remaining(self, limit=None):
+        """
+        Seconds left before the deadline, capped at `limit`.
+        """
+        if self.deadline is None:
+            return limit
+        left = max(0.0, self.deadline - time.monotonic())
+        return left if limit is None else min(limit, left)
+
+    def is_cancelled(self):
+        if self._event.is_set():
+            return True
+        now = time.monotonic()
+        if self.deadline is not None and now >= self.deadline:
+            self.cancel(self.TIMED_OUT)
+        elif now - self._checked_at >= self.poll_interval:
+            self._checked_at = now
+            if AnalysisJob.objects.filter(pk=self.job_id, status='CANCELLED').exists():
+                self.cancel(self.CANCELLED)
+        return self._event.is_set()
+
+    def check(self):
+        if self.is_cancelled():
+            raise JobCancelled(self.reason)
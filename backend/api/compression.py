@@ -0,0 +1,158 @@
+import base64
+import threading
+import time
+import zlib
+from collections import Counter
+
+from django.conf import settings
+
+try:
+    import zstandard
+except ImportError:  # Optional; zlib is always available.
+    zstandard = None
+
+DEFAULT_TEXT_COMPRESSION_SETTINGS = {
+    # "zstd" falls back to "zlib" when the zstandard package isn't installed.
+    "CODEC": "zstd",
+    "LEVEL": 6,
+    # Shorter values are stored as plain text; the header and base85 overhead isn't worth it.
+    "MIN_LENGTH": 256,
+    # Compress job descriptions with the latest trained CompressionDictionary, if any.
+    "USE_DICTIONARY": True,
+}
+
+# Stored values look like "\x01z:<base85>" or "\x01s42:<base85>" (codec, optional dictionary id).
+# Text without the marker is read back verbatim, so rows written before compression stay valid.
+MARKER = "\x01"
+
+ZLIB = "z"
+ZSTD = "s"
+
+MAX_DICTIONARY_SIZE = 32 * 1024
+
+# How long a process keeps using the dictionary it looked up before checking for a newer one.
+LATEST_DICTIONARY_TTL = 300
+
+
+def compression_setting(name):
+    return getattr(settings, "TEXT_COMPRESSION", {}).get(name, DEFAULT_TEXT_COMPRESSION_SETTINGS[name])
+
+
+def default_codec():
+    if compression_setting("CODEC") == "zstd" and zstandard is not None:
+        return ZSTD
+    return ZLIB
+
+
+def is_compressed(value):
+    return isinstance(value, str) and value.startswith(MARKER)
+
+
+_dictionaries = {}
+_latest_dictionaries = {}
+_dictionaries_lock = threading.Lock()
+
+
+def get_dictionary(dictionary_id):
+    """
+    Returns (codec, data) for a stored dictionary; cached for the life of the process since
+    dictionaries are immutable once written.
+    """
+    with _dictionaries_lock:
+        if dictionary_id not in _dictionaries:
+            from .models import CompressionDictionary
+            dictionary = CompressionDictionary.objects.get(pk=dictionary_id)
+            _dictionaries[dictionary_id] = (dictionary.codec, bytes(dictionary.data))
+        return _dictionaries[dictionary_id]
+
+
+def latest_dictionary_id(codec):
+    """
+    The newest dictionary for `codec`, or None. Looked up at most once per
+    LATEST_DICTIONARY_TTL so that saving a row doesn't cost an extra query.
+    """
+    now = time.monotonic()
+    cached = _latest_dictionaries.get(codec)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+    from .models import CompressionDictionary
+    dictionary_id = CompressionDictionary.objects.filter(codec=codec).order_by('-id').values_list('id', flat=True).first()
+    _latest_dictionaries[codec] = (dictionary_id, now + LATEST_DICTIONARY_TTL)
+    return dictionary_id
+
+
+def reset_dictionaries():
+    with _dictionaries_lock:
+        _dictionaries.clear()
+        _latest_dictionaries.clear()
+
+
+def _compress(codec, data, level, dictionary):
+    if codec == ZSTD:
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdCompressor(level=level, dict_data=dict_data).compress(data)
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS, 9, zlib.Z_DEFAULT_STRATEGY, dictionary)
+    else:
+        compressor = zlib.compressobj(level)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _decompress(codec, data, dictionary):
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is required to read zstd-compressed text.")
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data)
+    decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+def compress_text(value, use_dictionary=False):
+    """
+    Encodes text for storage. Short values are left as they are unless they happen to
+    start with the marker, which would make them ambiguous.
+    """
+    if value is None or len(value) < compression_setting("MIN_LENGTH") and not value.startswith(MARKER):
+        return value
+    codec = default_codec()
+    dictionary_id = dictionary = None
+    if use_dictionary and compression_setting("USE_DICTIONARY"):
+        dictionary_id = latest_dictionary_id(codec)
+    if dictionary_id is not None:
+        dictionary = get_dictionary(dictionary_id)[1]
+    payload = _compress(codec, value.encode("utf-8"), compression_setting("LEVEL"), dictionary)
+    header = f"{MARKER}{codec}{dictionary_id if dictionary_id is not None else ''}:"
+    return header + base64.b85encode(payload).decode("ascii")
+
+
+def decompress_text(value):
+    if not is_compressed(value):
+        return value
+    header, _, payload = value.partition(":")
+    codec, dictionary_id = header[1], header[2:]
+    dictionary = get_dictionary(int(dictionary_id))[1] if dictionary_id else None
+    return _decompress(codec, base64.b85decode(payload), dictionary).decode("utf-8")
+
+
+def train_dictionary(samples, codec=None, size=MAX_DICTIONARY_SIZE):
+    """
+    Builds a shared dictionary from sample texts. zstd uses its own trainer; for zlib the
+    dictionary is the most common lines, with the most frequent last since deflate favours
+    recent (closer) matches.
+    """
+    codec = codec or default_codec()
+    if codec == ZSTD:
+        return codec, zstandard.train_dictionary(size, [sample.encode("utf-8") for sample in samples]).as_bytes()
+
+    counts = Counter(line.strip() for sample in samples for line in sample.splitlines() if len(line.strip()) > 8)
+    chosen, used = [], 0
+    for line, count in counts.most_common():
+        if count < 2:
+            break
+        encoded = (line + "\n").encode("utf-8")
+        if used + len(encoded) > size:
+            break
+        chosen.append(encoded)
+        used += len(encoded)
+    return codec, b"".join(reversed(chosen))
@@ -0,0 +1,31 @@
+from django.db import models
+
+from .compression import compress_text, decompress_text
+
+
+class CompressedTextField(models.TextField):
+    """
+    A TextField stored compressed (zstd or zlib, base85-encoded) in an ordinary text column.
+
+    Reads and writes are transparent to the ORM and GraphQL layers; rows written before
+    the field was compressed are read back as they are until `manage.py compress_job_text`
+    rewrites them. Only exact-value storage is supported: don't filter on the contents.
+    With `use_dictionary=True` new values are compressed with the latest trained
+    CompressionDictionary (see `manage.py train_compression_dictionary`).
+    """
+
+    def __init__(self, *args, use_dictionary=False, **kwargs):
+        self.use_dictionary = use_dictionary
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.use_dictionary:
+            kwargs['use_dictionary'] = True
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        return decompress_text(value)
+
+    def get_prep_value(self, value):
+        return compress_text(super().get_prep_value(value), self.use_dictionary)
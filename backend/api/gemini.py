@@ -1,16 +1,13 @@
-import google.generativeai as genai
-from django.conf import settings
+import re
 
-genai.configure(api_key=settings.GEMINI_API_KEY)
+from .llm import get_llm_client
+from .ratelimit import PRIORITY_STANDARD
 
-def generate_resume_analysis(job_description, resume_text):
-    """
-    Uses the Gemini API to analyze a resume against a job description.
+# Bump whenever a prompt below changes; cached generations are keyed on it.
+PROMPT_TEMPLATE_VERSION = "1"
 
-    Provide a brief analysis of the resume's strengths and weaknesses, and suggest key skills and keywords to add for better alignment with the job description.
-    """
-    model = genai.GenerativeModel('gemini-pro')
-    prompt = f"""Analyze the following resume based on the provided job description.
+def build_resume_analysis_prompt(job_description, resume_text):
+    return f"""Analyze the following resume based on the provided job description.
 
     **Job Description:**
     {job_description}
@@ -20,19 +17,9 @@ def generate_resume_analysis(job_description, resume_text):
 
     Provide a brief analysis of the resume's strengths and weaknesses, and suggest key skills and keywords to add for better alignment with the job description.
     """
-    try:
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        # Handle potential API errors (e.g., connection issues, invalid key)
-        return f"An error occurred while generating the analysis: {e}"
 
-def generate_full_resume(job_description, resume_text):
-    """
-    Uses the Gemini API to generate a full tailored resume based on user info and job description.
-    """
-    model = genai.GenerativeModel('gemini-pro')
-    prompt = f"""Generate a full, tailored resume based on the provided job description and the user's existing resume content.
+def build_full_resume_prompt(job_description, resume_text):
+    return f"""Generate a full, tailored resume based on the provided job description and the user's existing resume content.
     Focus on highlighting relevant experience and skills from the user's resume that match the job description.
 
     **Job Description:**
@@ -43,18 +30,9 @@ def generate_full_resume(job_description, resume_text):
 
     Provide the generated resume in a clear, professional text format. Do not include any introductory or concluding remarks, just the resume content.
     """
-    try:
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        return f"An error occurred while generating the full resume: {e}"
 
-def generate_cover_letter(job_description, resume_text):
-    """
-    Uses the Gemini API to generate a personalized cover letter.
-    """
-    model = genai.GenerativeModel('gemini-pro')
-    prompt = f"""Generate a personalized cover letter for the provided job description, drawing relevant experience and skills from the user's resume content.
+def build_cover_letter_prompt(job_description, resume_text):
+    return f"""Generate a personalized cover letter for the provided job description, drawing relevant experience and skills from the user's resume content.
 
     **Job Description:**
     {job_description}
@@ -64,8 +42,91 @@ def generate_cover_letter(job_description, resume_text):
 
     Provide the generated cover letter in a professional text format. Do not include any introductory or concluding remarks, just the cover letter content.
     """
-    try:
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        return f"An error occurred while generating the cover letter: {e}"
\ No newline at end of file
+
+# Prompt builder for each AnalysisJob result field.
+PROMPT_BUILDERS = {
+    'analysis_result': build_resume_analysis_prompt,
+    'generated_resume': build_full_resume_prompt,
+    'generated_cover_letter': build_cover_letter_prompt,
+}
+
+# Section headers for the combined single-call mode, in output order.
+COMBINED_SECTIONS = {
+    'analysis_result': ('ANALYSIS', "A brief analysis of the resume's strengths and weaknesses, with key skills and keywords to add for better alignment with the job description."),
+    'generated_resume': ('TAILORED RESUME', "A full resume tailored to the job description, highlighting the user's relevant experience and skills, in a clear, professional text format."),
+    'generated_cover_letter': ('COVER LETTER', "A personalized cover letter for the job description, drawing on relevant experience and skills from the user's resume."),
+}
+
+_SECTION_HEADER_RE = re.compile(r"^[ \t]*={3,}[ \t]*([A-Z][A-Z ]+?)[ \t]*={3,}[ \t]*$", re.MULTILINE)
+
+def build_combined_prompt(job_description, resume_text, fields):
+    sections = "\n".join(
+        f"    === {COMBINED_SECTIONS[field][0]} ===\n    {COMBINED_SECTIONS[field][1]}" for field in fields
+    )
+    return f"""Using the provided job description and the user's existing resume content, produce each of the sections below.
+
+    **Job Description:**
+    {job_description}
+
+    **User's Existing Resume Content:**
+    {resume_text}
+
+    Start every section with its header line exactly as written, and output nothing before the first header or between sections other than the section content:
+
+{sections}
+    """
+
+def parse_combined_response(text, fields):
+    """
+    Splits a combined response into {field: text}. Sections that are missing or empty are
+    left out so the caller can fall back to separate calls for them.
+    """
+    field_by_header = {COMBINED_SECTIONS[field][0]: field for field in fields}
+    matches = list(_SECTION_HEADER_RE.finditer(text or ""))
+    sections = {}
+    for index, match in enumerate(matches):
+        field = field_by_header.get(match.group(1).strip())
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        body = text[match.end():end].strip()
+        if field and body and field not in sections:
+            sections[field] = body
+    return sections
+
+def generate_combined(job_description, resume_text, fields, priority=PRIORITY_STANDARD, timeout=None, cancelled=None):
+    """
+    Generates several results in one request that shares the job description and resume context.
+    """
+    prompt = build_combined_prompt(job_description, resume_text, fields)
+    text = get_llm_client().generate(prompt, timeout=timeout, priority=priority, cancelled=cancelled)
+    return parse_combined_response(text, fields)
+
+def generate_resume_analysis(job_description, resume_text, priority=PRIORITY_STANDARD, timeout=None, cancelled=None):
+    """
+    Uses the Gemini API to analyze a resume against a job description.
+
+    Provide a brief analysis of the resume's strengths and weaknesses, and suggest key skills and keywords to add for better alignment with the job description.
+    """
+    # API errors propagate; `api.analysis.run_generations` records them on the job.
+    prompt = build_resume_analysis_prompt(job_description, resume_text)
+    return get_llm_client().generate(prompt, timeout=timeout, priority=priority, cancelled=cancelled)
+
+def generate_full_resume(job_description, resume_text, priority=PRIORITY_STANDARD, timeout=None, cancelled=None):
+    """
+    Uses the Gemini API to generate a full tailored resume based on user info and job description.
+    """
+    prompt = build_full_resume_prompt(job_description, resume_text)
+    return get_llm_client().generate(prompt, timeout=timeout, priority=priority, cancelled=cancelled)
+
+def generate_cover_letter(job_description, resume_text, priority=PRIORITY_STANDARD, timeout=None, cancelled=None):
+    """
+    Uses the Gemini API to generate a personalized cover letter.
+    """
+    prompt = build_cover_letter_prompt(job_description, resume_text)
+    return get_llm_client().generate(prompt, timeout=timeout, priority=priority, cancelled=cancelled)
+
+def stream_generation(field, job_description, resume_text, priority=PRIORITY_STANDARD, timeout=None, cancelled=None):
+    """
+    Streams the generation for an AnalysisJob result field, yielding text chunks as the model produces them.
+    """
+    prompt = PROMPT_BUILDERS[field](job_description, resume_text)
+    yield from get_llm_client().stream(prompt, timeout=timeout, priority=priority, cancelled=cancelled)
@@ -0,0 +1,173 @@
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+
+from .models import ResumeFile
+from .parsers import ParseError, detect_type, parse_resume
+from .preprocessing import normalize_whitespace
+
+DEFAULT_RESUME_UPLOAD_SETTINGS = {
+    # Uploads are cut off while streaming once they pass this size.
+    "MAX_BYTES": 5 * 1024 * 1024,
+    "MAX_PAGES": 10,
+    # Same limit as createAnalysisJob's resumeText.
+    "MAX_TEXT_CHARS": 20000,
+    # Processes extracting text, so CPU-heavy parsing never runs on request threads.
+    "PARSER_WORKERS": 2,
+    # Seconds a parse may take before its worker is killed.
+    "PARSE_TIMEOUT": 20,
+    # Uploads waiting for a parser beyond this many are turned away with a 503.
+    "MAX_PENDING": 8,
+}
+
+# A DOCX is a zip; its XML may expand to this many times the upload limit (zip bombs).
+DOCX_EXPANSION_LIMIT = 10
+
+
+def resume_upload_setting(name):
+    return getattr(settings, 'RESUME_UPLOADS', {}).get(name, DEFAULT_RESUME_UPLOAD_SETTINGS[name])
+
+
+class UploadRejected(Exception):
+    """
+    An upload that can't be used; `status` is the HTTP status to answer with.
+    """
+
+    def __init__(self, message, status=422):
+        super().__init__(message)
+        self.status = status
+
+
+class ResumeUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams uploaded files to temporary files (never into memory), hashing them on the way,
+    and stops reading the request once a file passes MAX_BYTES. Uploaded files get a
+    `sha256` attribute.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_bytes = resume_upload_setting("MAX_BYTES")
+        self.too_large = False
+        self._sha256 = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self._sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_bytes:
+            self.too_large = True
+            raise StopUpload(connection_reset=True)
+        self._sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.sha256 = self._sha256.hexdigest()
+        return upload
+
+
+_pool = None
+_pending = 0
+_pool_lock = threading.Lock()
+
+
+def get_parser_pool():
+    """
+    Returns the process-wide parser pool, PARSER_WORKERS processes started on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=resume_upload_setting("PARSER_WORKERS"),
+                # Forking a multi-threaded server isn't safe; workers start fresh instead.
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def reset_parser_pool(pool=None):
+    """
+    Shuts the parser pool down, killing any worker still parsing; the next parse starts a
+    new one. With `pool`, only if that is still the current pool.
+    """
+    global _pool
+    with _pool_lock:
+        if pool is not None and pool is not _pool:
+            return
+        pool, _pool = _pool, None
+    if pool is not None:
+        # A running call can't be cancelled, so stop the processes themselves.
+        processes = list((getattr(pool, '_processes', None) or {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+
+def extract_text(path, file_type):
+    """
+    Runs parse_resume in the parser pool and returns (text, pages). Raises UploadRejected.
+    A parse that times out takes the pool down with it: calls still running in the other
+    workers fail too, but nothing outlives PARSE_TIMEOUT.
+    """
+    global _pending
+    with _pool_lock:
+        if _pending >= resume_upload_setting("MAX_PENDING"):
+            raise UploadRejected("Too many files are being processed; please try again shortly.", status=503)
+        _pending += 1
+    pool = get_parser_pool()
+    try:
+        future = pool.submit(
+            parse_resume,
+            path,
+            file_type,
+            resume_upload_setting("MAX_PAGES"),
+            resume_upload_setting("MAX_BYTES") * DOCX_EXPANSION_LIMIT,
+        )
+        return future.result(timeout=resume_upload_setting("PARSE_TIMEOUT"))
+    except ParseError as e:
+        raise UploadRejected(str(e))
+    except FutTimeoutError:
+        reset_parser_pool(pool)
+        raise UploadRejected("The file took too long to read.")
+    except BrokenProcessPool:
+        reset_parser_pool(pool)
+        raise UploadRejected("The file could not be read.")
+    finally:
+        with _pool_lock:
+            _pending -= 1
+
+
+def ingest_resume(upload):
+    """
+    The ResumeFile for a file received through ResumeUploadHandler, and whether it was
+    already known. A file is parsed only the first time its hash is seen.
+    """
+    resume_file = ResumeFile.objects.filter(pk=upload.sha256).first()
+    if resume_file is not None:
+        return resume_file, True
+
+    path = upload.temporary_file_path()
+    file_type = detect_type(path)
+    if file_type is None:
+        raise UploadRejected("Only PDF and DOCX files are accepted.", status=415)
+    text, pages = extract_text(path, file_type)
+    text = normalize_whitespace(text)
+    if not text:
+        raise UploadRejected("No text could be extracted from the file; scanned documents aren't supported.")
+    max_chars = resume_upload_setting("MAX_TEXT_CHARS")
+    if len(text) > max_chars:
+        raise UploadRejected(f"The resume's text exceeds the maximum length of {max_chars:,} characters.")
+
+    resume_file, _ = ResumeFile.objects.get_or_create(
+        sha256=upload.sha256,
+        defaults={'file_type': file_type, 'size': upload.size, 'pages': pages, 'text': text},
+    )
+    return resume_file, False
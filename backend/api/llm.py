@@ -0,0 +1,292 @@
+import hashlib
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .ratelimit import PRIORITY_STANDARD, build_limiter
+
+DEFAULT_LLM_SETTINGS = {
+    "PROVIDER": "api.llm.GeminiProvider",
+    "OPTIONS": {},
+    "MAX_RETRIES": 3,
+    "BACKOFF_BASE": 0.5,
+    "BACKOFF_MAX": 8.0,
+    "TIMEOUT": 25.0,
+}
+
+
+_FAKE_SECTION_HEADER_RE = re.compile(r"^\s*(={3,}\s*[A-Z][A-Z ]+?\s*={3,})\s*$", re.MULTILINE)
+
+
+class LLMError(Exception):
+    pass
+
+
+class DeadlineExceeded(LLMError):
+    pass
+
+
+class CallCancelled(LLMError):
+    pass
+
+
+class BaseProvider:
+    """
+    A text generation backend. Providers make a single attempt per call; retries and
+    deadlines are handled by `LLMClient`.
+    """
+    transient_errors = (ConnectionError, TimeoutError)
+
+    def generate(self, prompt, timeout):
+        raise NotImplementedError
+
+    def stream(self, prompt, timeout):
+        yield self.generate(prompt, timeout)
+
+    def is_transient(self, error):
+        return isinstance(error, self.transient_errors)
+
+
+class GeminiProvider(BaseProvider):
+    """
+    Google Gemini. The configured model object (and its underlying gRPC channel) is
+    created once and reused for every call in the process.
+    """
+    transient_errors = BaseProvider.transient_errors + (
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+        google_exceptions.Aborted,
+    )
+
+    def __init__(self, MODEL='gemini-pro', API_KEY=None):
+        genai.configure(api_key=API_KEY or settings.GEMINI_API_KEY)
+        self.model = genai.GenerativeModel(MODEL)
+
+    def generate(self, prompt, timeout):
+        response = self.model.generate_content(prompt, request_options={"timeout": timeout})
+        return response.text
+
+    def stream(self, prompt, timeout):
+        for chunk in self.model.generate_content(prompt, stream=True, request_options={"timeout": timeout}):
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeProvider(BaseProvider):
+    """
+    Deterministic in-process provider for offline development and load tests.
+
+    The response is derived from a hash of the prompt, so identical prompts always get
+    identical text; "=== SECTION ===" headers requested by the prompt are echoed with a
+    body each. Latency is LATENCY seconds plus a per-1K-token cost for the prompt and the
+    response (spread across chunks when streaming).
+    """
+
+    def __init__(self, LATENCY=0.0, LATENCY_PER_1K_INPUT_TOKENS=0.0, LATENCY_PER_1K_OUTPUT_TOKENS=0.0,
+                 RESPONSE_WORDS=80, STREAM_CHUNKS=8):
+        self.latency = LATENCY
+        self.latency_per_1k_input = LATENCY_PER_1K_INPUT_TOKENS
+        self.latency_per_1k_output = LATENCY_PER_1K_OUTPUT_TOKENS
+        self.response_words = RESPONSE_WORDS
+        self.stream_chunks = max(1, STREAM_CHUNKS)
+
+    def _words(self, prompt):
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        rng = random.Random(digest)
+        vocabulary = prompt.split() or ['resume']
+        return [f"[fake-{digest[:8]}]"] + [rng.choice(vocabulary) for _ in range(self.response_words)]
+
+    def _respond(self, prompt):
+        headers = _FAKE_SECTION_HEADER_RE.findall(prompt)
+        if not headers:
+            return ' '.join(self._words(prompt))
+        return '\n\n'.join(f"{header}\n{' '.join(self._words(prompt + header))}" for header in headers)
+
+    def _latency(self, prompt, response):
+        return (
+            self.latency
+            + self.latency_per_1k_input * len(prompt) / 4000
+            + self.latency_per_1k_output * len(response) / 4000
+        )
+
+    def generate(self, prompt, timeout):
+        response = self._respond(prompt)
+        latency = self._latency(prompt, response)
+        time.sleep(min(latency, timeout))
+        if latency > timeout:
+            raise TimeoutError("Fake provider latency exceeds the call timeout.")
+        return response
+
+    def stream(self, prompt, timeout):
+        words = self._respond(prompt).split(' ')
+        delay = self._latency(prompt, ' '.join(words)) / self.stream_chunks
+        size = -(-len(words) // self.stream_chunks)
+        for start in range(0, len(words), size):
+            time.sleep(delay)
+            yield ' '.join(words[start:start + size]) + ' '
+
+
+class LLMClient:
+    """
+    Wraps a provider with per-call deadlines and retries using jittered exponential
+    backoff on transient errors. With a `limiter`, every attempt first waits for
+    outbound capacity in the caller's priority lane.
+    """
+
+    def __init__(self, provider, max_retries, backoff_base, backoff_max, timeout, limiter=None):
+        self.provider = provider
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.limiter = limiter
+
+    def _backoff(self, attempt):
+        # "Full jitter": spreads retries from many workers across the backoff window.
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _remaining(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("The LLM call deadline was exceeded.")
+        return min(remaining, self.timeout)
+
+    def _deadline(self, timeout):
+        # A timeout of 0 means the caller's time is up (see CancelToken.remaining), not "use the default".
+        if timeout is None:
+            timeout = self.timeout
+        if timeout <= 0:
+            raise DeadlineExceeded("The LLM call deadline was exceeded.")
+        return time.monotonic() + timeout
+
+    def _check_cancelled(self, cancelled):
+        if cancelled is not None and cancelled():
+            raise CallCancelled("The LLM call was cancelled.")
+
+    def _call_with_retries(self, call, deadline, cancelled=None):
+        attempt = 0
+        while True:
+            try:
+                self._check_cancelled(cancelled)
+                return call(self._remaining(deadline))
+            except (DeadlineExceeded, CallCancelled):
+                raise
+            except Exception as e:
+                if attempt >= self.max_retries or not self.provider.is_transient(e):
+                    raise
+                delay = self._backoff(attempt)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    def _acquire(self, priority, deadline):
+        if self.limiter is None:
+            return None
+        return self.limiter.acquire(priority, timeout=max(0, deadline - time.monotonic()))
+
+    def _release(self, lease):
+        if lease is not None:
+            self.limiter.release(lease)
+
+    def generate(self, prompt, timeout=None, priority=PRIORITY_STANDARD, cancelled=None):
+        """
+        Returns the generated text. `timeout` bounds the whole call, including retries
+        and time spent queued behind the rate limiter. `cancelled()`, if given, is checked
+        before every attempt; once it returns True no further attempt is made.
+        """
+        deadline = self._deadline(timeout)
+
+        def attempt(remaining):
+            lease = self._acquire(priority, deadline)
+            try:
+                return self.provider.generate(prompt, self._remaining(deadline))
+            finally:
+                self._release(lease)
+
+        return self._call_with_retries(attempt, deadline, cancelled)
+
+    def stream(self, prompt, timeout=None, priority=PRIORITY_STANDARD, cancelled=None):
+        """
+        Yields text chunks. Only the request that produces the first chunk is retried;
+        an error mid-stream is raised to the caller. The rate limiter slot is held until
+        the stream ends, or until `cancelled()` returns True between chunks.
+        """
+        deadline = self._deadline(timeout)
+
+        def start(remaining):
+            lease = self._acquire(priority, deadline)
+            try:
+                chunks = self.provider.stream(prompt, self._remaining(deadline))
+                return next(chunks, None), chunks, lease
+            except Exception:
+                self._release(lease)
+                raise
+
+        first, chunks, lease = self._call_with_retries(start, deadline, cancelled)
+        try:
+            if first is None:
+                return
+            yield first
+            for chunk in chunks:
+                if time.monotonic() > deadline:
+                    raise DeadlineExceeded("The LLM call deadline was exceeded.")
+                self._check_cancelled(cancelled)
+                yield chunk
+        finally:
+            self._release(lease)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """
+    Returns the process-wide LLM client configured by `settings.LLM`.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            config = {**DEFAULT_LLM_SETTINGS, **getattr(settings, "LLM", {})}
+            provider = import_string(config["PROVIDER"])(**config["OPTIONS"])
+            _client = LLMClient(
+                provider,
+                max_retries=config["MAX_RETRIES"],
+                backoff_base=config["BACKOFF_BASE"],
+                backoff_max=config["BACKOFF_MAX"],
+                timeout=config["TIMEOUT"],
+                limiter=build_limiter(),
+            )
+        return _client
+
+
+def reset_llm_client():
+    global _client
+    with _client_lock:
+        _client = None
+
+
+@contextmanager
+def override_llm_client(client):
+    """
+    Temporarily replaces the process-wide client, e.g. with a FakeProvider for benchmarks.
+    """
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+    try:
+        yield client
+    finally:
+        with _client_lock:
+            _client = previous
@@ -0,0 +1,49 @@
+from .models import Subscription
+
+
+class DataLoader:
+    """
+    Request-scoped cache for synchronous resolvers. Each key is fetched at most once per
+    request, including keys that turn out not to exist.
+    """
+
+    def __init__(self, batch_load):
+        # batch_load(keys) returns {key: value} for the keys that exist.
+        self.batch_load = batch_load
+        self._cache = {}
+
+    def load(self, key):
+        if key not in self._cache:
+            self._cache[key] = self.batch_load([key]).get(key)
+        return self._cache[key]
+
+
+def _load_subscriptions(user_ids):
+    return {subscription.user_id: subscription for subscription in Subscription.objects.filter(user_id__in=user_ids)}
+
+
+class Loaders:
+    def __init__(self):
+        self.subscriptions = DataLoader(_load_subscriptions)
+
+
+def get_loaders(request):
+    """
+    Returns the loaders for this request, creating them on first use.
+    """
+    loaders = getattr(request, '_api_loaders', None)
+    if loaders is None:
+        loaders = request._api_loaders = Loaders()
+    return loaders
+
+
+def load_subscription(user, request):
+    """
+    Returns the user's Subscription (or None) without a query when it was already fetched
+    with the user, e.g. by `api.auth.get_user_by_natural_key`, and through the request's
+    subscription loader otherwise.
+    """
+    cache = user._state.fields_cache
+    if 'subscription' not in cache:
+        cache['subscription'] = get_loaders(request).subscriptions.load(user.pk)
+    return cache['subscription']
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from api.skills import get_skill_index
+
+
+class Command(BaseCommand):
+    help = "Adds a skill (or extra aliases for an existing one) to the skill index without rebuilding it."
+
+    def add_arguments(self, parser):
+        parser.add_argument('canonical', nargs='?', help='Canonical skill name, e.g. "Kubernetes".')
+        parser.add_argument('aliases', nargs='*', help='Alternative spellings, e.g. k8s kube.')
+        parser.add_argument(
+            '--compact',
+            action='store_true',
+            help='Fold journaled additions into the base index files.',
+        )
+
+    def handle(self, *args, **options):
+        index = get_skill_index()
+        if options['canonical']:
+            index.add_terms(options['canonical'], options['aliases'])
+            self.stdout.write(self.style.SUCCESS(f"Added {options['canonical']} to the skill index."))
+        if options['compact']:
+            index.compact()
+            self.stdout.write(self.style.SUCCESS("Skill index compacted."))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.partitioning import is_partitioned, list_partitions
+from api.retention import (
+    JobArchive,
+    archive_and_delete,
+    archive_partition,
+    archive_path,
+    ensure_job_partitions,
+    expired_jobs,
+    expired_partitions,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Archives finished analysis jobs past their plan's retention TTL (JOB_RETENTION) to a "
+        "gzip-compressed JSON Lines file and deletes them in small transactions. On a "
+        "partitioned job table, whole expired months are archived and dropped instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Rows per chunk (default: JOB_RETENTION BATCH_SIZE).')
+        parser.add_argument('--archive-dir', help='Directory for the archive file (default: JOB_RETENTION ARCHIVE_DIR).')
+        parser.add_argument('--dry-run', action='store_true', help='Count the expired jobs without archiving them.')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        if options['dry_run']:
+            count = archive_and_delete(expired_jobs(now), None, options['batch_size'], dry_run=True)
+            self.stdout.write(f"{count} expired job(s) would be archived.")
+            return
+
+        archive = JobArchive(archive_path(now, options['archive_dir']))
+        try:
+            if is_partitioned():
+                ensure_job_partitions(now)
+                for name, start in expired_partitions(list_partitions(), now):
+                    count, dropped = archive_partition(name, start, archive, options['batch_size'])
+                    if dropped:
+                        self.stdout.write(f"Dropped partition {name} ({count} job(s) archived).")
+                    else:
+                        self.stdout.write(f"Kept partition {name}: it has unfinished jobs ({count} job(s) archived).")
+            archive_and_delete(expired_jobs(now), archive, options['batch_size'])
+        finally:
+            archive.close()
+        self.stdout.write(self.style.SUCCESS(f"Archived and deleted {archive.count} job(s) to {archive.path}."))
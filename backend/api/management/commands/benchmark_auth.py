@@ -0,0 +1,65 @@
+import time
+
+from django.contrib.auth import authenticate, get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+from graphql_jwt.shortcuts import get_token
+
+from api.auth import token_cache
+from api.bench import summarize, write_report
+from api.loaders import load_subscription
+from api.models import Subscription
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the per-request cost of JWT authentication (token verification, user and "
+        "subscription loading) with and without the in-process token cache, in microseconds, "
+        "against a throwaway test database. Reports JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--output', help='Write the JSON report to this path instead of stdout.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            report = self._run(options['requests'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        write_report(report, options['output'])
+
+    def _run(self, requests):
+        user = get_user_model().objects.create_user(username='benchmark-auth', password='benchmark-password')
+        Subscription.objects.create(user=user, plan='PREMIUM')
+        header = f'JWT {get_token(user)}'
+        factory = RequestFactory()
+
+        def authenticate_request():
+            # What JSONWebTokenMiddleware and the resolvers do for an authenticated request.
+            request = factory.post('/graphql', HTTP_AUTHORIZATION=header)
+            authenticated = authenticate(request=request)
+            load_subscription(authenticated, request).is_premium()
+
+        report = {'benchmark': 'auth', 'config': {'requests': requests}, 'paths': {}}
+        for name, enabled in (('uncached', False), ('cached', True)):
+            token_cache.clear()
+            with override_settings(AUTH_CACHE={'ENABLED': enabled}):
+                authenticate_request()
+                seconds = []
+                with CaptureQueriesContext(connection) as queries:
+                    for _ in range(requests):
+                        started = time.perf_counter()
+                        authenticate_request()
+                        seconds.append(time.perf_counter() - started)
+            report['paths'][name] = {
+                'latency_us': summarize(seconds, unit='us'),
+                'queries_per_request': round(len(queries) / requests, 2),
+            }
+            self.stderr.write(f"{name}: {report['paths'][name]}")
+        return report
@@ -0,0 +1,86 @@
+import time
+from functools import partial
+
+from django.core.management.base import BaseCommand
+
+from api.analysis import run_combined_generation, run_generations
+from api.bench import CountingProvider, sample_text, summarize, write_report
+from api.gemini import (
+    PROMPT_BUILDERS,
+    build_combined_prompt,
+    generate_cover_letter,
+    generate_full_resume,
+    generate_resume_analysis,
+)
+from api.llm import FakeProvider, LLMClient, override_llm_client
+from api.preprocessing import estimate_tokens
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the separate (three-call) and combined (single-call) premium generation modes "
+        "offline against the fake LLM provider, reporting latency and input tokens as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--job-description-words', type=int, default=600)
+        parser.add_argument('--resume-words', type=int, default=800)
+        parser.add_argument('--latency', type=float, default=0.05, help='Fixed seconds per LLM call.')
+        parser.add_argument('--latency-per-1k-input', type=float, default=0.02)
+        parser.add_argument('--latency-per-1k-output', type=float, default=0.1)
+        parser.add_argument('--output', help='Write the JSON report to this path instead of stdout.')
+
+    def handle(self, *args, **options):
+        job_description = sample_text(options['job_description_words'], seed='job-description')
+        resume_text = sample_text(options['resume_words'], seed='resume')
+        generations = {
+            'analysis_result': generate_resume_analysis,
+            'generated_resume': generate_full_resume,
+            'generated_cover_letter': generate_cover_letter,
+        }
+
+        def ignore_result(field, text, ok):
+            pass
+
+        modes = {
+            'separate': (
+                partial(run_generations, generations, job_description, resume_text, ignore_result),
+                sum(estimate_tokens(build(job_description, resume_text)) for build in PROMPT_BUILDERS.values()),
+            ),
+            'combined': (
+                partial(run_combined_generation, generations, job_description, resume_text, ignore_result),
+                estimate_tokens(build_combined_prompt(job_description, resume_text, list(generations))),
+            ),
+        }
+
+        report = {
+            'benchmark': 'generation_modes',
+            'config': {key: options[key] for key in (
+                'iterations', 'job_description_words', 'resume_words',
+                'latency', 'latency_per_1k_input', 'latency_per_1k_output',
+            )},
+            'modes': {},
+        }
+        for mode, (run, input_tokens) in modes.items():
+            provider = CountingProvider(FakeProvider(
+                LATENCY=options['latency'],
+                LATENCY_PER_1K_INPUT_TOKENS=options['latency_per_1k_input'],
+                LATENCY_PER_1K_OUTPUT_TOKENS=options['latency_per_1k_output'],
+            ))
+            client = LLMClient(provider, max_retries=0, backoff_base=0, backoff_max=0, timeout=60)
+            durations, failures = [], 0
+            with override_llm_client(client):
+                for _ in range(options['iterations']):
+                    started = time.perf_counter()
+                    outcomes = run()
+                    durations.append(time.perf_counter() - started)
+                    failures += list(outcomes.values()).count(False)
+            report['modes'][mode] = {
+                'latency_ms': summarize(durations),
+                'input_tokens_per_job': input_tokens,
+                'llm_calls_per_job': provider.calls / max(1, options['iterations']),
+                'failed_generations': failures,
+            }
+
+        write_report(report, options['output'])
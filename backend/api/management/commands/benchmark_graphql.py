@@ -0,0 +1,272 @@
+import importlib
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import django
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import clear_url_caches
+from graphql_jwt.shortcuts import get_token
+
+from api.bench import compare_reports, run_load, run_load_async, sample_text, summarize_load, write_report
+from api.llm import FakeProvider, LLMClient, override_llm_client
+from api.models import Subscription
+from api.queue import make_worker_id, process_next_task
+
+PASSWORD = 'benchmark-password'
+
+TOKEN_AUTH = '''
+    mutation TokenAuth($username: String!, $password: String!) {
+        tokenAuth(username: $username, password: $password) { token }
+    }
+'''
+CREATE_JOB = '''
+    mutation CreateAnalysisJob($jobDescription: String!, $resumeText: String!, $full: Boolean, $letter: Boolean) {
+        createAnalysisJob(jobDescription: $jobDescription, resumeText: $resumeText,
+                          generateFullResume: $full, generateCoverLetter: $letter) {
+            job { id status }
+        }
+    }
+'''
+JOB_POLL = 'query Job($id: UUID!) { job(id: $id) { id status version } }'
+ME = 'query Me { me { username isPremium subscription { plan } } }'
+
+OPERATIONS = ('token_auth', 'create_job_free', 'create_job_premium', 'job_poll', 'me')
+
+
+def _succeeded(response, on_success):
+    body = response.json()
+    ok = response.status_code == 200 and not body.get('errors')
+    if ok and on_success is not None:
+        on_success(body)
+    return ok
+
+
+@contextmanager
+def serving_mode(mode):
+    """
+    Serves /graphql with the view the given deployment uses: GraphQLView under WSGI (sync),
+    AsyncGraphQLView under ASGI (async).
+    """
+    def reload_urls():
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+        clear_url_caches()
+
+    with override_settings(GRAPHQL_ASYNC=mode == 'async'):
+        reload_urls()
+        try:
+            yield
+        finally:
+            reload_urls()
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests the GraphQL API in-process (through the full middleware stack) with a "
+        "latency-simulating fake LLM, and reports p50/p95/p99 latency, throughput and DB "
+        "queries per operation as JSON. Runs against a throwaway test database unless "
+        "--use-current-db is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', nargs='+', choices=OPERATIONS, default=list(OPERATIONS))
+        parser.add_argument(
+            '--mode',
+            choices=('sync', 'async'),
+            default='sync',
+            help='sync: the WSGI deployment, one thread per request. async: the ASGI deployment, '
+                 'one event loop with --concurrency tasks.',
+        )
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per operation.')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per operation.')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Queue worker threads processing the created jobs meanwhile (0 to leave them queued).',
+        )
+        parser.add_argument('--llm-latency', type=float, default=0.2, help='Fixed seconds per fake LLM call.')
+        parser.add_argument('--use-current-db', action='store_true', help="Don't create a test database.")
+        parser.add_argument('--output', help='Write the JSON report to this path instead of stdout.')
+        parser.add_argument('--baseline', help='A previous report; regressions against it are listed in the report.')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.2,
+            help='Allowed p95 slowdown against --baseline, as a fraction.',
+        )
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        old_name = None
+        setup_test_environment()
+        try:
+            if not options['use_current_db']:
+                if connection.vendor == 'sqlite':
+                    # A file rather than the default in-memory test database, so that concurrent
+                    # threads can share it. Writers take the lock up front and wait for each other
+                    # instead of failing with "database is locked" when a read upgrades to a write.
+                    connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite3')
+                    connection.settings_dict['OPTIONS'].update(
+                        transaction_mode='IMMEDIATE', timeout=30, init_command='PRAGMA journal_mode=WAL;'
+                    )
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            report = self._run(options)
+        finally:
+            connections.close_all()
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        failing = {name: result['errors'] for name, result in report['operations'].items() if result['errors']}
+        if failing:
+            # Latencies of failed requests measure the error path; never keep them as a report or baseline.
+            raise CommandError(
+                "Requests failed, no report written: "
+                + ", ".join(f"{name} {errors}/{options['requests']}" for name, errors in failing.items())
+            )
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                report['regressions'] = compare_reports(json.load(handle), report, options['threshold'])
+        write_report(report, options['output'])
+        if options['fail_on_regression'] and report.get('regressions'):
+            raise CommandError(f"{len(report['regressions'])} regression(s) against {options['baseline']}.")
+
+    def _run(self, options):
+        concurrency = options['concurrency']
+        users = {plan: self._users(plan, concurrency) for plan in ('FREE', 'PREMIUM')}
+        tokens = {plan: [get_token(user) for user in plan_users] for plan, plan_users in users.items()}
+        job_ids = []
+        job_description = sample_text(300, seed='benchmark-job-description')
+
+        # Each operation returns the request to send: (query, variables, token, on_success).
+        def create_job(plan, premium_outputs):
+            def operation(worker, index):
+                return CREATE_JOB, {
+                    'jobDescription': job_description,
+                    # Distinct resumes, so the generation cache doesn't short-circuit the workers.
+                    'resumeText': sample_text(400, seed=f'benchmark-resume-{plan}-{index}-{time.time_ns()}'),
+                    'full': premium_outputs,
+                    'letter': premium_outputs,
+                }, tokens[plan][worker], lambda body: job_ids.append(body['data']['createAnalysisJob']['job']['id'])
+            return operation
+
+        def token_auth(worker, index):
+            return TOKEN_AUTH, {'username': users['FREE'][worker].username, 'password': PASSWORD}, None, None
+
+        def job_poll(worker, index):
+            if not job_ids:
+                return create_job('PREMIUM', False)(worker, index)
+            return JOB_POLL, {'id': job_ids[index % len(job_ids)]}, tokens['PREMIUM'][worker], None
+
+        def me(worker, index):
+            return ME, None, tokens['PREMIUM'][worker], None
+
+        operations = {
+            'token_auth': token_auth,
+            'create_job_free': create_job('FREE', False),
+            'create_job_premium': create_job('PREMIUM', True),
+            'job_poll': job_poll,
+            'me': me,
+        }
+        load = self._async_load if options['mode'] == 'async' else self._sync_load
+
+        client = LLMClient(FakeProvider(LATENCY=options['llm_latency']), max_retries=0, backoff_base=0, backoff_max=0, timeout=60)
+        unlimited = {"PER_MINUTE": 10 ** 9, "PER_DAY": 10 ** 9, "CONCURRENT": 10 ** 9, "BATCH_SIZE": 200}
+        stop = threading.Event()
+        report = {
+            'benchmark': 'graphql',
+            'commit': self._commit(),
+            'config': {
+                **{key: options[key] for key in ('mode', 'requests', 'warmup', 'concurrency', 'workers', 'llm_latency')},
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'operations': {},
+        }
+        with override_settings(ANALYSIS_QUOTAS={"FREE": unlimited, "PREMIUM": unlimited}), override_llm_client(client), \
+                serving_mode(options['mode']):
+            workers = [threading.Thread(target=self._work, args=(stop,)) for _ in range(options['workers'])]
+            for worker in workers:
+                worker.start()
+            try:
+                for name in options['operations']:
+                    if options['warmup']:
+                        load(operations[name], options['warmup'], concurrency)
+                    report['operations'][name] = summarize_load(load(operations[name], options['requests'], concurrency))
+                    self.stderr.write(f"{name}: {report['operations'][name]['latency_ms']}")
+            finally:
+                stop.set()
+                for worker in workers:
+                    worker.join()
+        return report
+
+    def _sync_load(self, operation, requests, concurrency):
+        clients = [Client() for _ in range(concurrency)]
+
+        def send(worker, index):
+            query, variables, token, on_success = operation(worker, index)
+            headers = {'HTTP_AUTHORIZATION': f'JWT {token}'} if token else {}
+            response = clients[worker].post(
+                '/graphql', {'query': query, 'variables': variables or {}}, content_type='application/json', **headers
+            )
+            return _succeeded(response, on_success)
+
+        return run_load(send, requests, concurrency)
+
+    def _async_load(self, operation, requests, concurrency):
+        clients = [AsyncClient() for _ in range(concurrency)]
+
+        async def send(worker, index):
+            query, variables, token, on_success = operation(worker, index)
+            headers = {'Authorization': f'JWT {token}'} if token else {}
+            # Like an ASGI server, give each request its own thread for sync code.
+            async with ThreadSensitiveContext():
+                response = await clients[worker].post(
+                    '/graphql', {'query': query, 'variables': variables or {}}, content_type='application/json',
+                    headers=headers,
+                )
+            return _succeeded(response, on_success)
+
+        return run_load_async(send, requests, concurrency)
+
+    def _users(self, plan, count):
+        users = []
+        for index in range(count):
+            user, created = get_user_model().objects.get_or_create(username=f'benchmark-{plan.lower()}-{index}')
+            if created:
+                user.set_password(PASSWORD)
+                user.save()
+            Subscription.objects.update_or_create(user=user, defaults={'plan': plan, 'active_until': None})
+            users.append(user)
+        return users
+
+    def _work(self, stop):
+        worker_id = make_worker_id()
+        try:
+            while not stop.is_set():
+                if not process_next_task(worker_id):
+                    stop.wait(0.05)
+        finally:
+            connections.close_all()
+
+    def _commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True, timeout=5
+            ).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
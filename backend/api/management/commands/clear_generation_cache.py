@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import get_generation_cache
+
+
+class Command(BaseCommand):
+    help = "Invalidates cached Gemini generations, e.g. after a prompt template change."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-only',
+            action='store_true',
+            help='Only drop entries created with an older PROMPT_TEMPLATE_VERSION.',
+        )
+        parser.add_argument(
+            '--expired',
+            action='store_true',
+            help='Only delete entries past their TTL (safe to run from cron).',
+        )
+
+    def handle(self, *args, **options):
+        if options['expired']:
+            count = get_generation_cache().purge_expired()
+            self.stdout.write(self.style.SUCCESS(f"Deleted {count} expired generation(s)."))
+            return
+        get_generation_cache().invalidate(stale_only=options['stale_only'])
+        self.stdout.write(self.style.SUCCESS("Generation cache invalidated."))
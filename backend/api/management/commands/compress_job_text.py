@@ -0,0 +1,81 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q, TextField
+from django.db.models.functions import Left, Length
+from django.db.models.lookups import GreaterThanOrEqual
+
+from api.compression import MARKER, compression_setting
+from api.models import AnalysisJob, GenerationCacheEntry, JobDescription
+
+# Compressed text columns, per model.
+TARGETS = (
+    (AnalysisJob, ('resume_text', 'analysis_result', 'generated_resume', 'generated_cover_letter')),
+    (GenerationCacheEntry, ('value',)),
+    (JobDescription, ('text',)),
+)
+
+
+def pending_rows(model, fields):
+    """
+    Rows with at least one long value still stored as plain text, plus (for jobs) rows
+    whose job description hasn't been moved to a JobDescription yet.
+    """
+    min_length = compression_setting("MIN_LENGTH")
+    queryset = model.objects.annotate(
+        **{f'{field}_head': Left(field, 1, output_field=TextField()) for field in fields}
+    )
+    condition = Q()
+    for field in fields:
+        condition |= Q(GreaterThanOrEqual(Length(field), min_length)) & ~Q(**{f'{field}_head': MARKER})
+    if model is AnalysisJob:
+        condition |= Q(job_description_text__isnull=False)
+    return queryset.filter(condition)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compresses plain-text rows written before text compression and moves job descriptions "
+        "to the deduplicated JobDescription table. Works in small batches and can be stopped "
+        "and rerun at any time; finished rows are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Rows rewritten per transaction.')
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.0,
+            help='Seconds to pause between batches, to limit the load on a busy database.',
+        )
+
+    def handle(self, *args, **options):
+        for model, fields in TARGETS:
+            total = self._compress_model(model, fields, options['batch_size'], options['sleep'])
+            self.stdout.write(self.style.SUCCESS(f"{model.__name__}: rewrote {total} row(s)."))
+
+    def _compress_model(self, model, fields, batch_size, sleep):
+        columns = list(fields) + (['job_description_text', 'job_description_ref'] if model is AnalysisJob else [])
+        total, last_pk = 0, None
+        while True:
+            # Keyset over the primary key, so rows that can't be compressed (short values)
+            # are only looked at once per run.
+            rows = pending_rows(model, fields).order_by('pk').only('pk', *columns)
+            if last_pk is not None:
+                rows = rows.filter(pk__gt=last_pk)
+            with transaction.atomic():
+                batch = list(rows.select_for_update()[:batch_size])
+                if not batch:
+                    return total
+                for row in batch:
+                    if model is AnalysisJob and row.job_description_text is not None:
+                        row.job_description_ref = JobDescription.objects.intern(row.job_description_text)
+                        row.job_description_text = None
+                # The values read back decompressed; writing them again stores them compressed.
+                model.objects.bulk_update(batch, columns)
+            total += len(batch)
+            last_pk = batch[-1].pk
+            self.stdout.write(f"{model.__name__}: {total} row(s) rewritten...")
+            if sleep:
+                time.sleep(sleep)
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.partitioning import convert_to_partitioned, ensure_partitions, is_partitioned, supports_partitioning
+from api.retention import retention_setting
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates upcoming monthly partitions of the analysis job table (PostgreSQL only). "
+        "With --convert, first rebuilds the existing table as a partitioned one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Rebuild the job table partitioned by created_at. Locks the table while it copies every row.',
+        )
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            help='Partitions to create past the current month (default: JOB_RETENTION PARTITION_MONTHS_AHEAD).',
+        )
+
+    def handle(self, *args, **options):
+        if not supports_partitioning():
+            self.stdout.write("Partitioning needs PostgreSQL; retention uses row deletes on this database.")
+            return
+
+        now = timezone.now()
+        months_ahead = options['months_ahead']
+        if months_ahead is None:
+            months_ahead = retention_setting("PARTITION_MONTHS_AHEAD")
+        if not is_partitioned():
+            if not options['convert']:
+                self.stdout.write("The job table isn't partitioned; run with --convert to partition it.")
+                return
+            convert_to_partitioned(now, months_ahead)
+            self.stdout.write(self.style.SUCCESS("Job table converted to monthly partitions."))
+        ensure_partitions(now, months_ahead)
+        self.stdout.write(self.style.SUCCESS(f"Partitions ensured through {months_ahead} month(s) ahead."))
@@ -0,0 +1,91 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from api.metrics import metrics_setting, serve_metrics
+from api.queue import make_worker_id, process_next_task, queue_setting
+from api.retention import ensure_job_partitions
+
+
+class Command(BaseCommand):
+    help = "Processes analysis jobs from the database-backed queue. Run several processes to scale out."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=queue_setting("CONCURRENCY"),
+            help='Number of worker threads in this process.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=queue_setting("POLL_INTERVAL"),
+            help='Seconds to sleep when the queue is empty.',
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once the queue is empty instead of polling forever.',
+        )
+        parser.add_argument(
+            '--metrics-port',
+            type=int,
+            help="Serve this process's job and LLM metrics at :PORT/metrics for Prometheus (needs METRICS_TOKEN).",
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+
+        def request_stop(signum, frame):
+            self.stdout.write("Shutting down after the current jobs finish...")
+            stop.set()
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        # Workers start with every deploy; new months must have a partition before jobs arrive.
+        ensure_job_partitions(timezone.now())
+
+        metrics_server = None
+        if options['metrics_port'] is not None:
+            metrics_server = serve_metrics(options['metrics_port'])
+            self.stdout.write(f"Serving metrics on port {options['metrics_port']}.")
+            if not metrics_setting("TOKEN"):
+                self.stderr.write("METRICS_TOKEN is not set, so /metrics answers 404.")
+
+        threads = [
+            threading.Thread(
+                target=self._work,
+                args=(stop, options['poll_interval'], options['burst']),
+                name=f"analysis-worker-{i}",
+            )
+            for i in range(max(1, options['concurrency']))
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f"Started {len(threads)} analysis worker thread(s).")
+        for thread in threads:
+            thread.join()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+    def _work(self, stop, poll_interval, burst):
+        worker_id = make_worker_id()
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                try:
+                    processed = process_next_task(worker_id)
+                except Exception as e:
+                    self.stderr.write(f"[{worker_id}] error while processing queue: {e}")
+                    processed = False
+                if not processed:
+                    if burst:
+                        return
+                    stop.wait(poll_interval)
+        finally:
+            connection.close()
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.compression import MAX_DICTIONARY_SIZE, ZLIB, ZSTD, default_codec, reset_dictionaries, train_dictionary, zstandard
+from api.models import CompressionDictionary, JobDescription
+
+
+class Command(BaseCommand):
+    help = (
+        "Trains a shared compression dictionary on recent job descriptions. New job descriptions "
+        "are compressed with the latest dictionary; older values keep the one they were written with."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=2000, help='Number of recent job descriptions to train on.')
+        parser.add_argument('--size', type=int, default=MAX_DICTIONARY_SIZE, help='Maximum dictionary size in bytes.')
+        parser.add_argument('--codec', choices=('zstd', 'zlib'), help='Defaults to the TEXT_COMPRESSION codec.')
+
+    def handle(self, *args, **options):
+        codec = {'zstd': ZSTD, 'zlib': ZLIB}.get(options['codec']) or default_codec()
+        if codec == ZSTD and zstandard is None:
+            raise CommandError("The zstandard package is required to train a zstd dictionary.")
+
+        samples = list(
+            JobDescription.objects.order_by('-created_at').values_list('text', flat=True)[:options['samples']]
+        )
+        if len(samples) < 10:
+            raise CommandError(f"Need at least 10 job descriptions to train on; found {len(samples)}.")
+
+        codec, data = train_dictionary(samples, codec=codec, size=options['size'])
+        if not data:
+            raise CommandError("The samples have too little in common to build a dictionary.")
+        dictionary = CompressionDictionary.objects.create(codec=codec, data=data, sample_count=len(samples))
+        reset_dictionaries()
+        self.stdout.write(self.style.SUCCESS(f"Created {dictionary} from {len(samples)} job descriptions."))
@@ -0,0 +1,300 @@
+import bisect
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from graphene.types.resolver import attr_resolver, dict_or_attr_resolver, dict_resolver
+from graphene_django import DjangoObjectType
+
+DEFAULT_METRICS_SETTINGS = {
+    # Serve GET /metrics. Metrics are still collected when this is off.
+    "ENABLED": True,
+    # /metrics requires "Authorization: Bearer <TOKEN>". Without a token it isn't served at
+    # all, so the metrics never end up public by accident.
+    "TOKEN": None,
+}
+
+# Seconds. Stages and resolvers are mostly milliseconds; LLM calls take seconds.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def metrics_setting(name):
+    return getattr(settings, 'METRICS', {}).get(name, DEFAULT_METRICS_SETTINGS[name])
+
+
+def metrics_status(authorization):
+    """
+    The HTTP status for a /metrics request with this Authorization header: 404 when the
+    endpoint is disabled or no token is configured, 401 for a wrong token, 200 otherwise.
+    """
+    token = metrics_setting("TOKEN")
+    if not metrics_setting("ENABLED") or not token:
+        return 404
+    if authorization != f"Bearer {token}":
+        return 401
+    return 200
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """
+    A Prometheus-style cumulative histogram. Values live in this process only: a web
+    process's /metrics has what its requests recorded, and the analysis worker, where jobs
+    run, serves its own with --metrics-port (see serve_metrics). With several gunicorn
+    workers behind one port, scrape each process rather than the shared address.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), sum, count.
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        series = self._series.get(tuple(labels[name] for name in self.labelnames))
+        return series[2] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, [("le", bound)])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+ANALYSIS_STAGE_SECONDS = Histogram(
+    "resumeforge_analysis_stage_seconds",
+    "Time spent in each stage of an analysis job.",
+    ["stage"],
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "resumeforge_llm_request_seconds",
+    "Latency of LLM generations, by result field and outcome.",
+    ["field", "outcome"],
+)
+LLM_TOKENS = Counter(
+    "resumeforge_llm_tokens_total",
+    "Estimated LLM tokens sent and received, by result field.",
+    ["field", "direction"],
+)
+ANALYSIS_JOBS = Counter(
+    "resumeforge_analysis_jobs_total",
+    "Analysis jobs finished, by final status.",
+    ["status"],
+)
+GRAPHQL_RESOLVER_SECONDS = Histogram(
+    "resumeforge_graphql_resolver_seconds",
+    "Latency of GraphQL resolvers, by Type.field.",
+    ["field"],
+)
+GENERATION_CACHE_LOOKUPS = Counter(
+    "resumeforge_generation_cache_lookups_total",
+    "Generation cache lookups, by tier and whether that tier had the entry.",
+    ["tier", "result"],
+)
+GENERATION_CACHE_MISSES = Counter(
+    "resumeforge_generation_cache_misses_total",
+    "Generation cache lookups that no tier could answer.",
+)
+
+METRICS = (
+    ANALYSIS_STAGE_SECONDS,
+    LLM_REQUEST_SECONDS,
+    LLM_TOKENS,
+    ANALYSIS_JOBS,
+    GRAPHQL_RESOLVER_SECONDS,
+    GENERATION_CACHE_LOOKUPS,
+    GENERATION_CACHE_MISSES,
+)
+
+
+def render_metrics():
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+def reset_metrics():
+    for metric in METRICS:
+        metric.reset()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        status = metrics_status(self.headers.get('Authorization')) if self.path.split('?')[0] == '/metrics' else 404
+        if status != 200:
+            self.send_error(status)
+        else:
+            body = render_metrics().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would drown the worker's own output.
+        pass
+
+
+def serve_metrics(port, host=''):
+    """
+    Serves this process's metrics at http://host:port/metrics from a daemon thread, for
+    processes without the Django views (the analysis worker, where the job stage, LLM and
+    job metrics are recorded). Like the view, it answers 404 until METRICS["TOKEN"] is set.
+    Returns the server.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+
+class JobTimings:
+    """
+    Collects the timings of one analysis job. Each measurement goes to the histograms as
+    it happens; `as_dict()` is what gets stored in `AnalysisJob.stats["timings"]`.
+    """
+
+    def __init__(self, queue_wait=None):
+        self.stages = {}
+        self.generations = {}
+        if queue_wait is not None:
+            self.record('queue_wait', queue_wait)
+
+    def record(self, stage, seconds):
+        # Stages that run several times (e.g. db_save) accumulate.
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        ANALYSIS_STAGE_SECONDS.observe(seconds, stage=stage)
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def generation(self, field, seconds, ok, input_tokens, output_tokens, cached=False, error=None):
+        self.generations[field] = {
+            "ms": round(seconds * 1000, 1),
+            "ok": ok,
+            "cached": cached,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+        }
+        if error is not None:
+            self.generations[field]["error"] = error
+        if not cached:
+            LLM_REQUEST_SECONDS.observe(seconds, field=field, outcome="ok" if ok else "error")
+            LLM_TOKENS.inc(input_tokens, field=field, direction="input")
+            LLM_TOKENS.inc(output_tokens, field=field, direction="output")
+
+    def as_dict(self):
+        return {
+            "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in self.stages.items()},
+            "generations": self.generations,
+        }
+
+
+_TRIVIAL_RESOLVERS = (attr_resolver, dict_or_attr_resolver, dict_resolver)
+
+
+def _is_trivial(resolver):
+    # Plain attribute reads aren't worth a histogram observation each.
+    return (
+        isinstance(resolver, partial) and resolver.func in _TRIVIAL_RESOLVERS
+    ) or resolver is DjangoObjectType.resolve_id
+
+
+class ResolverTimingMiddleware:
+    """
+    Graphene middleware that records resolver latency in GRAPHQL_RESOLVER_SECONDS.
+
+    Root fields are always timed (their time includes the database work for the whole
+    selection); nested fields only when they have their own resolver. Async resolvers are
+    timed until their result is awaited.
+    """
+
+    def resolve(self, next, root, info, **args):
+        if info.path.prev is not None and _is_trivial(info.parent_type.fields[info.field_name].resolve):
+            return next(root, info, **args)
+        field = f"{info.parent_type.name}.{info.field_name}"
+        started = time.perf_counter()
+        try:
+            result = next(root, info, **args)
+        except Exception:
+            GRAPHQL_RESOLVER_SECONDS.observe(time.perf_counter() - started, field=field)
+            raise
+        if inspect.isawaitable(result):
+            return self._resolve_async(result, started, field)
+        GRAPHQL_RESOLVER_SECONDS.observe(time.perf_counter() - started, field=field)
+        return result
+
+    async def _resolve_async(self, result, started, field):
+        try:
+            return await result
+        finally:
+            GRAPHQL_RESOLVER_SECONDS.observe(time.perf_counter() - started, field=field)
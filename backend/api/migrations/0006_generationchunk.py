@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_generationcacheentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=50)),
+                ('text', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='api.analysisjob')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['job', 'id'], name='api_chunk_job_id_idx')],
+            },
+        ),
+    ]
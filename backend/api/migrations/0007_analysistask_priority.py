@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_generationchunk'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='analysistask',
+            name='api_task_state_avail_idx',
+        ),
+        migrations.AddField(
+            model_name='analysistask',
+            name='priority',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='analysistask',
+            index=models.Index(fields=['state', 'priority', 'available_at'], name='api_task_claim_idx'),
+        ),
+    ]
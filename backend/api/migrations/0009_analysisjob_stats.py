@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_quotas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='stats',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
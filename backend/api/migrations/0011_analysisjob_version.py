@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_analysisbatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_analysisjob_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='ats_score',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
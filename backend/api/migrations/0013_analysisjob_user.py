@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_job_owners(apps, schema_editor):
+    # Jobs submitted since the queue was introduced know their owner through their task.
+    AnalysisJob = apps.get_model('api', 'AnalysisJob')
+    AnalysisTask = apps.get_model('api', 'AnalysisTask')
+    owners = AnalysisTask.objects.filter(job=OuterRef('pk'), user__isnull=False).values('user')[:1]
+    AnalysisJob.objects.filter(user__isnull=True).update(user=Subquery(owners))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_analysisjob_ats_score'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='analysis_jobs', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_job_owners, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='analysisjob',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='api_job_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analysisjob',
+            index=models.Index(fields=['status', 'updated_at'], name='api_job_status_updated_idx'),
+        ),
+    ]
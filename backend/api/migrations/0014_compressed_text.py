@@ -0,0 +1,80 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:14
+
+import api.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_analysisjob_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompressionDictionary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codec', models.CharField(choices=[('z', 'zlib'), ('s', 'zstd')], max_length=1)),
+                ('data', models.BinaryField()),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='JobDescription',
+            fields=[
+                ('hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('text', api.fields.CompressedTextField(use_dictionary=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        # Existing rows keep their text in the same column; `manage.py compress_job_text`
+        # moves it to JobDescription afterwards.
+        migrations.RenameField(
+            model_name='analysisjob',
+            old_name='job_description',
+            new_name='job_description_text',
+        ),
+        migrations.AlterField(
+            model_name='analysisjob',
+            name='job_description_text',
+            field=api.fields.CompressedTextField(blank=True, db_column='job_description', null=True),
+        ),
+        migrations.AlterField(
+            model_name='analysisbatch',
+            name='job_description',
+            field=api.fields.CompressedTextField(use_dictionary=True),
+        ),
+        migrations.AlterField(
+            model_name='analysisjob',
+            name='analysis_result',
+            field=api.fields.CompressedTextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='analysisjob',
+            name='generated_cover_letter',
+            field=api.fields.CompressedTextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='analysisjob',
+            name='generated_resume',
+            field=api.fields.CompressedTextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='analysisjob',
+            name='resume_text',
+            field=api.fields.CompressedTextField(),
+        ),
+        migrations.AlterField(
+            model_name='generationcacheentry',
+            name='value',
+            field=api.fields.CompressedTextField(),
+        ),
+        migrations.AddField(
+            model_name='analysisjob',
+            name='job_description_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='jobs', to='api.jobdescription'),
+        ),
+    ]
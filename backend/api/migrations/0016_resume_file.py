@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:46
+
+import api.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_job_cancellation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumeFile',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('file_type', models.CharField(choices=[('pdf', 'PDF'), ('docx', 'DOCX')], max_length=10)),
+                ('size', models.PositiveIntegerField()),
+                ('pages', models.PositiveIntegerField(blank=True, null=True)),
+                ('text', api.fields.CompressedTextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
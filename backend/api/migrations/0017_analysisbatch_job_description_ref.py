@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:20
+
+import hashlib
+
+import api.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_batch_job_descriptions(apps, schema_editor):
+    # Batches kept their own copy of the text; point them at the JobDescription their jobs share.
+    AnalysisBatch = apps.get_model('api', 'AnalysisBatch')
+    JobDescription = apps.get_model('api', 'JobDescription')
+    batches = AnalysisBatch.objects.filter(job_description_ref__isnull=True).only('id', 'job_description')
+    chunk = []
+    for batch in batches.iterator(chunk_size=500):
+        batch.job_description_ref_id = hashlib.sha256(batch.job_description.encode('utf-8')).hexdigest()
+        chunk.append(batch)
+        if len(chunk) == 500:
+            _save(JobDescription, AnalysisBatch, chunk)
+            chunk = []
+    _save(JobDescription, AnalysisBatch, chunk)
+
+
+def _save(JobDescription, AnalysisBatch, batches):
+    JobDescription.objects.bulk_create(
+        [JobDescription(hash=batch.job_description_ref_id, text=batch.job_description) for batch in batches],
+        ignore_conflicts=True,
+    )
+    AnalysisBatch.objects.bulk_update(batches, ['job_description_ref'])
+
+
+def restore_batch_job_descriptions(apps, schema_editor):
+    AnalysisBatch = apps.get_model('api', 'AnalysisBatch')
+    for batch in AnalysisBatch.objects.select_related('job_description_ref').iterator(chunk_size=500):
+        batch.job_description = batch.job_description_ref.text
+        batch.save(update_fields=['job_description'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_resume_file'),
+    ]
+
+    operations = [
+        # Nullable, so that reverting 0018 can bring the column back before it is refilled.
+        migrations.AlterField(
+            model_name='analysisbatch',
+            name='job_description',
+            field=api.fields.CompressedTextField(blank=True, null=True, use_dictionary=True),
+        ),
+        migrations.AddField(
+            model_name='analysisbatch',
+            name='job_description_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='batches', to='api.jobdescription'),
+        ),
+        migrations.RunPython(move_batch_job_descriptions, restore_batch_job_descriptions),
+    ]
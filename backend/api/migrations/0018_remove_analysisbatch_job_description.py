@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from 0017: PostgreSQL won't alter a table with rows updated earlier in the
+    # same transaction (pending foreign key trigger events).
+
+    dependencies = [
+        ('api', '0017_analysisbatch_job_description_ref'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='analysisbatch',
+            name='job_description',
+        ),
+        migrations.AlterField(
+            model_name='analysisbatch',
+            name='job_description_ref',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='batches', to='api.jobdescription'),
+        ),
+    ]
@@ -1,8 +1,98 @@
+import hashlib
 import uuid
-from django.db import models
+from django.db import connections, models
 from django.conf import settings
 from django.utils import timezone
 
+from .fields import CompressedTextField
+
+class CompressionDictionary(models.Model):
+    """
+    A shared compression dictionary trained on past job descriptions
+    (`manage.py train_compression_dictionary`). Rows are never modified once written:
+    values compressed with a dictionary record its id and need it to be read back.
+    """
+    CODEC_CHOICES = (
+        ('z', 'zlib'),
+        ('s', 'zstd'),
+    )
+
+    codec = models.CharField(max_length=1, choices=CODEC_CHOICES)
+    data = models.BinaryField()
+    sample_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"CompressionDictionary {self.pk} ({self.get_codec_display()}, {len(self.data)} bytes)"
+
+class JobDescriptionManager(models.Manager):
+    def intern(self, text):
+        """
+        Returns the JobDescription for `text`, creating it if this exact text hasn't been
+        submitted before. An INSERT ... ON CONFLICT DO NOTHING, so concurrent submissions of
+        the same text don't race.
+
+        On PostgreSQL the row is then share-locked until the caller's transaction ends, so
+        retention (api.retention) can't delete it before the caller's job references it. If
+        retention got there first, the row is inserted again.
+        """
+        job_description = JobDescription(hash=JobDescription.hash_text(text), text=text)
+        while True:
+            self.bulk_create([job_description], ignore_conflicts=True)
+            if self._lock_for_reference(job_description.hash):
+                break
+        job_description._state.adding = False
+        return job_description
+
+    def _lock_for_reference(self, hash):
+        connection = connections[self.db]
+        if connection.vendor != 'postgresql':
+            return True
+        # FOR KEY SHARE conflicts with DELETE but not with other submissions of the same text.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT 1 FROM {connection.ops.quote_name(self.model._meta.db_table)} WHERE hash = %s FOR KEY SHARE",
+                [hash],
+            )
+            return cursor.fetchone() is not None
+
+class JobDescription(models.Model):
+    """
+    Deduplicated job description text. Many users submit the same posting verbatim, so
+    jobs and batches reference one compressed row by its SHA-256 instead of each
+    storing a copy.
+    """
+    hash = models.CharField(max_length=64, primary_key=True)
+    text = CompressedTextField(use_dictionary=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = JobDescriptionManager()
+
+    @staticmethod
+    def hash_text(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def __str__(self):
+        return f"JobDescription {self.hash[:12]}"
+
+class AnalysisBatch(models.Model):
+    """
+    One job description scored against many resumes; each resume is a child AnalysisJob.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True, related_name='analysis_batches')
+    # The same JobDescription row its jobs reference.
+    job_description_ref = models.ForeignKey(JobDescription, on_delete=models.PROTECT, related_name='batches')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def job_description(self):
+        return self.job_description_ref.text
+
+    def __str__(self):
+        return f"AnalysisBatch {self.id}"
+
 class AnalysisJob(models.Model):
     """
     Model to store the details of an analysis job.
@@ -12,18 +102,72 @@ class AnalysisJob(models.Model):
         ('IN_PROGRESS', 'In Progress'),
         ('COMPLETED', 'Completed'),
         ('FAILED', 'Failed'),
+        ('CANCELLED', 'Cancelled'),
     )
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    job_description = models.TextField()
-    resume_text = models.TextField()
-    analysis_result = models.TextField(blank=True, null=True)
-    generated_resume = models.TextField(blank=True, null=True)
-    generated_cover_letter = models.TextField(blank=True, null=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True, related_name='analysis_jobs')
+    batch = models.ForeignKey(AnalysisBatch, on_delete=models.CASCADE, blank=True, null=True, related_name='jobs')
+    # Read and write the job description through the `job_description` property. Rows
+    # created before deduplication keep their own copy in `job_description_text` until
+    # `manage.py compress_job_text` moves it to a JobDescription.
+    job_description_ref = models.ForeignKey(JobDescription, on_delete=models.PROTECT, blank=True, null=True, related_name='jobs')
+    job_description_text = CompressedTextField(blank=True, null=True, db_column='job_description')
+    resume_text = CompressedTextField()
+    analysis_result = CompressedTextField(blank=True, null=True)
+    generated_resume = CompressedTextField(blank=True, null=True)
+    generated_cover_letter = CompressedTextField(blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    # Processing statistics, e.g. {"preprocessing": {"tokens_saved": ...}}
+    stats = models.JSONField(default=dict, blank=True)
+    # Local keyword/skill match computed before any LLM call; see api.scoring.score_match.
+    ats_score = models.JSONField(blank=True, null=True)
+    # Bumped on every write so pollers can ask "has anything changed since version N?"
+    version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @property
+    def job_description(self):
+        if getattr(self, '_pending_job_description', None) is not None:
+            return self._pending_job_description
+        if self.job_description_ref_id is not None:
+            return self.job_description_ref.text
+        return self.job_description_text
+
+    @job_description.setter
+    def job_description(self, text):
+        # Interned on save(); bulk_create() callers must set job_description_ref themselves.
+        self._pending_job_description = text
+
+    def save(self, *args, **kwargs):
+        """
+        Increments `version` in the database. Like any F() assignment, the in-memory value is
+        an expression until the instance is refreshed. Bulk `.update()` calls on jobs must
+        bump the version themselves with `version=F('version') + 1`.
+
+        A job description assigned through the `job_description` property is interned here.
+        """
+        pending = getattr(self, '_pending_job_description', None)
+        if pending is not None:
+            self.job_description_ref = JobDescription.objects.intern(pending)
+            self.job_description_text = None
+            self._pending_job_description = None
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'job_description_ref', 'job_description_text'}
+        if not self._state.adding:
+            self.version = models.F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            # myJobs keyset pagination: newest first, with the id as a tie-breaker.
+            models.Index(fields=['user', 'created_at', 'id'], name='api_job_user_created_idx'),
+            models.Index(fields=['status', 'updated_at'], name='api_job_status_updated_idx'),
+        ]
+
     def __str__(self):
         return f"AnalysisJob {self.id} - {self.status}"
 
@@ -49,3 +193,117 @@ class Subscription(models.Model):
 
     def __str__(self):
         return f"{self.user.username}'s {self.plan} Subscription"
+
+class AnalysisTask(models.Model):
+    """
+    Durable queue entry for an analysis job.
+
+    Rows are claimed by `manage.py run_analysis_worker` processes using row locks
+    and a lease, so a task whose worker dies is picked up again once the lease expires.
+    """
+    STATE_CHOICES = (
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+        ('CANCELLED', 'Cancelled'),
+    )
+
+    job = models.ForeignKey(AnalysisJob, on_delete=models.CASCADE, related_name='tasks')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True, related_name='analysis_tasks')
+    generate_full_resume = models.BooleanField(default=False)
+    generate_cover_letter = models.BooleanField(default=False)
+    # Lower is served first; see api.ratelimit.PRIORITY_PREMIUM / PRIORITY_STANDARD / PRIORITY_BATCH.
+    priority = models.PositiveSmallIntegerField(default=1)
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default='QUEUED')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=255, blank=True, default='')
+    locked_until = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['state', 'priority', 'available_at'], name='api_task_claim_idx'),
+            models.Index(fields=['user', 'state'], name='api_task_user_state_idx'),
+        ]
+
+    def __str__(self):
+        return f"AnalysisTask {self.pk} for job {self.job_id} - {self.state}"
+
+class GenerationCacheEntry(models.Model):
+    """
+    Shared tier of the generation cache: one row per (inputs, prompt version, generation type) hash.
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    generation_type = models.CharField(max_length=50)
+    prompt_version = models.CharField(max_length=20, db_index=True)
+    value = CompressedTextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"GenerationCacheEntry {self.key[:12]} ({self.generation_type})"
+
+class GenerationChunk(models.Model):
+    """
+    A piece of streamed generation output, relayed from the worker to server-sent event clients.
+    Chunks are removed once the job finishes and the final text is on the AnalysisJob.
+    """
+    job = models.ForeignKey(AnalysisJob, on_delete=models.CASCADE, related_name='chunks')
+    field = models.CharField(max_length=50)
+    text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['job', 'id'], name='api_chunk_job_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"GenerationChunk {self.pk} for job {self.job_id} ({self.field})"
+
+class QuotaCounter(models.Model):
+    """
+    Per-user submission count for one fixed window. Two adjacent windows give a
+    sliding-window estimate without scanning the job table.
+    """
+    WINDOW_CHOICES = (
+        ('MINUTE', 'Minute'),
+        ('DAY', 'Day'),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='quota_counters')
+    window = models.CharField(max_length=10, choices=WINDOW_CHOICES)
+    window_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'window', 'window_start'], name='api_quota_counter_unique'),
+        ]
+
+    def __str__(self):
+        return f"QuotaCounter {self.user_id} {self.window} {self.window_start:%Y-%m-%d %H:%M} = {self.count}"
+
+class ResumeFile(models.Model):
+    """
+    Text extracted from an uploaded resume, keyed by the SHA-256 of the file, so the same
+    file is parsed only once however often it is uploaded.
+    """
+    FILE_TYPE_CHOICES = (
+        ('pdf', 'PDF'),
+        ('docx', 'DOCX'),
+    )
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    file_type = models.CharField(max_length=10, choices=FILE_TYPE_CHOICES)
+    size = models.PositiveIntegerField()
+    pages = models.PositiveIntegerField(blank=True, null=True)
+    text = CompressedTextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"ResumeFile {self.sha256[:12]} ({self.file_type})"
@@ -0,0 +1,127 @@
+import zipfile
+from xml.etree import ElementTree
+
+try:
+    import pypdf
+except ImportError:  # Only PDF uploads need it.
+    pypdf = None
+
+# Text extraction for resume uploads. This runs in the parser process pool (see
+# api.ingestion), whose spawned workers import it without setting up Django: keep it free
+# of Django imports.
+
+PDF = 'pdf'
+DOCX = 'docx'
+
+_WORD = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_APP_PROPERTIES = '{http://schemas.openxmlformats.org/officeDocument/2006/extended-properties}'
+
+
+class ParseError(Exception):
+    """
+    The file can't be used; the message is shown to the user.
+    """
+
+
+def detect_type(path):
+    """
+    PDF or DOCX by the file's content (the name and declared type aren't trusted), or None.
+    """
+    with open(path, 'rb') as handle:
+        head = handle.read(5)
+    if head == b'%PDF-':
+        return PDF
+    if head[:4] == b'PK\x03\x04' and zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            if 'word/document.xml' in archive.namelist():
+                return DOCX
+    return None
+
+
+def parse_pdf(path, max_pages):
+    """
+    Returns (text, pages), one block of text per page.
+    """
+    if pypdf is None:
+        raise ParseError("PDF uploads are not available on this server.")
+    try:
+        reader = pypdf.PdfReader(path)
+        if reader.is_encrypted and not reader.decrypt(''):
+            raise ParseError("The PDF is password protected.")
+        pages = len(reader.pages)
+        if pages > max_pages:
+            raise ParseError(f"The PDF has {pages} pages; at most {max_pages} are accepted.")
+        text = '\n\n'.join(page.extract_text() or '' for page in reader.pages)
+    except ParseError:
+        raise
+    except pypdf.errors.PyPdfError as e:
+        raise ParseError(f"The PDF could not be read ({e}).")
+    except Exception:
+        # Malformed files also surface as TypeError, AttributeError, RecursionError and the
+        # like from deep inside pypdf; none of them should fail the upload with a 500.
+        raise ParseError("The PDF could not be read.")
+    return text, pages
+
+
+def _read_member(archive, name, max_bytes):
+    # The sizes in the zip directory can't be trusted; stop reading past the limit.
+    with archive.open(name) as member:
+        data = member.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ParseError("The document is too large.")
+    return data
+
+
+def _docx_pages(archive, max_bytes):
+    # Word records the page count when saving; other editors may not.
+    if 'docProps/app.xml' not in archive.namelist():
+        return None
+    pages = ElementTree.fromstring(_read_member(archive, 'docProps/app.xml', max_bytes)).find(f'{_APP_PROPERTIES}Pages')
+    try:
+        return int(pages.text)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _paragraph_text(paragraph):
+    parts = []
+    for node in paragraph.iter():
+        if node.tag == f'{_WORD}t':
+            parts.append(node.text or '')
+        elif node.tag == f'{_WORD}tab':
+            parts.append('\t')
+        elif node.tag in (f'{_WORD}br', f'{_WORD}cr'):
+            parts.append('\n')
+    return ''.join(parts)
+
+
+def parse_docx(path, max_pages, max_xml_bytes):
+    """
+    Returns (text, pages), one line per paragraph; pages is None if the file doesn't say.
+    """
+    try:
+        with zipfile.ZipFile(path) as archive:
+            pages = _docx_pages(archive, max_xml_bytes)
+            if pages is not None and pages > max_pages:
+                raise ParseError(f"The document has {pages} pages; at most {max_pages} are accepted.")
+            root = ElementTree.fromstring(_read_member(archive, 'word/document.xml', max_xml_bytes))
+    except ParseError:
+        raise
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+        raise ParseError(f"The document could not be read ({e}).")
+    except Exception:
+        # E.g. NotImplementedError for an unsupported compression method, zlib.error.
+        raise ParseError("The document could not be read.")
+    text = '\n'.join(_paragraph_text(paragraph) for paragraph in root.iter(f'{_WORD}p'))
+    return text, pages
+
+
+def parse_resume(path, file_type, max_pages, max_xml_bytes):
+    """
+    The process pool's entry point: (text, pages) for the file at `path`.
+    """
+    if file_type == PDF:
+        return parse_pdf(path, max_pages)
+    if file_type == DOCX:
+        return parse_docx(path, max_pages, max_xml_bytes)
+    raise ParseError("Only PDF and DOCX files are accepted.")
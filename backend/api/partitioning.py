@@ -0,0 +1,197 @@
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+from .models import AnalysisJob
+
+JOB_TABLE = AnalysisJob._meta.db_table
+
+DEFAULT_PARTITION = f"{JOB_TABLE}_pdefault"
+
+_PARTITION_NAME_RE = re.compile(rf"^{JOB_TABLE}_p(\d{{4}})(\d{{2}})$")
+
+
+def month_start(moment):
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(start, months):
+    index = start.year * 12 + start.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(start):
+    return f"{JOB_TABLE}_p{start:%Y%m}"
+
+
+def partition_start(name):
+    """
+    The first day of the month a partition covers, or None for the default partition.
+    """
+    match = _PARTITION_NAME_RE.match(name)
+    if match is None:
+        return None
+    return datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc)
+
+
+def supports_partitioning():
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned():
+    """
+    True once `manage.py partition_analysis_jobs --convert` has run. Always False on SQLite,
+    where retention falls back to deleting rows.
+    """
+    if not supports_partitioning():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s",
+            [JOB_TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """
+    Returns [(name, start)] for the monthly partitions, oldest first.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = %s",
+            [JOB_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    return sorted((name, partition_start(name)) for name in names if partition_start(name) is not None)
+
+
+def create_partition_sql(start):
+    quote = connection.ops.quote_name
+    end = add_months(start, 1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {quote(partition_name(start))} PARTITION OF {quote(JOB_TABLE)} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def _table_exists(cursor, name):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+    return cursor.fetchone()[0]
+
+
+def create_partition(start):
+    """
+    Creates the partition for the month beginning at `start` unless it exists; returns
+    whether it did. Jobs of that month already in the default partition are moved into the
+    new table before it is attached: PostgreSQL won't attach a range the default partition
+    still has rows for.
+    """
+    quote = connection.ops.quote_name
+    name, end = partition_name(start), add_months(start, 1)
+    with connection.cursor() as cursor:
+        if _table_exists(cursor, name):
+            return False
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Blocks inserts for the move, and serializes processes creating the same partition.
+        cursor.execute(f"LOCK TABLE {quote(JOB_TABLE)} IN SHARE ROW EXCLUSIVE MODE")
+        if _table_exists(cursor, name):
+            return False
+        # Attaching requires the parent's CHECK constraints on the new table.
+        cursor.execute(f"CREATE TABLE {quote(name)} (LIKE {quote(JOB_TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        if _table_exists(cursor, DEFAULT_PARTITION):
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {quote(DEFAULT_PARTITION)} WHERE created_at >= %s AND created_at < %s RETURNING *) "
+                f"INSERT INTO {quote(name)} SELECT * FROM moved",
+                [start, end],
+            )
+        cursor.execute(
+            f"ALTER TABLE {quote(JOB_TABLE)} ATTACH PARTITION {quote(name)} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    return True
+
+
+def ensure_partitions(now, months_ahead):
+    """
+    Creates the partitions for the current month and the next `months_ahead`. Rows outside
+    every range (e.g. if this hasn't run for a while) land in the default partition until
+    their month's partition is created.
+    """
+    current = month_start(now)
+    for offset in range(months_ahead + 1):
+        create_partition(add_months(current, offset))
+
+
+def drop_partition(name):
+    """
+    Detaches and drops a partition. The caller must have archived its rows and removed the
+    rows that reference them (tasks, chunks); there are no foreign keys to the partitioned
+    table, so the database won't do it.
+    """
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {quote(JOB_TABLE)} DETACH PARTITION {quote(name)}")
+        cursor.execute(f"DROP TABLE {quote(name)}")
+
+
+def convert_to_partitioned(now, months_ahead):
+    """
+    Rebuilds the job table as a table partitioned by month on created_at, copying every row.
+    Holds an exclusive lock on the table for the whole copy: run it in a maintenance window.
+
+    PostgreSQL requires the partition key in every unique constraint, so the primary key
+    becomes (id, created_at), and foreign keys that point at the job table (tasks, chunks)
+    are dropped. Django still enforces their on_delete rules when a job is deleted through
+    the ORM.
+    """
+    quote = connection.ops.quote_name
+    legacy_table = f"{JOB_TABLE}_unpartitioned"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {quote(JOB_TABLE)} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint WHERE contype = 'f' AND confrelid = %s::regclass",
+            [JOB_TABLE],
+        )
+        for table, constraint in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {table} DROP CONSTRAINT {quote(constraint)}")
+
+        cursor.execute(f"SELECT MIN(created_at) FROM {quote(JOB_TABLE)}")
+        oldest = cursor.fetchone()[0] or now
+
+        cursor.execute(f"ALTER TABLE {quote(JOB_TABLE)} RENAME TO {quote(legacy_table)}")
+        cursor.execute(
+            f"CREATE TABLE {quote(JOB_TABLE)} (LIKE {quote(legacy_table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (created_at)"
+        )
+        cursor.execute(f"ALTER TABLE {quote(JOB_TABLE)} ADD PRIMARY KEY (id, created_at)")
+        start = month_start(oldest)
+        while start <= add_months(month_start(now), months_ahead):
+            cursor.execute(create_partition_sql(start))
+            start = add_months(start, 1)
+        cursor.execute(
+            f"CREATE TABLE {quote(DEFAULT_PARTITION)} PARTITION OF {quote(JOB_TABLE)} DEFAULT"
+        )
+        cursor.execute(f"INSERT INTO {quote(JOB_TABLE)} SELECT * FROM {quote(legacy_table)}")
+        # Dropping the old table frees its index names for the new ones below.
+        cursor.execute(f"DROP TABLE {quote(legacy_table)}")
+
+        for field in AnalysisJob._meta.concrete_fields:
+            if field.remote_field is None:
+                continue
+            target = field.remote_field.model._meta
+            cursor.execute(
+                f"ALTER TABLE {quote(JOB_TABLE)} ADD CONSTRAINT {quote(f'{JOB_TABLE}_{field.column}_fk')} "
+                f"FOREIGN KEY ({quote(field.column)}) REFERENCES {quote(target.db_table)} ({quote(target.pk.column)}) "
+                f"DEFERRABLE INITIALLY DEFERRED"
+            )
+            cursor.execute(
+                f"CREATE INDEX {quote(f'{JOB_TABLE}_{field.column}_idx')} ON {quote(JOB_TABLE)} ({quote(field.column)})"
+            )
+        with connection.schema_editor(atomic=False) as schema_editor:
+            for index in AnalysisJob._meta.indexes:
+                schema_editor.add_index(AnalysisJob, index)
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest
+from graphene_django.views import HttpError
+
+DEFAULT_PERSISTED_QUERIES_SETTINGS = {
+    # Accept Apollo's automatic persisted queries (a query's SHA-256 instead of its text).
+    "ENABLED": True,
+    # Parsed, validated documents kept per process, least recently used evicted first.
+    # Persisted hashes and plain query texts share it; 0 turns it off.
+    "MAX_DOCUMENTS": 1000,
+    # Seconds a shared cache may keep GET responses that can't change any more (finished jobs).
+    "CACHE_MAX_AGE": 60 * 60 * 24,
+}
+
+
+def persisted_queries_setting(name):
+    return getattr(settings, 'PERSISTED_QUERIES', {}).get(name, DEFAULT_PERSISTED_QUERIES_SETTINGS[name])
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+class PersistedQueryError(HttpError):
+    """
+    A persisted-query outcome Apollo's link reacts to. Answered with a 200 and the error's
+    message and code, as Apollo expects: PersistedQueryNotFound makes the client resend
+    with the query text, PersistedQueryNotSupported stops it sending hashes.
+    """
+
+    def __init__(self, message, code):
+        super().__init__(HttpResponse(status=200), message)
+        self.code = code
+
+
+def persisted_query_hash(request, data):
+    """
+    The `extensions.persistedQuery.sha256Hash` of the request (a JSON query parameter for
+    GET, part of the body for POST), or None.
+    """
+    extensions = request.GET.get('extensions') or data.get('extensions')
+    if not extensions:
+        return None
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+    persisted = extensions.get('persistedQuery') if isinstance(extensions, dict) else None
+    if not isinstance(persisted, dict):
+        return None
+    if persisted.get('version') != 1 or not isinstance(persisted.get('sha256Hash'), str):
+        raise HttpError(HttpResponseBadRequest("Unsupported persisted query version."))
+    return persisted['sha256Hash']
+
+
+class DocumentCache:
+    """
+    LRU of query hash -> parsed document that passed validation against the schema. Only
+    valid documents are stored, so a hit skips both parsing and validation.
+    """
+
+    def __init__(self):
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+            return document
+
+    def set(self, key, document):
+        max_documents = persisted_queries_setting("MAX_DOCUMENTS")
+        with self._lock:
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > max_documents:
+                self._documents.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+    def __len__(self):
+        return len(self._documents)
+
+
+document_cache = DocumentCache()
+
+
+def mark_cacheable(info, max_age=None):
+    """
+    Lets a shared cache keep the response for `max_age` seconds (CACHE_MAX_AGE by default)
+    as far as this root field is concerned. Only for results that can't change any more
+    and don't depend on who asks; the response is cached when it is a GET and every root
+    field in it was marked.
+    """
+    request = info.context
+    if info.path.prev is not None or request is None:
+        return
+    cacheable = getattr(request, 'graphql_cacheable', None)
+    if cacheable is None:
+        cacheable = request.graphql_cacheable = {}
+    cacheable[info.path.key] = persisted_queries_setting("CACHE_MAX_AGE") if max_age is None else max_age
+
+
+def response_max_age(request, result):
+    """
+    How long the response to `request` may be cached by a shared cache, or None.
+    """
+    if request.method != 'GET' or result is None or result.errors or not result.data:
+        return None
+    cacheable = getattr(request, 'graphql_cacheable', {})
+    keys = [key for key in result.data if key != '__typename']
+    if not keys or any(key not in cacheable for key in keys):
+        return None
+    return min(cacheable[key] for key in keys)
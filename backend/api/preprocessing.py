@@ -0,0 +1,174 @@
+import math
+import re
+
+from django.conf import settings
+
+from .skills import get_skill_index
+
+DEFAULT_PROMPT_BUDGET = {
+    # Combined tokens for the job description and resume in a single prompt.
+    "TOKENS": 6000,
+    # Share of the budget reserved for the job description; unused tokens go to the resume.
+    "JOB_DESCRIPTION_SHARE": 0.4,
+}
+
+# Rough average for English prose; good enough for budgeting, not for billing.
+CHARS_PER_TOKEN = 4
+
+_HEADING_RE = re.compile(r"^\s*(?:#{1,6}\s*)?([A-Za-z][A-Za-z0-9 &/,'()-]{1,60}?)\s*:?\s*$")
+_SPACES_RE = re.compile(r"[ \t\f\v\u00a0]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+# Job description sections that don't help match a resume to the role.
+BOILERPLATE_HEADINGS = re.compile(
+    r"\b(benefits|perks|what we offer|why (?:join|work)|compensation|salary|equal (?:employment )?opportunity|"
+    r"eeo|diversity|accommodations?|privacy|disclaimer|how to apply|about (?:us|the company))\b",
+    re.IGNORECASE,
+)
+BOILERPLATE_SENTENCES = re.compile(
+    r"(equal opportunity employer|without regard to (?:race|sex|age)|reasonable accommodation|"
+    r"e-verify|affirmative action|protected veteran|background check)",
+    re.IGNORECASE,
+)
+
+# Section headings by how much they matter for matching; unknown headings score 1.
+SECTION_PRIORITIES = (
+    (re.compile(r"\b(requirements?|qualifications?|must have|skills|technologies|tech stack)\b", re.I), 4),
+    (re.compile(r"\b(responsibilities|what you.ll do|the role|duties|experience|work history|employment)\b", re.I), 3),
+    (re.compile(r"\b(nice to have|preferred|bonus|projects|education|certifications?)\b", re.I), 2),
+    (re.compile(r"\b(summary|profile|objective|about you)\b", re.I), 2),
+    (re.compile(r"\b(interests|hobbies|references|about)\b", re.I), 0),
+)
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def normalize_whitespace(text):
+    text = (text or "").replace("\r\n", "\n").replace("\r", "\n")
+    lines = [_SPACES_RE.sub(" ", line).strip() for line in text.split("\n")]
+    return _BLANK_LINES_RE.sub("\n\n", "\n".join(lines)).strip()
+
+
+def _is_heading(line):
+    return bool(line) and len(line) <= 60 and bool(_HEADING_RE.match(line)) and (
+        line.rstrip().endswith(":") or line.lstrip().startswith("#") or line.isupper() or line.istitle()
+    )
+
+
+def dedupe_lines(text):
+    """
+    Drops repeated lines (case-insensitive), keeping the first occurrence. Blank lines,
+    headings and very short lines (e.g. a "Responsibilities:" under each role) are kept.
+    """
+    seen = set()
+    kept = []
+    for line in text.split("\n"):
+        key = line.lower()
+        if len(key.split()) >= 3 and not _is_heading(line):
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(line)
+    return _BLANK_LINES_RE.sub("\n\n", "\n".join(kept)).strip()
+
+
+def split_sections(text):
+    """
+    Splits text into (heading, body) pairs. Text before the first heading has heading ''.
+    """
+    sections = [["", []]]
+    for line in text.split("\n"):
+        if _is_heading(line):
+            sections.append([line, []])
+        else:
+            sections[-1][1].append(line)
+    return [(heading, "\n".join(body).strip()) for heading, body in sections if heading or "".join(body).strip()]
+
+
+def _join_sections(sections):
+    return "\n\n".join("\n".join(part for part in section if part) for section in sections).strip()
+
+
+def strip_boilerplate(job_description):
+    """
+    Removes benefits/EEO/legal sections and sentences from a job description.
+    """
+    sections = []
+    for heading, body in split_sections(job_description):
+        if heading and BOILERPLATE_HEADINGS.search(heading):
+            continue
+        paragraphs = [p for p in body.split("\n\n") if not BOILERPLATE_SENTENCES.search(p)]
+        sections.append((heading, "\n\n".join(paragraphs)))
+    return _join_sections(sections)
+
+
+def section_priority(heading):
+    if not heading:
+        # Untitled leading text is usually the role summary.
+        return 3
+    for pattern, priority in SECTION_PRIORITIES:
+        if pattern.search(heading):
+            return priority
+    return 1
+
+
+def fit_to_budget(text, max_tokens, skills=()):
+    """
+    Trims text to roughly `max_tokens`, dropping the least important sections first and
+    keeping the rest in their original order. Sections mentioning any of `skills` (canonical
+    names from the skill index) are kept over others. Truncates as a last resort.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    sections = split_sections(text)
+    priorities = [section_priority(heading) for heading, _ in sections]
+    if skills:
+        index = get_skill_index()
+        for i, (heading, body) in enumerate(sections):
+            if not skills.isdisjoint(index.find_in_text(f"{heading}\n{body}")):
+                priorities[i] += 2
+    # Drop least important (then latest) sections first.
+    drop_order = sorted(range(len(sections)), key=lambda i: (priorities[i], -i))
+    kept = set(range(len(sections)))
+    for index in drop_order:
+        if len(kept) == 1 or estimate_tokens(_join_sections(sections[i] for i in sorted(kept))) <= max_tokens:
+            break
+        kept.discard(index)
+    fitted = _join_sections(sections[i] for i in sorted(kept))
+    return fitted[:max_tokens * CHARS_PER_TOKEN].rstrip()
+
+
+def prompt_budget(name):
+    return getattr(settings, "PROMPT_BUDGET", {}).get(name, DEFAULT_PROMPT_BUDGET[name])
+
+
+def preprocess_inputs(job_description, resume_text, prompt_count=1):
+    """
+    Cleans and budgets the job description and resume before they are put into prompts.
+
+    Returns (job_description, resume_text, stats); `stats["tokens_saved"]` counts the
+    savings across all `prompt_count` prompts that embed both inputs, and
+    `stats["job_description_skills"]` lists the skills found in the job description.
+    """
+    total_budget = prompt_budget("TOKENS")
+    jd_budget = int(total_budget * prompt_budget("JOB_DESCRIPTION_SHARE"))
+
+    cleaned_jd = dedupe_lines(strip_boilerplate(normalize_whitespace(job_description)))
+    cleaned_jd = fit_to_budget(cleaned_jd, jd_budget)
+    # Resume sections evidencing the skills the job asks for survive trimming first.
+    jd_skills = set(get_skill_index().find_in_text(cleaned_jd))
+    resume_budget = total_budget - estimate_tokens(cleaned_jd)
+    cleaned_resume = fit_to_budget(dedupe_lines(normalize_whitespace(resume_text)), resume_budget, jd_skills)
+
+    before = estimate_tokens(job_description or "") + estimate_tokens(resume_text or "")
+    after = estimate_tokens(cleaned_jd) + estimate_tokens(cleaned_resume)
+    stats = {
+        "job_description_tokens": [estimate_tokens(job_description or ""), estimate_tokens(cleaned_jd)],
+        "resume_tokens": [estimate_tokens(resume_text or ""), estimate_tokens(cleaned_resume)],
+        "job_description_skills": sorted(jd_skills),
+        "prompts": prompt_count,
+        "tokens_saved": (before - after) * prompt_count,
+    }
+    return cleaned_jd, cleaned_resume, stats
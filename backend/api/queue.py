@@ -0,0 +1,196 @@
+import os
+import socket
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import AnalysisJob, AnalysisTask
+from .analysis import _run_analysis
+from .metrics import ANALYSIS_JOBS
+from .ratelimit import PRIORITY_STANDARD
+
+DEFAULT_QUEUE_SETTINGS = {
+    "LEASE_SECONDS": 120,
+    "MAX_ATTEMPTS": 3,
+    "RETRY_BACKOFF_SECONDS": 10,
+    "POLL_INTERVAL": 1.0,
+    "CONCURRENCY": 4,
+    "CLAIM_BATCH_SIZE": 10,
+    "BATCH_MAX_PARALLEL": 4,
+}
+
+
+# Job statuses a failing task must not overwrite.
+FINAL_STATUSES = ('COMPLETED', 'CANCELLED')
+
+
+def queue_setting(name):
+    return getattr(settings, 'ANALYSIS_QUEUE', {}).get(name, DEFAULT_QUEUE_SETTINGS[name])
+
+
+def make_worker_id():
+    """
+    Returns an identifier that is unique per worker thread across hosts.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}:{uuid.uuid4().hex[:8]}"
+
+
+def enqueue_analysis(job, generate_full_resume_flag, generate_cover_letter_flag, priority=PRIORITY_STANDARD, user=None):
+    """
+    Adds an analysis job to the durable queue. The job itself stays PENDING until
+    a worker claims it.
+    """
+    return AnalysisTask.objects.create(
+        job=job,
+        generate_full_resume=generate_full_resume_flag,
+        generate_cover_letter=generate_cover_letter_flag,
+        priority=priority,
+        user=user,
+    )
+
+
+def _claimable(now):
+    # Queued tasks that are due, plus running tasks whose worker lost its lease.
+    return Q(state='QUEUED', available_at__lte=now) | Q(state='RUNNING', locked_until__lt=now)
+
+
+def _saturated_batches(now):
+    # Batches that already have BATCH_MAX_PARALLEL tasks running under a live lease.
+    return (
+        AnalysisTask.objects.filter(state='RUNNING', locked_until__gte=now, job__batch__isnull=False)
+        .values('job__batch')
+        .annotate(running=Count('id'))
+        .filter(running__gte=queue_setting("BATCH_MAX_PARALLEL"))
+        .values('job__batch')
+    )
+
+
+def claim_next_task(worker_id):
+    """
+    Claims the next due task for `worker_id` (premium lane first, then oldest) and returns it,
+    or None if the queue is empty.
+
+    Candidates are read with SELECT ... FOR UPDATE SKIP LOCKED so concurrent workers
+    don't contend for the same rows on Postgres. The claim itself is a conditional
+    UPDATE, which keeps it safe on backends without row locks (SQLite). Tasks from batches
+    that are already running BATCH_MAX_PARALLEL jobs are skipped.
+    """
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=queue_setting("LEASE_SECONDS"))
+    with transaction.atomic():
+        candidate_ids = list(
+            AnalysisTask.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(_claimable(now))
+            .exclude(job__batch__in=_saturated_batches(now))
+            .order_by('priority', 'available_at', 'id')
+            .values_list('id', flat=True)[:queue_setting("CLAIM_BATCH_SIZE")]
+        )
+        for task_id in candidate_ids:
+            claimed = AnalysisTask.objects.filter(_claimable(now), pk=task_id).update(
+                state='RUNNING',
+                locked_by=worker_id,
+                locked_until=lease_until,
+                attempts=F('attempts') + 1,
+                updated_at=now,
+            )
+            if claimed:
+                return AnalysisTask.objects.select_related('job').get(pk=task_id)
+    return None
+
+
+def cancel_tasks(job_id):
+    """
+    Withdraws the job's queued tasks. A running task notices the cancellation through its
+    CancelToken and completes on its own.
+    """
+    return AnalysisTask.objects.filter(job_id=job_id, state='QUEUED').update(
+        state='CANCELLED', locked_until=None, updated_at=timezone.now()
+    )
+
+
+def complete_task(task):
+    AnalysisTask.objects.filter(pk=task.pk, locked_by=task.locked_by).update(
+        state='DONE',
+        locked_until=None,
+        updated_at=timezone.now(),
+    )
+
+
+def fail_task(task, error):
+    """
+    Requeues the task with a linear backoff, or marks it (and its job) FAILED once
+    the attempts are used up. Until then the error is only on the task's `last_error`,
+    so clients never see a FAILED job that is about to be retried.
+    """
+    now = timezone.now()
+    if task.attempts < queue_setting("MAX_ATTEMPTS"):
+        updated = AnalysisTask.objects.filter(pk=task.pk, locked_by=task.locked_by).update(
+            state='QUEUED',
+            locked_by='',
+            locked_until=None,
+            available_at=now + timedelta(seconds=queue_setting("RETRY_BACKOFF_SECONDS") * task.attempts),
+            last_error=str(error),
+            updated_at=now,
+        )
+        if updated:
+            # A job cancelled (or finished) meanwhile keeps its status; the retry will find it and stop.
+            AnalysisJob.objects.filter(pk=task.job_id).exclude(status__in=FINAL_STATUSES).update(
+                status='PENDING', updated_at=now, version=F('version') + 1
+            )
+        return
+
+    AnalysisTask.objects.filter(pk=task.pk, locked_by=task.locked_by).update(
+        state='FAILED',
+        locked_until=None,
+        last_error=str(error),
+        updated_at=now,
+    )
+    stats = AnalysisJob.objects.filter(pk=task.job_id).values_list('stats', flat=True).first() or {}
+    failed = AnalysisJob.objects.filter(pk=task.job_id).exclude(status__in=FINAL_STATUSES + ('FAILED',)).update(
+        status='FAILED',
+        analysis_result=f"An unexpected error occurred: {error}",
+        stats={**stats, 'error': {'type': type(error).__name__ if isinstance(error, Exception) else 'Error', 'message': str(error)}},
+        updated_at=now,
+        version=F('version') + 1,
+    )
+    if failed:
+        ANALYSIS_JOBS.inc(status='FAILED')
+
+
+def run_task(task):
+    """
+    Runs a claimed task to completion, recording the outcome on the queue row.
+    """
+    if task.attempts > queue_setting("MAX_ATTEMPTS"):
+        # The lease expired too many times (e.g. the worker kept crashing mid-job).
+        fail_task(task, "Maximum attempts exceeded.")
+        return
+    try:
+        _run_analysis(
+            task.job_id,
+            task.generate_full_resume,
+            task.generate_cover_letter,
+            task.priority,
+            # The claim sets updated_at; available_at is when the task became due.
+            queue_wait=max(0.0, (task.updated_at - task.available_at).total_seconds()),
+        )
+    except Exception as e:
+        fail_task(task, e)
+    else:
+        complete_task(task)
+
+
+def process_next_task(worker_id):
+    """
+    Claims and runs a single task. Returns False when there was nothing to do.
+    """
+    task = claim_next_task(worker_id)
+    if task is None:
+        return False
+    run_task(task)
+    return True
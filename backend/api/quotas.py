@@ -0,0 +1,122 @@
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from graphql import GraphQLError
+
+from .models import AnalysisTask, QuotaCounter
+
+DEFAULT_QUOTAS = {
+    "FREE": {"PER_MINUTE": 3, "PER_DAY": 20, "CONCURRENT": 1, "BATCH_SIZE": 5},
+    "PREMIUM": {"PER_MINUTE": 10, "PER_DAY": 200, "CONCURRENT": 5, "BATCH_SIZE": 200},
+}
+
+# Suggested wait when the only limit hit is the number of in-flight jobs.
+CONCURRENT_RETRY_AFTER_SECONDS = 10
+
+WINDOWS = (
+    ('MINUTE', 'PER_MINUTE', timedelta(minutes=1)),
+    ('DAY', 'PER_DAY', timedelta(days=1)),
+)
+
+
+class QuotaExceeded(GraphQLError):
+    """
+    Raised before an AnalysisJob is created. Clients read `extensions.retryAfter` (seconds).
+    """
+
+    def __init__(self, message, limit, retry_after):
+        super().__init__(
+            message,
+            extensions={"code": "QUOTA_EXCEEDED", "limit": limit, "retryAfter": retry_after},
+        )
+
+
+def plan_quotas(plan):
+    quotas = getattr(settings, 'ANALYSIS_QUOTAS', {})
+    return {**DEFAULT_QUOTAS[plan], **quotas.get(plan, {})}
+
+
+def _window_start(now, length):
+    seconds = int(length.total_seconds())
+    return datetime.fromtimestamp(int(now.timestamp()) // seconds * seconds, tz=dt_timezone.utc)
+
+
+def _consume(user, window, length, limit, now, amount=1):
+    """
+    Counts `amount` submissions in the current window and returns the number of seconds to
+    wait if the sliding-window estimate would exceed `limit`, or None if it is allowed.
+    """
+    start = _window_start(now, length)
+    counter, created = QuotaCounter.objects.get_or_create(user=user, window=window, window_start=start)
+    if created:
+        # Only the current and previous windows are ever read.
+        QuotaCounter.objects.filter(user=user, window=window, window_start__lt=start - length).delete()
+    QuotaCounter.objects.filter(pk=counter.pk).update(count=F('count') + amount)
+    current = QuotaCounter.objects.values_list('count', flat=True).get(pk=counter.pk)
+    previous = (
+        QuotaCounter.objects.filter(user=user, window=window, window_start=start - length)
+        .values_list('count', flat=True)
+        .first()
+    ) or 0
+
+    window_seconds = length.total_seconds()
+    elapsed = (now - start).total_seconds()
+    # Weight the previous window by how much of it still overlaps the sliding window.
+    estimate = previous * (1 - elapsed / window_seconds) + current
+    if estimate <= limit:
+        return None
+
+    if current > limit or previous == 0:
+        wait = window_seconds - elapsed
+    else:
+        # Time until the previous window's weight has decayed enough to fit this submission.
+        wait = window_seconds * (1 - (limit - current) / previous) - elapsed
+    return max(1, math.ceil(wait))
+
+
+def enforce_quotas(user, is_premium, batch_size=None):
+    """
+    Admission control for createAnalysisJob and createBatchAnalysis. Must run inside the
+    transaction that creates the jobs so the counters roll back with it when a limit is hit.
+
+    A batch counts as one request against PER_MINUTE and as `batch_size` jobs against
+    PER_DAY; its parallelism is bounded by the queue rather than CONCURRENT.
+
+    The user's row is locked first, so one user's submissions are admitted one at a time:
+    a concurrent request waits for this transaction and then counts the jobs it created.
+    """
+    plan = 'PREMIUM' if is_premium else 'FREE'
+    quotas = plan_quotas(plan)
+    type(user).objects.select_for_update().values_list('pk', flat=True).get(pk=user.pk)
+
+    if batch_size is None:
+        # Batch jobs are bounded by the queue, not CONCURRENT, so they don't count here either.
+        in_flight = AnalysisTask.objects.filter(
+            user=user, state__in=('QUEUED', 'RUNNING'), job__batch__isnull=True
+        ).count()
+        if in_flight >= quotas["CONCURRENT"]:
+            raise QuotaExceeded(
+                f"You already have {in_flight} analysis job(s) in progress; the {plan.lower()} plan allows {quotas['CONCURRENT']}.",
+                limit="CONCURRENT",
+                retry_after=CONCURRENT_RETRY_AFTER_SECONDS,
+            )
+    elif batch_size > quotas["BATCH_SIZE"]:
+        raise QuotaExceeded(
+            f"The {plan.lower()} plan allows up to {quotas['BATCH_SIZE']} resumes per batch.",
+            limit="BATCH_SIZE",
+            retry_after=None,
+        )
+
+    now = timezone.now()
+    for window, key, length in WINDOWS:
+        amount = batch_size if batch_size is not None and window == 'DAY' else 1
+        retry_after = _consume(user, window, length, quotas[key], now, amount)
+        if retry_after is not None:
+            raise QuotaExceeded(
+                f"The {plan.lower()} plan allows {quotas[key]} analysis jobs per {window.lower()}. Please try again later.",
+                limit=key,
+                retry_after=retry_after,
+            )
@@ -0,0 +1,195 @@
+import fcntl
+import heapq
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Lanes for outbound LLM calls; lower values are served first.
+PRIORITY_PREMIUM = 0
+PRIORITY_STANDARD = 1
+# Bulk batch jobs yield to interactive submissions.
+PRIORITY_BATCH = 2
+
+DEFAULT_RATE_LIMIT_SETTINGS = {
+    "ENABLED": True,
+    "REQUESTS_PER_MINUTE": 60,
+    "BURST": 10,
+    "MAX_IN_FLIGHT": 8,
+    "STATE_FILE": os.path.join(tempfile.gettempdir(), "resumeforge-llm-ratelimit.json"),
+    "LEASE_SECONDS": 120,
+    "POLL_INTERVAL": 0.05,
+}
+
+
+class RateLimitTimeout(Exception):
+    pass
+
+
+class FileTokenBucket:
+    """
+    Token bucket plus in-flight counter shared by every process on the host.
+
+    State lives in a small JSON file guarded by an exclusive `flock`. In-flight slots
+    are leases with an expiry, so a process that dies mid-call can't leak capacity.
+    Callers that were turned away are recorded with their priority lane, also with an
+    expiry, and hold back callers in lower lanes of every process until they are served.
+    """
+
+    def __init__(self, path, requests_per_minute, burst, max_in_flight, lease_seconds, waiter_seconds=2.0):
+        self.path = path
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.max_in_flight = max_in_flight
+        self.lease_seconds = lease_seconds
+        # How long a waiter stays recorded without asking again.
+        self.waiter_seconds = waiter_seconds
+
+    @contextmanager
+    def _locked_state(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        with os.fdopen(fd, 'r+') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                raw = handle.read()
+                state = json.loads(raw) if raw else {}
+                now = time.time()
+                # Refill tokens for the time elapsed since the last access.
+                tokens = state.get("tokens", self.capacity)
+                elapsed = max(0.0, now - state.get("updated", now))
+                state["tokens"] = min(self.capacity, tokens + elapsed * self.rate)
+                state["updated"] = now
+                state["leases"] = {
+                    lease: expires for lease, expires in state.get("leases", {}).items() if expires > now
+                }
+                state["waiting"] = {
+                    waiter: entry for waiter, entry in state.get("waiting", {}).items() if entry[1] > now
+                }
+                yield state
+                handle.seek(0)
+                handle.truncate()
+                handle.write(json.dumps(state))
+                # Flush while still holding the lock so the next reader sees this state.
+                handle.flush()
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def try_acquire(self, priority=PRIORITY_STANDARD, waiter=None):
+        """
+        Returns (lease_id, None) on success, or (None, seconds until a token is due). While
+        a waiter in a higher lane is recorded, lower lanes are refused. A `waiter` id that
+        is refused is recorded until it asks again, gets a lease or is withdrawn.
+        """
+        with self._locked_state() as state:
+            waiting = state["waiting"]
+            waiting.pop(waiter, None)
+            if any(ahead < priority for ahead, _ in waiting.values()):
+                lease, retry_after = None, None
+            else:
+                lease, retry_after = self._take(state)
+            if lease is None and waiter is not None:
+                waiting[waiter] = [priority, time.time() + self.waiter_seconds]
+            return lease, retry_after
+
+    def _take(self, state):
+        if len(state["leases"]) >= self.max_in_flight:
+            return None, None
+        if state["tokens"] < 1:
+            return None, (1 - state["tokens"]) / self.rate
+        state["tokens"] -= 1
+        lease = uuid.uuid4().hex
+        state["leases"][lease] = time.time() + self.lease_seconds
+        return lease, None
+
+    def withdraw(self, waiter):
+        with self._locked_state() as state:
+            state["waiting"].pop(waiter, None)
+
+    def release(self, lease):
+        with self._locked_state() as state:
+            state["leases"].pop(lease, None)
+
+
+class OutboundLimiter:
+    """
+    Queues callers fairly in front of a shared bucket: within a process, waiters are
+    served strictly by (priority lane, arrival order), and only the head of the queue
+    competes for the bucket. The head is recorded in the bucket with its lane, so a
+    higher lane waiting in one process also holds back lower lanes in the others; across
+    processes, callers in the same lane are served in no particular order.
+    """
+
+    def __init__(self, bucket, poll_interval):
+        self.bucket = bucket
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    def acquire(self, priority=PRIORITY_STANDARD, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        ticket = (priority, next(self._sequence))
+        waiter, lease = None, None
+        with self._condition:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    wait = self.poll_interval
+                    if self._waiters[0] == ticket:
+                        waiter = waiter or uuid.uuid4().hex
+                        lease, retry_after = self.bucket.try_acquire(priority, waiter)
+                        if lease is not None:
+                            return lease
+                        if retry_after is not None:
+                            wait = max(wait, min(retry_after, 1.0))
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise RateLimitTimeout("Timed out waiting for outbound LLM capacity.")
+                        wait = min(wait, remaining)
+                    self._condition.wait(wait)
+            finally:
+                if waiter is not None and lease is None:
+                    # Don't hold other processes' lower lanes back after giving up.
+                    self.bucket.withdraw(waiter)
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._condition.notify_all()
+
+    def release(self, lease):
+        self.bucket.release(lease)
+        with self._condition:
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, priority=PRIORITY_STANDARD, timeout=None):
+        lease = self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release(lease)
+
+
+def build_limiter():
+    """
+    Builds the outbound limiter from `settings.LLM_RATE_LIMIT`, or returns None when disabled.
+    """
+    config = {**DEFAULT_RATE_LIMIT_SETTINGS, **getattr(settings, "LLM_RATE_LIMIT", {})}
+    if not config["ENABLED"]:
+        return None
+    bucket = FileTokenBucket(
+        config["STATE_FILE"],
+        requests_per_minute=config["REQUESTS_PER_MINUTE"],
+        burst=config["BURST"],
+        max_in_flight=config["MAX_IN_FLIGHT"],
+        lease_seconds=config["LEASE_SECONDS"],
+        # Waiting heads ask again at least every max(POLL_INTERVAL, 1) seconds.
+        waiter_seconds=2 * max(config["POLL_INTERVAL"], 1.0),
+    )
+    return OutboundLimiter(bucket, config["POLL_INTERVAL"])
@@ -0,0 +1,202 @@
+import gzip
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .models import AnalysisBatch, AnalysisJob, AnalysisTask, GenerationChunk, JobDescription, Subscription
+from .partitioning import add_months, drop_partition, ensure_partitions, is_partitioned, month_start
+
+DEFAULT_RETENTION_SETTINGS = {
+    # Days a finished (COMPLETED, FAILED or CANCELLED) job is kept after its last update, by the owner's plan.
+    "TTL_DAYS": {"ANONYMOUS": 7, "FREE": 30, "PREMIUM": 365},
+    "ARCHIVE_DIR": os.path.join(settings.BASE_DIR, "var", "archive"),
+    # Rows read, written and deleted per transaction.
+    "BATCH_SIZE": 500,
+    # Monthly partitions created ahead of time when the job table is partitioned.
+    "PARTITION_MONTHS_AHEAD": 3,
+}
+
+TERMINAL_STATUSES = ('COMPLETED', 'FAILED', 'CANCELLED')
+
+# Columns written to the archive, besides the job description text.
+ARCHIVE_COLUMNS = (
+    'id', 'user_id', 'batch_id', 'resume_text', 'analysis_result', 'generated_resume',
+    'generated_cover_letter', 'status', 'stats', 'ats_score', 'version', 'created_at', 'updated_at',
+)
+
+
+def retention_setting(name):
+    return getattr(settings, 'JOB_RETENTION', {}).get(name, DEFAULT_RETENTION_SETTINGS[name])
+
+
+def ttl_days():
+    return {**DEFAULT_RETENTION_SETTINGS["TTL_DAYS"], **retention_setting("TTL_DAYS")}
+
+
+def expired_jobs(now):
+    """
+    Finished jobs past their owner's plan TTL. Jobs still queued or running are never expired.
+    """
+    premium = Subscription.objects.filter(user=OuterRef('user'), plan='PREMIUM').filter(
+        Q(active_until__isnull=True) | Q(active_until__gt=now)
+    )
+    cutoff = {plan: now - timedelta(days=days) for plan, days in ttl_days().items()}
+    return (
+        AnalysisJob.objects.filter(status__in=TERMINAL_STATUSES)
+        .annotate(owner_is_premium=Exists(premium))
+        .filter(
+            Q(user__isnull=True, updated_at__lt=cutoff['ANONYMOUS'])
+            | Q(user__isnull=False, owner_is_premium=False, updated_at__lt=cutoff['FREE'])
+            | Q(owner_is_premium=True, updated_at__lt=cutoff['PREMIUM'])
+        )
+    )
+
+
+class JobArchive:
+    """
+    Appends jobs to a gzip-compressed JSON Lines file, one job per line. Each chunk is
+    flushed to disk before its rows are deleted, so a crash can duplicate rows across
+    archives (readers should dedupe on `id`) but never lose one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._raw = open(path, 'ab')
+        self._file = gzip.GzipFile(fileobj=self._raw, mode='ab')
+
+    def write(self, rows):
+        for row in rows:
+            self._file.write(json.dumps(row, cls=DjangoJSONEncoder).encode('utf-8') + b'\n')
+        self._file.flush()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self.count += len(rows)
+
+    def close(self):
+        self._file.close()
+        self._raw.close()
+
+
+def ensure_job_partitions(now):
+    """
+    Creates the next PARTITION_MONTHS_AHEAD monthly partitions when the job table is
+    partitioned. Runs after migrations, at worker startup and before each archive run.
+    """
+    if is_partitioned():
+        ensure_partitions(now, retention_setting("PARTITION_MONTHS_AHEAD"))
+
+
+def archive_path(now, directory=None):
+    return os.path.join(directory or retention_setting("ARCHIVE_DIR"), f"analysis_jobs-{now:%Y%m%dT%H%M%S}.jsonl.gz")
+
+
+def _archive_rows(jobs):
+    rows = list(jobs.values(*ARCHIVE_COLUMNS, 'job_description_text', 'job_description_ref__text'))
+    for row in rows:
+        text = row.pop('job_description_ref__text')
+        legacy = row.pop('job_description_text')
+        row['job_description'] = text if text is not None else legacy
+    return rows
+
+
+def _delete_jobs(ids):
+    """
+    Deletes jobs and the rows that reference them, then any batches left without jobs and
+    job descriptions no longer referenced.
+    """
+    descriptions = set(
+        AnalysisJob.objects.filter(pk__in=ids, job_description_ref__isnull=False)
+        .values_list('job_description_ref', flat=True)
+    )
+    batches = set(AnalysisJob.objects.filter(pk__in=ids, batch__isnull=False).values_list('batch', flat=True))
+    AnalysisTask.objects.filter(job__in=ids).delete()
+    GenerationChunk.objects.filter(job__in=ids).delete()
+    AnalysisJob.objects.filter(pk__in=ids).delete()
+    AnalysisBatch.objects.filter(pk__in=batches, jobs__isnull=True).delete()
+    _delete_unreferenced(JobDescription.objects.filter(pk__in=descriptions))
+
+
+def _delete_unreferenced(descriptions):
+    """
+    Deletes the job descriptions among `descriptions` that no job or batch references.
+    Interning a description takes a share lock on its row until the submitting transaction
+    ends (see JobDescriptionManager.intern), so the rows are locked first, and references
+    are checked afterwards: a job created in the meantime is seen and keeps its description.
+    """
+    locked = list(descriptions.select_for_update().values_list('pk', flat=True))
+    JobDescription.objects.filter(pk__in=locked, jobs__isnull=True, batches__isnull=True).delete()
+
+
+def archive_and_delete(jobs, archive, batch_size=None, dry_run=False):
+    """
+    Streams `jobs` to `archive` in primary key order, `batch_size` rows at a time, deleting
+    each chunk in its own short transaction once it is on disk. Returns the number of jobs.
+    """
+    batch_size = batch_size or retention_setting("BATCH_SIZE")
+    total, last_pk = 0, None
+    while True:
+        chunk = jobs.order_by('pk')
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        if dry_run:
+            ids = list(chunk.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return total
+        else:
+            with transaction.atomic():
+                ids = list(chunk.select_for_update(of=('self',)).values_list('pk', flat=True)[:batch_size])
+                if not ids:
+                    return total
+                archive.write(_archive_rows(AnalysisJob.objects.filter(pk__in=ids).order_by('pk')))
+                _delete_jobs(ids)
+        total += len(ids)
+        last_pk = ids[-1]
+
+
+def expired_partitions(partitions, now):
+    """
+    Partitions whose whole month is older than the longest TTL, so every job in them has
+    expired whatever its owner's plan.
+    """
+    cutoff = month_start(now - timedelta(days=max(ttl_days().values())))
+    return [(name, start) for name, start in partitions if add_months(start, 1) <= cutoff]
+
+
+def archive_partition(name, start, archive, batch_size=None):
+    """
+    Streams every job in a monthly partition to `archive`, then drops the partition instead
+    of deleting its rows one by one (no dead tuples left for vacuum). A partition that still
+    holds queued or running jobs is kept: its finished jobs are archived and deleted row by
+    row instead. Returns (number of jobs archived, whether the partition was dropped).
+    """
+    batch_size = batch_size or retention_setting("BATCH_SIZE")
+    end = add_months(start, 1)
+    jobs = AnalysisJob.objects.filter(created_at__gte=start, created_at__lt=end)
+    if jobs.exclude(status__in=TERMINAL_STATUSES).exists():
+        return archive_and_delete(jobs.filter(status__in=TERMINAL_STATUSES), archive, batch_size), False
+    total, last_pk = 0, None
+    while True:
+        chunk = jobs.order_by('pk')
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        ids = list(chunk.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        archive.write(_archive_rows(AnalysisJob.objects.filter(pk__in=ids).order_by('pk')))
+        total += len(ids)
+        last_pk = ids[-1]
+
+    with transaction.atomic():
+        AnalysisTask.objects.filter(job__created_at__gte=start, job__created_at__lt=end).delete()
+        GenerationChunk.objects.filter(job__created_at__gte=start, job__created_at__lt=end).delete()
+        drop_partition(name)
+        AnalysisBatch.objects.filter(created_at__lt=end, jobs__isnull=True).delete()
+        _delete_unreferenced(JobDescription.objects.filter(created_at__lt=end))
+    return total, True
@@ -1,15 +1,31 @@
+import base64
+import uuid
+
 import graphene
+from graphene import relay
+from graphene.utils.str_converters import to_snake_case
 from graphene_django import DjangoObjectType
+from graphql import GraphQLError
+from graphql.language.ast import FieldNode, FragmentSpreadNode, InlineFragmentNode
 from django.contrib.auth import get_user_model, authenticate
 from graphql_jwt.decorators import login_required
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Prefetch, Q
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 import graphql_jwt
 from graphql_jwt.shortcuts import create_refresh_token, get_token
+from graphql_jwt.utils import get_http_authorization
 
 
-from .models import AnalysisJob, Subscription
-from .analysis import run_analysis_synchronously
+from .auth import set_response_cookie, token_cache
+from .loaders import load_subscription
+from .models import AnalysisBatch, AnalysisJob, AnalysisTask, JobDescription, ResumeFile, Subscription
+from .persisted import mark_cacheable
+from .queue import cancel_tasks, enqueue_analysis
+from .quotas import enforce_quotas
+from .ratelimit import PRIORITY_BATCH, PRIORITY_PREMIUM, PRIORITY_STANDARD
 
 # Enums
 class JobStatusEnum(graphene.Enum):
@@ -17,6 +33,7 @@ class JobStatusEnum(graphene.Enum):
     IN_PROGRESS = "IN_PROGRESS"
     COMPLETED = "COMPLETED"
     FAILED = "FAILED"
+    CANCELLED = "CANCELLED"
 
 class PlanTypeEnum(graphene.Enum):
     FREE = "FREE"
@@ -37,36 +54,267 @@ class UserType(DjangoObjectType):
         fields = ("id", "username", "email", "is_premium", "subscription")
 
     def resolve_is_premium(self, info):
-        if hasattr(self, 'subscription'):
-            return self.subscription.is_premium()
-        return False
+        subscription = load_subscription(self, info.context)
+        return subscription is not None and subscription.is_premium()
 
     def resolve_subscription(self, info):
-        if hasattr(self, 'subscription'):
-            return self.subscription
-        return None
+        return load_subscription(self, info.context)
+
+class AtsSectionType(graphene.ObjectType):
+    heading = graphene.String()
+    matched_keywords = graphene.List(graphene.String)
+
+class AtsScoreType(graphene.ObjectType):
+    score = graphene.Int()
+    skill_coverage = graphene.Float()
+    keyword_coverage = graphene.Float()
+    similarity = graphene.Float()
+    matched_skills = graphene.List(graphene.String)
+    missing_skills = graphene.List(graphene.String)
+    missing_keywords = graphene.List(graphene.String)
+    sections = graphene.List(AtsSectionType)
+    missing_sections = graphene.List(graphene.String)
 
 class AnalysisJobType(DjangoObjectType):
+    ats_score = graphene.Field(AtsScoreType)
+
     class Meta:
         model = AnalysisJob
-        fields = ("id", "status", "analysis_result", "generated_resume", "generated_cover_letter", "created_at")
+        fields = ("id", "status", "analysis_result", "generated_resume", "generated_cover_letter", "created_at", "version", "ats_score")
+
+def selected_fields(info, path=()):
+    """
+    Returns the (snake_case) field names selected below `path` in the current field,
+    following fragments, e.g. selected_fields(info, ("edges", "node")).
+    """
+    def children(selection_set):
+        for selection in selection_set.selections if selection_set else ():
+            if isinstance(selection, FieldNode):
+                yield selection
+            elif isinstance(selection, InlineFragmentNode):
+                yield from children(selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                yield from children(info.fragments[selection.name.value].selection_set)
+
+    level = [node.selection_set for node in info.field_nodes]
+    for name in path:
+        level = [field.selection_set for selection_set in level for field in children(selection_set) if field.name.value == name]
+    return {
+        to_snake_case(field.name.value)
+        for selection_set in level
+        for field in children(selection_set)
+    }
+
+# A job in one of these states is never processed again (but see cache_finished_job for FAILED).
+FINISHED_JOB_STATUSES = ('COMPLETED', 'FAILED', 'CANCELLED')
+
+# GraphQL field on AnalysisJobType -> the column it reads. Inputs (job_description,
+# resume_text) are never exposed, so they are never loaded for a query.
+JOB_FIELD_COLUMNS = {
+    "id": "id",
+    "status": "status",
+    "version": "version",
+    "created_at": "created_at",
+    "analysis_result": "analysis_result",
+    "generated_resume": "generated_resume",
+    "generated_cover_letter": "generated_cover_letter",
+    "ats_score": "ats_score",
+}
+
+def runs_async(info):
+    """
+    True when the operation is executing on the event loop (api.views.AsyncGraphQLView);
+    resolvers then return coroutines that use the async ORM.
+    """
+    return getattr(info.context, "graphql_async", False)
+
+async def with_subscription(user):
+    # UserType's resolvers read the subscription from the cache; fill it without blocking.
+    user._state.fields_cache['subscription'] = await Subscription.objects.filter(user=user).afirst()
+    return user
+
+def retrying_tasks(job):
+    # A FAILED job whose task still has attempts left goes back to PENDING.
+    return AnalysisTask.objects.filter(job=job, state__in=('QUEUED', 'RUNNING'))
+
+def cache_finished_job(info, job):
+    """
+    Marks the response cacheable when `job` can't change any more: it is COMPLETED or
+    CANCELLED, or FAILED with no task left to retry it.
+    """
+    if job is not None and job.status in FINISHED_JOB_STATUSES:
+        if job.status != 'FAILED' or not retrying_tasks(job).exists():
+            mark_cacheable(info)
+    return job
+
+async def acache_finished_job(info, job):
+    job = await job
+    if job is not None and job.status in FINISHED_JOB_STATUSES:
+        if job.status != 'FAILED' or not await retrying_tasks(job).aexists():
+            mark_cacheable(info)
+    return job
+
+def job_columns(info, path=(), required=()):
+    """
+    The AnalysisJob columns needed for the fields selected below `path`, for `.only()`.
+    """
+    selected = selected_fields(info, path)
+    return ["id", *required, *(column for field, column in JOB_FIELD_COLUMNS.items() if field in selected and column != "id")]
+
+class AnalysisBatchType(DjangoObjectType):
+    total = graphene.Int()
+    pending = graphene.Int()
+    in_progress = graphene.Int()
+    completed = graphene.Int()
+    failed = graphene.Int()
+    progress = graphene.Float()
+    status = graphene.Field(JobStatusEnum)
+    jobs = graphene.List(AnalysisJobType)
+    job_description = graphene.String()
+
+    class Meta:
+        model = AnalysisBatch
+        fields = ("id", "created_at", "jobs")
+
+    # Counts come from the annotations added in `with_batch_progress`.
+    def resolve_total(self, info):
+        return self.total
+
+    def resolve_pending(self, info):
+        return self.pending
+
+    def resolve_in_progress(self, info):
+        return self.in_progress
+
+    def resolve_completed(self, info):
+        return self.completed
+
+    def resolve_failed(self, info):
+        return self.failed
+
+    def resolve_progress(self, info):
+        if not self.total:
+            return 1.0
+        return (self.completed + self.failed) / self.total
+
+    def resolve_status(self, info):
+        if self.completed + self.failed == self.total:
+            return 'COMPLETED' if self.completed or not self.total else 'FAILED'
+        if self.in_progress or self.completed or self.failed:
+            return 'IN_PROGRESS'
+        return 'PENDING'
+
+    def resolve_jobs(self, info):
+        return self.jobs.all()
+
+def with_batch_progress(queryset, columns=None):
+    """
+    Annotates batches with per-status job counts and prefetches their jobs, so a batch and
+    all of its children are read in two queries regardless of the batch size. `columns`
+    limits the job columns loaded (see `job_columns`).
+    """
+    jobs = AnalysisJob.objects.order_by('created_at', 'id')
+    jobs = jobs.only('batch', *columns) if columns is not None else jobs.defer('job_description_ref', 'job_description_text', 'resume_text')
+    return queryset.annotate(
+        total=Count('jobs'),
+        pending=Count('jobs', filter=Q(jobs__status='PENDING')),
+        in_progress=Count('jobs', filter=Q(jobs__status='IN_PROGRESS')),
+        completed=Count('jobs', filter=Q(jobs__status='COMPLETED')),
+        # Cancelled jobs count as failed: they are finished without a result.
+        failed=Count('jobs', filter=Q(jobs__status__in=('FAILED', 'CANCELLED'))),
+    ).prefetch_related(Prefetch('jobs', queryset=jobs))
+
+class AnalysisJobConnection(relay.Connection):
+    class Meta:
+        node = AnalysisJobType
+
+MAX_PAGE_SIZE = 100
+
+def encode_job_cursor(job):
+    return base64.urlsafe_b64encode(f"{job.created_at.isoformat()}|{job.pk}".encode()).decode()
+
+def decode_job_cursor(cursor):
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        created_at, pk = parse_datetime(created_at), uuid.UUID(pk)
+    except (ValueError, UnicodeDecodeError):
+        created_at = None
+    if created_at is None:
+        raise GraphQLError("Invalid cursor.")
+    return created_at, pk
 
 # Queries
 class Query(graphene.ObjectType):
-    job = graphene.Field(AnalysisJobType, id=graphene.UUID())
+    job = graphene.Field(
+        AnalysisJobType,
+        id=graphene.UUID(),
+        if_changed_since=graphene.Int(description="Return null unless the job's version is greater than this."),
+    )
+    batch = graphene.Field(AnalysisBatchType, id=graphene.UUID())
+    my_jobs = relay.ConnectionField(AnalysisJobConnection, status=JobStatusEnum())
     me = graphene.Field(UserType)
 
-    def resolve_job(self, info, id):
+    def resolve_job(self, info, id, if_changed_since=None):
+        # Only the columns behind the selected fields are read; a status poll skips the text.
+        # The status is always read, to tell whether the response may be cached.
+        jobs = AnalysisJob.objects.filter(pk=id).only(*job_columns(info, required=("status",)))
+        if if_changed_since is not None:
+            # Unchanged jobs cost one indexed lookup and an empty response.
+            jobs = jobs.filter(version__gt=if_changed_since)
+        if runs_async(info):
+            return acache_finished_job(info, jobs.afirst())
+        return cache_finished_job(info, jobs.first())
+
+    @login_required
+    def resolve_batch(self, info, id):
         try:
-            return AnalysisJob.objects.get(pk=id)
-        except AnalysisJob.DoesNotExist:
+            batches = AnalysisBatch.objects.filter(user=info.context.user)
+            if "job_description" in selected_fields(info):
+                batches = batches.select_related('job_description_ref')
+            return with_batch_progress(batches, job_columns(info, ("jobs",))).get(pk=id)
+        except AnalysisBatch.DoesNotExist:
             return None
 
+    @login_required
+    def resolve_my_jobs(self, info, first=None, after=None, status=None, last=None, before=None):
+        """
+        The user's jobs, newest first. Keyset pagination on (created_at, id) walks the
+        (user, created_at, id) index, so deep pages cost the same as the first one. Only
+        forward pagination (first/after) is supported.
+        """
+        if last is not None or before is not None:
+            raise GraphQLError("myJobs only pages forward: use first and after instead of last and before.")
+        if first is not None and first < 1:
+            raise GraphQLError("first must be at least 1.")
+        first = min(first or 20, MAX_PAGE_SIZE)
+        jobs = AnalysisJob.objects.filter(user=info.context.user).order_by('-created_at', '-id')
+        if status:
+            jobs = jobs.filter(status=status)
+        if after:
+            created_at, pk = decode_job_cursor(after)
+            jobs = jobs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        # created_at is always needed for the cursors.
+        jobs = list(jobs.only(*job_columns(info, ("edges", "node"), required=("created_at",)))[:first + 1])
+
+        page = jobs[:first]
+        edges = [AnalysisJobConnection.Edge(node=job, cursor=encode_job_cursor(job)) for job in page]
+        return AnalysisJobConnection(
+            edges=edges,
+            page_info=relay.PageInfo(
+                has_next_page=len(jobs) > first,
+                has_previous_page=bool(after),
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+            ),
+        )
+
     @login_required
     def resolve_me(self, info):
         user = info.context.user
         if user.is_anonymous:
             raise Exception("Not logged in!")
+        if runs_async(info) and 'subscription' not in user._state.fields_cache:
+            return with_subscription(user)
         return user
 
 # Mutations
@@ -89,42 +337,136 @@ class CreateUser(graphene.Mutation):
 class CreateAnalysisJob(graphene.Mutation):
     class Arguments:
         job_description = graphene.String(required=True)
-        resume_text = graphene.String(required=True)
+        resume_text = graphene.String(required=False)
+        # The fileHash of an upload to /resumes/upload, instead of resume_text.
+        resume_file = graphene.String(required=False)
         generate_full_resume = graphene.Boolean(required=False, default_value=False)
         generate_cover_letter = graphene.Boolean(required=False, default_value=False)
 
     job = graphene.Field(lambda: AnalysisJobType)
 
     @login_required
-    def mutate(self, info, job_description, resume_text, generate_full_resume, generate_cover_letter):
+    def mutate(self, info, job_description, generate_full_resume, generate_cover_letter, resume_text=None, resume_file=None):
         user = info.context.user
         if user.is_anonymous:
             raise Exception("Authentication required to create analysis jobs.")
 
+        if resume_file:
+            uploaded = ResumeFile.objects.filter(pk=resume_file).only('text').first()
+            if uploaded is None:
+                raise Exception("Unknown resume file; please upload it again.")
+            resume_text = uploaded.text
+        elif not resume_text:
+            raise Exception("Either resumeText or resumeFile is required.")
+
         # Check for premium features
-        if (generate_full_resume or generate_cover_letter) and not user.subscription.is_premium():
+        subscription = load_subscription(user, info.context)
+        is_premium = subscription is not None and subscription.is_premium()
+        if (generate_full_resume or generate_cover_letter) and not is_premium:
             raise Exception("Premium subscription required for full resume or cover letter generation.")
 
         # Input validation
         if len(job_description) > 20000 or len(resume_text) > 20000:
             raise Exception("Input text exceeds the maximum length of 20,000 characters.")
 
-        job = AnalysisJob.objects.create(
-            job_description=job_description,
-            resume_text=resume_text
-        )
-        
-        try:
-            # Run the analysis synchronously with a timeout
-            run_analysis_synchronously(job, generate_full_resume, generate_cover_letter)
-        except Exception as e:
-            # The exception (e.g., timeout) is already handled in run_analysis_synchronously
-            # by setting the job status to FAILED. We re-raise it here to let GraphQL
-            # report the error to the client.
-            raise e
-        
+        with transaction.atomic():
+            # Rejects the request with a retry-after error before anything is created.
+            enforce_quotas(user, is_premium)
+            job = AnalysisJob.objects.create(
+                user=user,
+                job_description=job_description,
+                resume_text=resume_text
+            )
+            # Hand the job to the background workers; clients poll the `job` query for the result.
+            enqueue_analysis(
+                job,
+                generate_full_resume,
+                generate_cover_letter,
+                priority=PRIORITY_PREMIUM if is_premium else PRIORITY_STANDARD,
+                user=user,
+            )
+
         return CreateAnalysisJob(job=job)
 
+class CreateBatchAnalysis(graphene.Mutation):
+    """
+    Scores one job description against many resumes. Each resume becomes a child job in
+    the low-priority batch lane; workers run at most ANALYSIS_QUEUE["BATCH_MAX_PARALLEL"]
+    of them at a time.
+    """
+    class Arguments:
+        job_description = graphene.String(required=True)
+        resumes = graphene.List(graphene.NonNull(graphene.String), required=True)
+        generate_full_resume = graphene.Boolean(required=False, default_value=False)
+        generate_cover_letter = graphene.Boolean(required=False, default_value=False)
+
+    batch = graphene.Field(lambda: AnalysisBatchType)
+
+    @login_required
+    def mutate(self, info, job_description, resumes, generate_full_resume, generate_cover_letter):
+        user = info.context.user
+        if user.is_anonymous:
+            raise Exception("Authentication required to create analysis jobs.")
+
+        subscription = load_subscription(user, info.context)
+        is_premium = subscription is not None and subscription.is_premium()
+        if (generate_full_resume or generate_cover_letter) and not is_premium:
+            raise Exception("Premium subscription required for full resume or cover letter generation.")
+
+        if not resumes:
+            raise Exception("At least one resume is required.")
+        if len(job_description) > 20000 or any(len(resume) > 20000 for resume in resumes):
+            raise Exception("Input text exceeds the maximum length of 20,000 characters.")
+
+        with transaction.atomic():
+            enforce_quotas(user, is_premium, batch_size=len(resumes))
+            # The batch and every job in it share one deduplicated JobDescription row.
+            shared_description = JobDescription.objects.intern(job_description)
+            batch = AnalysisBatch.objects.create(user=user, job_description_ref=shared_description)
+            jobs = AnalysisJob.objects.bulk_create(
+                AnalysisJob(user=user, batch=batch, job_description_ref=shared_description, resume_text=resume)
+                for resume in resumes
+            )
+            AnalysisTask.objects.bulk_create(
+                AnalysisTask(
+                    job=job,
+                    user=user,
+                    generate_full_resume=generate_full_resume,
+                    generate_cover_letter=generate_cover_letter,
+                    priority=PRIORITY_BATCH,
+                )
+                for job in jobs
+            )
+
+        return CreateBatchAnalysis(batch=with_batch_progress(AnalysisBatch.objects).get(pk=batch.pk))
+
+class CancelAnalysisJob(graphene.Mutation):
+    """
+    Cancels one of the user's jobs that is still PENDING or IN_PROGRESS. Queued work is
+    withdrawn; a running worker stops at its next check (within about a second) and stops
+    calling the LLM. Finished jobs are returned unchanged.
+    """
+    class Arguments:
+        job_id = graphene.UUID(required=True)
+
+    job = graphene.Field(lambda: AnalysisJobType)
+
+    @login_required
+    def mutate(self, info, job_id):
+        user = info.context.user
+        jobs = AnalysisJob.objects.filter(pk=job_id, user=user)
+        with transaction.atomic():
+            # Conditional, so a job that finished meanwhile isn't marked cancelled.
+            cancelled = jobs.filter(status__in=('PENDING', 'IN_PROGRESS')).update(
+                status='CANCELLED', updated_at=timezone.now(), version=F('version') + 1
+            )
+            if cancelled:
+                cancel_tasks(job_id)
+        job = jobs.first()
+        if job is None:
+            raise Exception("Analysis job not found.")
+        return CancelAnalysisJob(job=job)
+
 class UpgradeToPremium(graphene.Mutation):
     class Arguments:
         # In a real scenario, this would involve a payment token or similar
@@ -167,9 +509,10 @@ class TokenAuth(graphene.Mutation):
         
         # Get refresh token and set it in an HttpOnly cookie
         refresh_token = create_refresh_token(user)
-        info.context.set_cookie(
+        set_response_cookie(
+            info.context,
             settings.GRAPHQL_JWT.get("JWT_REFRESH_TOKEN_COOKIE_NAME"),
-            refresh_token,
+            str(refresh_token),
             expires=timezone.now() + settings.GRAPHQL_JWT.get("JWT_REFRESH_EXPIRATION_DELTA"),
             httponly=True,
             secure=settings.GRAPHQL_JWT.get("JWT_COOKIE_SECURE"),
@@ -182,7 +525,13 @@ class Logout(graphene.Mutation):
     success = graphene.Boolean()
 
     def mutate(self, info):
-        info.context.delete_cookie(settings.GRAPHQL_JWT.get("JWT_REFRESH_TOKEN_COOKIE_NAME"))
+        # The access token itself stays valid until it expires, but is verified again from now on.
+        token = get_http_authorization(info.context)
+        if token is not None:
+            token_cache.invalidate_token(token)
+        if info.context.user.is_authenticated:
+            token_cache.invalidate_user(info.context.user.pk)
+        set_response_cookie(info.context, settings.GRAPHQL_JWT.get("JWT_REFRESH_TOKEN_COOKIE_NAME"), delete=True)
         return Logout(success=True)
 
 
@@ -190,6 +539,8 @@ class Mutation(graphene.ObjectType):
     # App-specific mutations
     create_user = CreateUser.Field()
     create_analysis_job = CreateAnalysisJob.Field()
+    create_batch_analysis = CreateBatchAnalysis.Field()
+    cancel_analysis_job = CancelAnalysisJob.Field()
     upgrade_to_premium = UpgradeToPremium.Field()
 
     # Auth mutations
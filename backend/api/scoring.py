@@ -0,0 +1,114 @@
+import re
+import time
+
+import numpy as np
+
+from .preprocessing import normalize_whitespace, split_sections, strip_boilerplate
+from .skills import get_skill_index, tokenize
+
+# Sections an ATS expects to find in a resume.
+EXPECTED_RESUME_SECTIONS = {
+    "summary": re.compile(r"\b(summary|profile|objective|about)\b", re.I),
+    "experience": re.compile(r"\b(experience|employment|work history)\b", re.I),
+    "skills": re.compile(r"\b(skills|technologies|tech stack|competencies)\b", re.I),
+    "education": re.compile(r"\b(education|degrees?|certifications?)\b", re.I),
+}
+
+STOPWORDS = frozenset("""
+a about above after all also an and any are as at be been being both but by can could did do does doing
+down during each etc few for from further had has have having he her here hers him his how i if in into is
+it its itself just me more most my no nor not now of off on once only or other our ours out over own per
+same she should so some such than that the their theirs them then there these they this those through to
+too under until up very was we were what when where which while who whom why will with within without
+would you your yours ability able strong excellent good great work working team including experience
+years year role position job candidate candidates looking seeking join us well new using use used plus
+""".split())
+
+_NON_LETTERS = "0123456789+#./-"
+
+MAX_KEYWORDS = 25
+
+
+def _content_terms(tokens):
+    # Drops stopwords and tokens without letters ("2024", "5+").
+    return [token for token in tokens if len(token) > 1 and token not in STOPWORDS and token.strip(_NON_LETTERS)]
+
+
+def _tfidf_matrix(documents):
+    """
+    Builds an L2-normalized TF-IDF matrix (documents x vocabulary) with smoothed IDF.
+    """
+    vocabulary = {}
+    ids = [[vocabulary.setdefault(term, len(vocabulary)) for term in terms] for terms in documents]
+    width = max(1, len(vocabulary))
+    rows = np.repeat(np.arange(len(documents)), [len(row) for row in ids])
+    flat = np.fromiter((term for row in ids for term in row), dtype=np.int64, count=len(rows))
+    counts = np.bincount(rows * width + flat, minlength=len(documents) * width).reshape(len(documents), width)
+    document_frequency = np.count_nonzero(counts, axis=0)
+    idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1
+    weights = np.log1p(counts) * idf
+    norms = np.linalg.norm(weights, axis=1, keepdims=True)
+    return weights / np.where(norms == 0, 1, norms), vocabulary
+
+
+def score_match(job_description, resume_text):
+    """
+    Scores a resume against a job description without calling the LLM.
+
+    Skills are matched against the skill index (api.skills); keywords are the job description's
+    highest TF-IDF terms, with IDF taken over the sections of both documents so that
+    terms repeated in every section (the company name, "team") weigh less. Section
+    headings and boilerplate (benefits, EEO) never count as keywords.
+    """
+    started = time.perf_counter()
+    job_description = strip_boilerplate(normalize_whitespace(job_description))
+    resume_text = normalize_whitespace(resume_text)
+
+    index = get_skill_index()
+    jd_skills = index.find(tokenize(job_description))
+    resume_skills = index.find(tokenize(resume_text))
+    matched_skills = [skill for skill, _ in jd_skills.most_common() if skill in resume_skills]
+    missing_skills = [skill for skill, _ in jd_skills.most_common() if skill not in resume_skills]
+
+    jd_sections = [_content_terms(tokenize(body)) for _, body in split_sections(job_description)] or [[]]
+    resume_sections = [
+        (heading, _content_terms(tokenize(body))) for heading, body in split_sections(resume_text)
+    ] or [("", [])]
+    jd_terms = [term for terms in jd_sections for term in terms]
+    resume_terms = [term for _, terms in resume_sections for term in terms]
+    matrix, vocabulary = _tfidf_matrix([jd_terms, resume_terms] + jd_sections + [terms for _, terms in resume_sections])
+    jd_vector, resume_vector = matrix[0], matrix[1]
+    similarity = float(jd_vector @ resume_vector)
+
+    # Top job description terms, weighted; a keyword counts as covered if the resume uses it.
+    top = np.argsort(-jd_vector, kind='stable')[:MAX_KEYWORDS]
+    top = top[jd_vector[top] > 0]
+    terms = np.array(list(vocabulary), dtype=object)
+    present = resume_vector[top] > 0
+    keyword_weights = jd_vector[top]
+    keyword_coverage = float(keyword_weights[present].sum() / keyword_weights.sum()) if len(top) else 1.0
+    missing_keywords = [str(term) for term in terms[top][~present]]
+
+    skill_coverage = len(matched_skills) / len(jd_skills) if jd_skills else keyword_coverage
+    score = round(100 * (0.5 * skill_coverage + 0.3 * keyword_coverage + 0.2 * similarity))
+
+    keywords = set(terms[top])
+    sections = [
+        {"heading": heading or "(untitled)", "matched_keywords": sorted(keywords.intersection(section_terms))}
+        for heading, section_terms in resume_sections
+    ]
+    headings = " ".join(heading for heading, _ in resume_sections)
+    missing_sections = [name for name, pattern in EXPECTED_RESUME_SECTIONS.items() if not pattern.search(headings)]
+
+    return {
+        "score": max(0, min(100, score)),
+        "skill_coverage": round(skill_coverage, 3),
+        "keyword_coverage": round(keyword_coverage, 3),
+        "similarity": round(similarity, 3),
+        "matched_skills": matched_skills,
+        "missing_skills": missing_skills,
+        "missing_keywords": missing_keywords,
+        "sections": sections,
+        "missing_sections": missing_sections,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
@@ -0,0 +1,417 @@
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import unicodedata
+import zlib
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+
+DEFAULT_SKILL_INDEX_SETTINGS = {
+    "PATH": os.path.join(tempfile.gettempdir(), "resumeforge-skill-index"),
+}
+
+# Seed taxonomy: canonical skill -> aliases. The on-disk index is built from this on first
+# use; further terms are added with `manage.py add_skill_terms`.
+SKILL_LEXICON = {
+    "Python": ("python", "python3"),
+    "Java": ("java",),
+    "JavaScript": ("javascript", "js", "ecmascript"),
+    "TypeScript": ("typescript", "ts"),
+    "Go": ("golang",),
+    "Rust": ("rust",),
+    "C++": ("c++", "cpp"),
+    "C#": ("c#", "csharp"),
+    "Ruby": ("ruby",),
+    "PHP": ("php",),
+    "Kotlin": ("kotlin",),
+    "Swift": ("swift",),
+    "Scala": ("scala",),
+    "SQL": ("sql",),
+    "PostgreSQL": ("postgresql", "postgres", "psql"),
+    "MySQL": ("mysql",),
+    "MongoDB": ("mongodb", "mongo"),
+    "Redis": ("redis",),
+    "Elasticsearch": ("elasticsearch", "elastic search", "opensearch"),
+    "Kafka": ("kafka", "apache kafka"),
+    "RabbitMQ": ("rabbitmq",),
+    "Django": ("django",),
+    "Flask": ("flask",),
+    "FastAPI": ("fastapi",),
+    "Celery": ("celery",),
+    "React": ("react", "react.js", "reactjs"),
+    "Next.js": ("next.js", "nextjs"),
+    "Vue": ("vue", "vue.js", "vuejs"),
+    "Angular": ("angular", "angularjs"),
+    "Node.js": ("node.js", "nodejs", "node"),
+    "Spring": ("spring", "spring boot"),
+    "GraphQL": ("graphql",),
+    "REST APIs": ("rest", "restful", "rest api", "rest apis"),
+    "gRPC": ("grpc",),
+    "HTML": ("html", "html5"),
+    "CSS": ("css", "css3", "tailwind", "tailwindcss"),
+    "AWS": ("aws", "amazon web services"),
+    "GCP": ("gcp", "google cloud", "google cloud platform"),
+    "Azure": ("azure", "microsoft azure"),
+    "Docker": ("docker", "containers", "containerization"),
+    "Kubernetes": ("kubernetes", "k8s"),
+    "Terraform": ("terraform",),
+    "Linux": ("linux", "unix"),
+    "Git": ("git", "github", "gitlab"),
+    "CI/CD": ("ci/cd", "ci", "continuous integration", "continuous delivery", "continuous deployment"),
+    "Machine Learning": ("machine learning", "ml"),
+    "Deep Learning": ("deep learning",),
+    "NLP": ("nlp", "natural language processing"),
+    "Data Analysis": ("data analysis", "data analytics"),
+    "Pandas": ("pandas",),
+    "NumPy": ("numpy",),
+    "TensorFlow": ("tensorflow",),
+    "PyTorch": ("pytorch", "torch"),
+    "Spark": ("spark", "apache spark", "pyspark"),
+    "Airflow": ("airflow", "apache airflow"),
+    "Microservices": ("microservices", "microservice"),
+    "Distributed Systems": ("distributed systems",),
+    "Testing": ("unit testing", "pytest", "jest", "tdd", "test automation"),
+    "Agile": ("agile", "scrum", "kanban"),
+    "Project Management": ("project management",),
+    "Leadership": ("leadership", "mentoring", "mentorship"),
+    "Communication": ("communication",),
+    "Excel": ("excel", "microsoft excel"),
+    "Tableau": ("tableau",),
+    "Power BI": ("power bi", "powerbi"),
+    "Figma": ("figma",),
+    "Security": ("security", "owasp", "appsec"),
+}
+
+# A token is a run of [a-z0-9+#./-] that starts with a letter or digit and doesn't end in
+# ".", "/" or "-", which keeps technology names whole ("c++", "c#", "node.js", "ci/cd").
+_TOKEN_CHARS = frozenset("abcdefghijklmnopqrstuvwxyz0123456789+#./-")
+_SEPARATORS = str.maketrans({chr(code): " " for code in range(128) if chr(code) not in _TOKEN_CHARS})
+
+_HASH_MULTIPLIER = np.uint64(0x100000001B3)
+_MAX_CACHED_TOKENS = 100_000
+# Low bits of the alias hashes, as a lookup table that rules out most n-grams before the
+# binary search.
+_PREFILTER_MASK = np.uint64(0xFFFF)
+
+
+class _TokenHashes(dict):
+    # Values are the packed uint64 bytes, so a document's hashes are one bytes.join away from
+    # an array; building it from Python ints costs more than the dictionary lookups.
+    def __missing__(self, token):
+        value = self[token] = np.uint64(zlib.crc32(token.encode("utf-8"))).tobytes()
+        return value
+
+
+_token_hashes = _TokenHashes()
+
+
+def tokenize(text):
+    # str.translate and str.split do the scanning in C; a regex findall over a 20k-character
+    # job description costs about twice as much.
+    text = (text or "").lower()
+    if not text.isascii():
+        # Every non-ASCII character separates tokens, and so does "?".
+        text = text.encode("ascii", "replace").decode("ascii")
+    tokens = [
+        word if word.isalnum() else word.lstrip("+#./-").rstrip("./-")
+        for word in text.translate(_SEPARATORS).split()
+    ]
+    if "" in tokens:
+        tokens = list(filter(None, tokens))
+    return tokens
+
+
+def normalize_term(text):
+    """
+    Normalized form of a skill alias: NFKC, case-folded, tokenized and space-joined, so
+    "Node.JS", "node.js" and "node.js " all index the same.
+    """
+    return " ".join(tokenize(unicodedata.normalize("NFKC", text).casefold()))
+
+
+def _hash_tokens(tokens):
+    if len(_token_hashes) > _MAX_CACHED_TOKENS:
+        _token_hashes.clear()
+    return np.frombuffer(b"".join(map(_token_hashes.__getitem__, tokens)), dtype=np.uint64)
+
+
+def _ngram_hashes(hashes, n):
+    """
+    Vectorized hash of every run of `n` consecutive tokens; the run length is mixed in so
+    that n-grams of different lengths don't collide with each other.
+    """
+    count = len(hashes) - n + 1
+    if count <= 0:
+        return np.empty(0, dtype=np.uint64)
+    combined = hashes[:count].copy()
+    for offset in range(1, n):
+        combined = combined * _HASH_MULTIPLIER ^ hashes[offset:offset + count]
+    return combined * _HASH_MULTIPLIER ^ np.uint64(n)
+
+
+def _term_hash(alias):
+    tokens = alias.split(" ")
+    return int(_ngram_hashes(_hash_tokens(tokens), len(tokens))[0])
+
+
+class SkillIndex:
+    """
+    Skills taxonomy stored as a sorted array of alias n-gram hashes, memory-mapped from
+    `keys.npy` with a parallel array of alias ids; alias and canonical names live in
+    `meta.json`.
+
+    Lookups hash every token run of a document that is as long as some alias with NumPy
+    and binary-search them, all lengths at once, against the array. New terms are appended to
+    `journal.jsonl` and merged into a small in-memory overlay, so adding terms needs no
+    rebuild; other processes pick journal entries up on their next lookup. `compact()`
+    folds the journal into the base arrays.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._lock:
+            self._load()
+
+    @classmethod
+    def build(cls, path, lexicon):
+        """
+        Writes a fresh base index for `lexicon` ({canonical: aliases}) and clears the journal.
+        """
+        os.makedirs(path, exist_ok=True)
+        canonical, aliases, entries = [], [], {}
+        for name, names in lexicon.items():
+            canonical_id = len(canonical)
+            canonical.append(name)
+            for alias in {normalize_term(name), *(normalize_term(alias) for alias in names)}:
+                if alias and alias not in entries:
+                    entries[alias] = len(aliases)
+                    aliases.append([alias, canonical_id])
+
+        keys = np.array([_term_hash(alias) for alias, _ in aliases], dtype=np.uint64)
+        order = np.argsort(keys, kind="stable")
+        meta = {"canonical": canonical, "aliases": aliases}
+        # Write to temporary names first so concurrent readers never see a half-written index.
+        _save_array(os.path.join(path, "keys.npy"), keys[order])
+        _save_array(os.path.join(path, "values.npy"), order.astype(np.uint32))
+        _write_atomic(os.path.join(path, "meta.json"), json.dumps(meta).encode("utf-8"))
+        open(os.path.join(path, "journal.jsonl"), "wb").close()
+        return cls(path)
+
+    def _load(self):
+        # Callers hold self._lock. Everything is read before anything is replaced, so a
+        # failed read leaves the previous index in place.
+        with open(os.path.join(self.path, "meta.json"), encoding="utf-8") as handle:
+            meta = json.load(handle)
+        # Plain ndarray views of the mappings; np.memmap's per-item overhead isn't needed.
+        keys = np.load(os.path.join(self.path, "keys.npy"), mmap_mode="r").view(np.ndarray)
+        values = np.load(os.path.join(self.path, "values.npy"), mmap_mode="r").view(np.ndarray)
+        prefilter = np.zeros(int(_PREFILTER_MASK) + 1, dtype=bool)
+        prefilter[(keys & _PREFILTER_MASK).astype(np.intp)] = True
+        self._keys, self._values, self._prefilter = keys, values, prefilter
+        self._canonical = meta["canonical"]
+        self._canonical_ids = {name: i for i, name in enumerate(self._canonical)}
+        self._aliases = meta["aliases"]
+        # Token counts that have at least one alias; find() hashes only runs of these lengths.
+        self._ngram_sizes = {alias.count(" ") + 1 for alias, _ in self._aliases}
+        self._overlay = {}
+        self._overlay_keys = np.empty(0, dtype=np.uint64)
+        self._overlay_values = np.empty(0, dtype=np.uint32)
+        self._journal_offset = 0
+        self._read_journal()
+
+    def _read_journal(self):
+        journal = os.path.join(self.path, "journal.jsonl")
+        try:
+            size = os.path.getsize(journal)
+        except FileNotFoundError:
+            return
+        if size == self._journal_offset:
+            return
+        if size < self._journal_offset:
+            # Another process compacted the index: reload the new base arrays.
+            self._load()
+            return
+        with open(journal, "rb") as handle:
+            handle.seek(self._journal_offset)
+            data = handle.read()
+        # Only consume complete lines; a writer may be mid-append.
+        complete = data[:data.rfind(b"\n") + 1]
+        self._journal_offset += len(complete)
+        for line in complete.splitlines():
+            entry = json.loads(line)
+            self._apply(entry["canonical"], entry["aliases"])
+
+    def _apply(self, canonical, aliases):
+        canonical_id = self._canonical_ids.get(canonical)
+        if canonical_id is None:
+            canonical_id = self._canonical_ids[canonical] = len(self._canonical)
+            self._canonical.append(canonical)
+        for alias in {normalize_term(canonical), *(normalize_term(alias) for alias in aliases)}:
+            if not alias:
+                continue
+            key = _term_hash(alias)
+            self._overlay[key] = len(self._aliases)
+            self._prefilter[key & int(_PREFILTER_MASK)] = True
+            self._aliases.append([alias, canonical_id])
+            self._ngram_sizes.add(alias.count(" ") + 1)
+        keys = np.fromiter(self._overlay, dtype=np.uint64, count=len(self._overlay))
+        order = np.argsort(keys)
+        self._overlay_keys = keys[order]
+        self._overlay_values = np.fromiter(self._overlay.values(), dtype=np.uint32, count=len(keys))[order]
+
+    def add_terms(self, canonical, aliases=()):
+        """
+        Adds (or extends) a skill. The entry is journaled, so it survives restarts and is
+        seen by every process using the same PATH.
+        """
+        line = json.dumps({"canonical": canonical, "aliases": list(aliases)}).encode("utf-8") + b"\n"
+        fd = os.open(os.path.join(self.path, "journal.jsonl"), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+        with self._lock:
+            self._read_journal()
+
+    def lexicon(self):
+        with self._lock:
+            self._read_journal()
+            lexicon = {name: [] for name in self._canonical}
+            for alias, canonical_id in self._aliases:
+                lexicon[self._canonical[canonical_id]].append(alias)
+            return lexicon
+
+    def compact(self):
+        """
+        Rebuilds the base arrays from the base plus the journal.
+        """
+        fd = os.open(os.path.join(self.path, "journal.jsonl"), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            # add_terms waits on this lock, so no term lands between the snapshot and the truncate.
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            return SkillIndex.build(self.path, self.lexicon())
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _search(keys, values, hashes):
+        if not len(keys):
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.uint32)
+        positions = np.searchsorted(keys, hashes)
+        positions[positions == len(keys)] = 0
+        hits = np.flatnonzero(keys[positions] == hashes)
+        return hits, values[positions[hits]]
+
+    def _lookup(self, hashes, base, overlay):
+        """
+        Returns (indexes into `hashes`, alias ids) of the hashes found in the base or overlay
+        (keys, values) arrays, in index order.
+        """
+        hits, alias_ids = self._search(*base, hashes)
+        overlay_hits, overlay_ids = self._search(*overlay, hashes)
+        if len(overlay_hits):
+            # Journaled terms override base entries for the same alias.
+            keep = ~np.isin(hits, overlay_hits)
+            hits = np.concatenate([hits[keep], overlay_hits])
+            alias_ids = np.concatenate([alias_ids[keep], overlay_ids])
+            order = np.argsort(hits, kind="stable")
+            hits, alias_ids = hits[order], alias_ids[order]
+        return hits, alias_ids
+
+    def find(self, tokens):
+        """
+        Returns a Counter of canonical skill -> occurrences in the token list. Overlapping
+        aliases count once, for the longest: "apache kafka" is one Kafka, not two.
+        """
+        with self._lock:
+            self._read_journal()
+            # One consistent view: a reload swaps the base arrays and the alias table together.
+            base = self._keys, self._values
+            overlay = self._overlay_keys, self._overlay_values
+            prefilter, aliases, canonical = self._prefilter, self._aliases, self._canonical
+            sizes = sorted(self._ngram_sizes, reverse=True)
+        found = Counter()
+        if not tokens:
+            return found
+        hashes = _hash_tokens(tokens)
+        # Every run length is searched in one call; runs are then claimed longest first.
+        grams = [_ngram_hashes(hashes, n) for n in sizes]
+        offsets = np.cumsum([0] + [len(gram) for gram in grams])
+        grams = np.concatenate(grams)
+        candidates = np.flatnonzero(prefilter[(grams & _PREFILTER_MASK).astype(np.intp)])
+        hits, alias_ids = self._lookup(grams[candidates], base, overlay)
+        hits = candidates[hits]
+        bounds = np.searchsorted(hits, offsets).tolist()
+        consumed = bytearray(len(tokens))
+        claimed = []
+        for n, offset, low, high in zip(sizes, offsets.tolist(), bounds, bounds[1:]):
+            matches = zip((hits[low:high] - offset).tolist(), alias_ids[low:high].tolist())
+            # Hashes can collide; confirm against the stored alias text.
+            if n == 1:
+                claimed.extend(
+                    aliases[alias_id][1] for start, alias_id in matches
+                    if not consumed[start] and tokens[start] == aliases[alias_id][0]
+                )
+                continue
+            # Left to right within a length.
+            for start, alias_id in matches:
+                alias, canonical_id = aliases[alias_id]
+                if not any(consumed[start:start + n]) and " ".join(tokens[start:start + n]) == alias:
+                    consumed[start:start + n] = b"\1" * n
+                    claimed.append(canonical_id)
+        for canonical_id, count in Counter(claimed).items():
+            found[canonical[canonical_id]] = count
+        return found
+
+    def find_in_text(self, text):
+        return self.find(tokenize(unicodedata.normalize("NFKC", text or "")))
+
+
+def _save_array(path, array):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as handle:
+        np.save(handle, array)
+    os.replace(tmp, path)
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as handle:
+        handle.write(data)
+    os.replace(tmp, path)
+
+
+def skill_index_setting(name):
+    return getattr(settings, "SKILL_INDEX", {}).get(name, DEFAULT_SKILL_INDEX_SETTINGS[name])
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_skill_index():
+    """
+    Returns the process-wide skill index at `settings.SKILL_INDEX["PATH"]`, building it
+    from SKILL_LEXICON the first time.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            path = skill_index_setting("PATH")
+            if os.path.exists(os.path.join(path, "meta.json")):
+                _index = SkillIndex(path)
+            else:
+                _index = SkillIndex.build(path, SKILL_LEXICON)
+        return _index
+
+
+def reset_skill_index():
+    global _index
+    with _index_lock:
+        _index = None
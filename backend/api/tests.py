@@ -1,7 +1,19 @@
+import base64
 import json
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
 import pytest
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from graphene_django.utils.testing import GraphQLTestCase
 from resumeforge_backend.schema import schema
 
@@ -73,4 +85,1690 @@ class AuthTests(GraphQLTestCase):
 
         # Check that the query failed as expected
         self.assertIsNotNone(content['errors'])
-        self.assertIsNone(content['data']['tokenAuth'])
\ No newline at end of file
+        self.assertIsNone(content['data']['tokenAuth'])
+
+def _graphql_request(user):
+    from django.test import RequestFactory
+    request = RequestFactory().post('/graphql')
+    request.user = user
+    return request
+
+
+CREATE_JOB_MUTATION = '''
+    mutation CreateAnalysisJob($jobDescription: String!, $resumeText: String!) {
+        createAnalysisJob(jobDescription: $jobDescription, resumeText: $resumeText) {
+            job {
+                id
+                status
+            }
+        }
+    }
+'''
+
+
+@pytest.mark.django_db
+class AnalysisQueueTests(TestCase):
+    def setUp(self):
+        from .cache import reset_generation_cache
+        reset_generation_cache()
+        from .models import Subscription
+        self.user = get_user_model().objects.create_user(username='queueuser', password='testpassword')
+        Subscription.objects.create(user=self.user, plan='FREE')
+
+    def _create_job(self):
+        result = schema.execute(
+            CREATE_JOB_MUTATION,
+            variables={'jobDescription': 'Python developer', 'resumeText': 'I write Python.'},
+            context_value=_graphql_request(self.user),
+        )
+        self.assertIsNone(result.errors)
+        return result.data['createAnalysisJob']['job']
+
+    def test_create_analysis_job_enqueues_without_running(self):
+        """
+        The mutation returns a PENDING job straight away and leaves a task on the queue.
+        """
+        from .models import AnalysisTask
+        with patch('api.analysis.generate_resume_analysis') as analysis:
+            job = self._create_job()
+        analysis.assert_not_called()
+        self.assertEqual(job['status'], 'PENDING')
+        task = AnalysisTask.objects.get(job_id=job['id'])
+        self.assertEqual(task.state, 'QUEUED')
+
+    def test_worker_processes_queued_job(self):
+        from .models import AnalysisJob, AnalysisTask
+        from .queue import process_next_task
+        job = self._create_job()
+        with patch('api.analysis.generate_resume_analysis', return_value='Looks good.'):
+            self.assertTrue(process_next_task('test-worker'))
+        self.assertFalse(process_next_task('test-worker'))
+
+        stored = AnalysisJob.objects.get(pk=job['id'])
+        self.assertEqual(stored.status, 'COMPLETED')
+        self.assertEqual(stored.analysis_result, 'Looks good.')
+        self.assertIn('tokens_saved', stored.stats['preprocessing'])
+        self.assertEqual(AnalysisTask.objects.get(job_id=job['id']).state, 'DONE')
+
+    def test_expired_lease_is_reclaimed(self):
+        from .models import AnalysisTask
+        from .queue import claim_next_task
+        job = self._create_job()
+        first = claim_next_task('worker-a')
+        self.assertIsNone(claim_next_task('worker-b'))
+
+        AnalysisTask.objects.filter(pk=first.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        second = claim_next_task('worker-b')
+        self.assertEqual(str(second.job_id), job['id'])
+        self.assertEqual(second.locked_by, 'worker-b')
+        self.assertEqual(second.attempts, 2)
+
+    def test_failed_task_is_retried_then_failed(self):
+        from .models import AnalysisJob, AnalysisTask
+        from .queue import fail_task, process_next_task
+        job = self._create_job()
+        with self.settings(ANALYSIS_QUEUE={"MAX_ATTEMPTS": 2, "RETRY_BACKOFF_SECONDS": 0}):
+            def checked_fail_task(task, error):
+                # The job isn't FAILED while the task is being retried, not even briefly.
+                self.assertEqual(AnalysisJob.objects.get(pk=job['id']).status, 'IN_PROGRESS')
+                fail_task(task, error)
+
+            with patch('api.analysis.run_generations', side_effect=RuntimeError('boom')):
+                with patch('api.queue.fail_task', side_effect=checked_fail_task):
+                    process_next_task('test-worker')
+                stored = AnalysisJob.objects.get(pk=job['id'])
+                self.assertEqual((stored.status, stored.analysis_result), ('PENDING', None))
+                self.assertEqual(AnalysisTask.objects.get(job_id=job['id']).last_error, 'boom')
+                process_next_task('test-worker')
+        task = AnalysisTask.objects.get(job_id=job['id'])
+        self.assertEqual(task.state, 'FAILED')
+        self.assertEqual(task.attempts, 2)
+        stored = AnalysisJob.objects.get(pk=job['id'])
+        self.assertEqual(stored.status, 'FAILED')
+        self.assertEqual(stored.analysis_result, 'An unexpected error occurred: boom')
+
+
+CANCEL_JOB_MUTATION = '''
+    mutation CancelAnalysisJob($jobId: UUID!) {
+        cancelAnalysisJob(jobId: $jobId) {
+            job {
+                status
+            }
+        }
+    }
+'''
+
+
+class CancellationTests(TransactionTestCase):
+    def setUp(self):
+        from .cache import reset_generation_cache
+        reset_generation_cache()
+        self.user = get_user_model().objects.create_user(username='canceluser', password='testpassword')
+
+    def _job(self):
+        from .models import AnalysisJob
+        return AnalysisJob.objects.create(user=self.user, job_description='Python developer', resume_text='I write Python.')
+
+    def test_cancelling_a_queued_job_withdraws_its_task(self):
+        from .models import AnalysisJob, AnalysisTask
+        from .queue import enqueue_analysis, process_next_task
+        job = self._job()
+        enqueue_analysis(job, False, False)
+        result = schema.execute(CANCEL_JOB_MUTATION, variables={'jobId': str(job.pk)}, context_value=_graphql_request(self.user))
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data['cancelAnalysisJob']['job']['status'], 'CANCELLED')
+        self.assertEqual(AnalysisTask.objects.get(job=job).state, 'CANCELLED')
+        self.assertFalse(process_next_task('test-worker'))
+
+        other = get_user_model().objects.create_user(username='someone-else', password='pw')
+        result = schema.execute(CANCEL_JOB_MUTATION, variables={'jobId': str(job.pk)}, context_value=_graphql_request(other))
+        self.assertEqual(result.errors[0].message, 'Analysis job not found.')
+        self.assertEqual(AnalysisJob.objects.get(pk=job.pk).status, 'CANCELLED')
+
+    def test_running_job_stops_and_stays_cancelled(self):
+        from .analysis import _run_analysis
+        from .cancellation import CancelToken
+        from .models import AnalysisJob
+        job = self._job()
+        token = CancelToken(job.pk, poll_interval=0.02)
+
+        def generate(job_description, resume_text, **kwargs):
+            # cancelAnalysisJob lands while the LLM call is in flight.
+            AnalysisJob.objects.filter(pk=job.pk).update(status='CANCELLED')
+            time.sleep(1)
+            return 'Too late.'
+
+        started = time.monotonic()
+        with patch('api.analysis.generate_resume_analysis', side_effect=generate):
+            self.assertIsNone(_run_analysis(job.pk, False, False, token=token))
+        self.assertLess(time.monotonic() - started, 0.8)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'CANCELLED')
+        self.assertIsNone(job.analysis_result)
+
+    def test_cancelled_llm_call_is_not_retried(self):
+        from .llm import CallCancelled, LLMClient
+        provider = FlakyProvider([ConnectionError('reset')] * 3)
+        client = LLMClient(provider, max_retries=3, backoff_base=0.001, backoff_max=0.01, timeout=5)
+        with self.assertRaises(CallCancelled):
+            client.generate('prompt', cancelled=lambda: provider.calls >= 1)
+        self.assertEqual(provider.calls, 1)
+
+
+class ConcurrentGenerationTests(TestCase):
+    def _slow(self, text, delay):
+        def generate(job_description, resume_text):
+            time.sleep(delay)
+            return text
+        return generate
+
+    def test_generations_run_in_parallel(self):
+        from .analysis import run_generations
+        results = {}
+        generations = {
+            'analysis_result': self._slow('analysis', 0.3),
+            'generated_resume': self._slow('resume', 0.3),
+            'generated_cover_letter': self._slow('letter', 0.3),
+        }
+        started = time.monotonic()
+        outcomes = run_generations(generations, 'jd', 'resume', lambda field, text, ok: results.update({field: text}))
+        self.assertLess(time.monotonic() - started, 0.8)
+        self.assertTrue(all(outcomes.values()))
+        self.assertEqual(results['generated_cover_letter'], 'letter')
+
+    def test_slow_generation_times_out_without_discarding_others(self):
+        from .analysis import run_generations
+        reported = []
+        generations = {
+            'analysis_result': self._slow('analysis', 0),
+            'generated_resume': self._slow('resume', 2),
+        }
+        with self.settings(ANALYSIS_GENERATION_TIMEOUTS={'generated_resume': 0.2}):
+            started = time.monotonic()
+            outcomes = run_generations(generations, 'jd', 'resume', lambda *args: reported.append(args))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(outcomes, {'analysis_result': True, 'generated_resume': False})
+        self.assertEqual(reported[0], ('analysis_result', 'analysis', True))
+        self.assertIn('timed out', reported[1][1])
+
+
+@pytest.mark.django_db
+class GenerationCacheTests(TestCase):
+    def setUp(self):
+        from .cache import reset_generation_cache
+        reset_generation_cache()
+
+    def test_identical_inputs_are_served_from_cache(self):
+        from .analysis import _run_analysis
+        from .cache import get_generation_cache
+        from .models import AnalysisJob
+        first = AnalysisJob.objects.create(job_description='Python  developer', resume_text='I write Python.')
+        second = AnalysisJob.objects.create(job_description='Python developer\n', resume_text='I write Python.')
+
+        with patch('api.analysis.generate_resume_analysis', return_value='Looks good.') as analysis:
+            _run_analysis(first.id, False, False)
+            _run_analysis(second.id, False, False)
+        self.assertEqual(analysis.call_count, 1)
+
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'COMPLETED')
+        self.assertEqual(second.analysis_result, 'Looks good.')
+        self.assertEqual(get_generation_cache().stats()['locmem_hits'], 1)
+
+    def test_shared_tier_backfills_local_tier(self):
+        from .cache import get_generation_cache
+        cache = get_generation_cache()
+        cache.set('analysis_result', 'jd', 'resume', 'cached')
+        cache.backends[0].invalidate()
+
+        self.assertEqual(cache.get('analysis_result', 'jd', 'resume'), 'cached')
+        self.assertEqual(cache.get('analysis_result', 'jd', 'resume'), 'cached')
+        self.assertEqual(cache.stats()['database_hits'], 1)
+        self.assertEqual(cache.stats()['locmem_hits'], 1)
+
+    def test_prompt_version_is_part_of_the_key(self):
+        from .cache import make_cache_key
+        self.assertNotEqual(
+            make_cache_key('analysis_result', 'jd', 'resume', prompt_version='1'),
+            make_cache_key('analysis_result', 'jd', 'resume', prompt_version='2'),
+        )
+        self.assertNotEqual(
+            make_cache_key('analysis_result', 'jd', 'resume'),
+            make_cache_key('generated_resume', 'jd', 'resume'),
+        )
+
+    def test_locmem_backend_evicts_least_recently_used(self):
+        from .cache import LocMemBackend
+        backend = LocMemBackend(MAX_ENTRIES=2)
+        backend.set('a', '1', 'analysis_result', 60)
+        backend.set('b', '2', 'analysis_result', 60)
+        backend.get('a')
+        backend.set('c', '3', 'analysis_result', 60)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('a'), '1')
+        backend.set('d', '4', 'analysis_result', -1)
+        self.assertIsNone(backend.get('d'))
+
+    def test_database_backend_purges_expired_rows(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .cache import DatabaseBackend
+        from .models import GenerationCacheEntry
+        backend = DatabaseBackend(PURGE_INTERVAL=3600)
+        backend.set('new', 'fresh', 'analysis_result', 60)
+        # The first set purged; the next purge is an hour away.
+        backend.set('old', 'stale', 'analysis_result', -1)
+        self.assertEqual(GenerationCacheEntry.objects.count(), 2)
+        backend._next_purge = 0.0
+        backend.set('newer', 'fresh', 'analysis_result', 60)
+        self.assertEqual(set(GenerationCacheEntry.objects.values_list('key', flat=True)), {'new', 'newer'})
+
+        from django.utils import timezone
+        GenerationCacheEntry.objects.filter(key='new').update(expires_at=timezone.now())
+        call_command('clear_generation_cache', '--expired', stdout=StringIO())
+        self.assertEqual(list(GenerationCacheEntry.objects.values_list('key', flat=True)), ['newer'])
+
+
+class FakeStreamingModel:
+    """
+    Stand-in for `genai.GenerativeModel` that yields a fixed response in chunks.
+    """
+    chunks = ['Strong ', 'Python ', 'experience.']
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        if not stream:
+            return SimpleNamespace(text=''.join(self.chunks))
+        return (SimpleNamespace(text=text) for text in self.chunks)
+
+
+@pytest.mark.django_db(transaction=True)
+class StreamingTests(TransactionTestCase):
+    def setUp(self):
+        from .cache import reset_generation_cache
+        from .llm import reset_llm_client
+        reset_generation_cache()
+        reset_llm_client()
+        self.addCleanup(reset_llm_client)
+
+    def test_streamed_generation_is_relayed_and_saved(self):
+        from .analysis import _run_analysis, streaming_generator
+        from .models import AnalysisJob, GenerationChunk
+        job = AnalysisJob.objects.create(job_description='Python developer', resume_text='I write Python.')
+        streaming = {'ENABLED': True, 'FLUSH_CHARS': 1, 'FLUSH_SECONDS': 60}
+
+        with self.settings(ANALYSIS_STREAMING=streaming), patch('api.llm.genai.GenerativeModel', FakeStreamingModel):
+            text = streaming_generator(job.pk, 'analysis_result')('jd', 'resume')
+            self.assertEqual(text, 'Strong Python experience.')
+            self.assertEqual(
+                list(GenerationChunk.objects.filter(job=job).order_by('id').values_list('text', flat=True)),
+                FakeStreamingModel.chunks,
+            )
+
+            _run_analysis(job.pk, False, False)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'COMPLETED')
+        self.assertEqual(job.analysis_result, 'Strong Python experience.')
+        self.assertFalse(GenerationChunk.objects.filter(job=job).exists())
+
+    async def test_stream_view_sends_chunks_then_done(self):
+        from .models import AnalysisJob, GenerationChunk
+        job = await AnalysisJob.objects.acreate(
+            job_description='jd', resume_text='resume', status='COMPLETED', analysis_result='Strong Python'
+        )
+        first = await GenerationChunk.objects.acreate(job=job, field='analysis_result', text='Strong ')
+        await GenerationChunk.objects.acreate(job=job, field='analysis_result', text='Python')
+
+        response = await self.async_client.get(f'/jobs/{job.pk}/stream', headers={'Last-Event-ID': str(first.pk)})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+
+        events = [block for block in body.split('\n\n') if block]
+        self.assertEqual(len(events), 2)
+        self.assertIn('event: chunk', events[0])
+        self.assertIn('"text": "Python"', events[0])
+        self.assertIn('event: done', events[1])
+        self.assertIn('"analysisResult": "Strong Python"', events[1])
+
+
+class FlakyProvider:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def generate(self, prompt, timeout):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+    def is_transient(self, error):
+        return isinstance(error, ConnectionError)
+
+
+class LLMClientTests(TestCase):
+    def _client(self, provider, **overrides):
+        from .llm import LLMClient
+        options = {'max_retries': 3, 'backoff_base': 0.001, 'backoff_max': 0.01, 'timeout': 5}
+        options.update(overrides)
+        return LLMClient(provider, **options)
+
+    def test_expired_job_deadline_makes_no_provider_call(self):
+        from .cancellation import CancelToken
+        from .llm import DeadlineExceeded
+        token = CancelToken(job_id=None, deadline=time.monotonic() - 1)
+        provider = FlakyProvider([])
+        client = self._client(provider)
+        with self.assertRaises(DeadlineExceeded):
+            client.generate('prompt', timeout=token.remaining(30))
+        with self.assertRaises(DeadlineExceeded):
+            list(client.stream('prompt', timeout=token.remaining(30)))
+        self.assertEqual(provider.calls, 0)
+
+    def test_transient_errors_are_retried(self):
+        provider = FlakyProvider([ConnectionError('reset'), ConnectionError('reset')])
+        self.assertEqual(self._client(provider).generate('prompt'), 'ok')
+        self.assertEqual(provider.calls, 3)
+
+    def test_permanent_errors_are_not_retried(self):
+        provider = FlakyProvider([ValueError('bad request')])
+        with self.assertRaises(ValueError):
+            self._client(provider).generate('prompt')
+        self.assertEqual(provider.calls, 1)
+
+    def test_retries_stop_at_the_deadline(self):
+        provider = FlakyProvider([ConnectionError('reset')] * 10)
+        with self.assertRaises(ConnectionError):
+            self._client(provider, backoff_base=1, backoff_max=1).generate('prompt', timeout=0.05)
+        self.assertLess(provider.calls, 10)
+
+    def test_fake_provider_is_deterministic(self):
+        from .llm import FakeProvider
+        client = self._client(FakeProvider(LATENCY=0, RESPONSE_WORDS=20, STREAM_CHUNKS=4))
+        text = client.generate('Analyze this resume')
+        self.assertEqual(text, client.generate('Analyze this resume'))
+        self.assertNotEqual(text, client.generate('Write a cover letter'))
+        self.assertEqual(''.join(client.stream('Analyze this resume')).strip(), text)
+
+
+class OutboundLimiterTests(TestCase):
+    def _limiter(self, requests_per_minute=600, burst=10, max_in_flight=10, path=None):
+        from .ratelimit import FileTokenBucket, OutboundLimiter
+        if path is None:
+            state_dir = tempfile.TemporaryDirectory()
+            self.addCleanup(state_dir.cleanup)
+            path = os.path.join(state_dir.name, 'bucket.json')
+        bucket = FileTokenBucket(
+            path,
+            requests_per_minute=requests_per_minute,
+            burst=burst,
+            max_in_flight=max_in_flight,
+            lease_seconds=60,
+        )
+        return OutboundLimiter(bucket, poll_interval=0.01)
+
+    def test_burst_is_limited_by_token_bucket(self):
+        from .ratelimit import RateLimitTimeout
+        limiter = self._limiter(requests_per_minute=60, burst=2)
+        limiter.release(limiter.acquire())
+        limiter.release(limiter.acquire())
+        with self.assertRaises(RateLimitTimeout):
+            limiter.acquire(timeout=0.05)
+
+    def test_in_flight_calls_are_capped(self):
+        from .ratelimit import RateLimitTimeout
+        limiter = self._limiter(max_in_flight=1)
+        lease = limiter.acquire()
+        with self.assertRaises(RateLimitTimeout):
+            limiter.acquire(timeout=0.05)
+        limiter.release(lease)
+        limiter.release(limiter.acquire(timeout=0.05))
+
+    def test_premium_waiters_are_served_first(self):
+        from .ratelimit import PRIORITY_PREMIUM, PRIORITY_STANDARD
+        limiter = self._limiter(max_in_flight=1)
+        lease = limiter.acquire()
+        served = []
+
+        def wait_for_slot(name, priority):
+            with limiter.slot(priority, timeout=5):
+                served.append(name)
+
+        standard = threading.Thread(target=wait_for_slot, args=('standard', PRIORITY_STANDARD))
+        standard.start()
+        time.sleep(0.05)
+        premium = threading.Thread(target=wait_for_slot, args=('premium', PRIORITY_PREMIUM))
+        premium.start()
+        time.sleep(0.05)
+
+        limiter.release(lease)
+        standard.join()
+        premium.join()
+        self.assertEqual(served, ['premium', 'standard'])
+
+    def test_priority_applies_across_processes_sharing_the_state_file(self):
+        from .ratelimit import PRIORITY_BATCH, PRIORITY_PREMIUM
+        interactive = self._limiter(max_in_flight=1)
+        # A second limiter on the same file stands in for another worker process.
+        batch = self._limiter(max_in_flight=1, path=interactive.bucket.path)
+        lease = interactive.acquire()
+        served = []
+
+        def wait_for_slot(limiter, name, priority):
+            with limiter.slot(priority, timeout=5):
+                served.append(name)
+                time.sleep(0.05)
+
+        premium = threading.Thread(target=wait_for_slot, args=(interactive, 'premium', PRIORITY_PREMIUM))
+        premium.start()
+        time.sleep(0.05)
+        bulk = threading.Thread(target=wait_for_slot, args=(batch, 'batch', PRIORITY_BATCH))
+        bulk.start()
+        time.sleep(0.05)
+
+        batch.release(lease)
+        premium.join()
+        bulk.join()
+        self.assertEqual(served, ['premium', 'batch'])
+
+    def test_waiter_that_gives_up_is_withdrawn(self):
+        from .ratelimit import PRIORITY_BATCH, PRIORITY_PREMIUM, RateLimitTimeout
+        limiter = self._limiter(max_in_flight=1)
+        lease = limiter.acquire()
+        with self.assertRaises(RateLimitTimeout):
+            limiter.acquire(PRIORITY_PREMIUM, timeout=0.05)
+        limiter.release(lease)
+        limiter.release(limiter.acquire(PRIORITY_BATCH, timeout=0.05))
+
+
+@pytest.mark.django_db
+class QuotaTests(TestCase):
+    def setUp(self):
+        from .models import Subscription
+        self.user = get_user_model().objects.create_user(username='quotauser', password='testpassword')
+        Subscription.objects.create(user=self.user, plan='FREE')
+
+    def _create_job(self):
+        return schema.execute(
+            CREATE_JOB_MUTATION,
+            variables={'jobDescription': 'Python developer', 'resumeText': 'I write Python.'},
+            context_value=_graphql_request(self.user),
+        )
+
+    def test_concurrent_jobs_are_limited_per_plan(self):
+        from .models import AnalysisJob
+        self.assertIsNone(self._create_job().errors)
+        result = self._create_job()
+
+        error = result.errors[0]
+        self.assertEqual(error.extensions['code'], 'QUOTA_EXCEEDED')
+        self.assertEqual(error.extensions['limit'], 'CONCURRENT')
+        self.assertGreater(error.extensions['retryAfter'], 0)
+        self.assertEqual(AnalysisJob.objects.count(), 1)
+
+    def test_queued_batch_jobs_dont_count_against_concurrent(self):
+        result = schema.execute(
+            CREATE_BATCH_MUTATION,
+            variables={'jobDescription': 'Python developer', 'resumes': ['Resume one.', 'Resume two.']},
+            context_value=_graphql_request(self.user),
+        )
+        self.assertIsNone(result.errors)
+        self.assertIsNone(self._create_job().errors)
+        self.assertEqual(self._create_job().errors[0].extensions['limit'], 'CONCURRENT')
+
+    def test_in_flight_jobs_are_counted_under_the_user_lock(self):
+        from django.db import transaction
+        from django.test.utils import CaptureQueriesContext
+        from .quotas import enforce_quotas
+        with CaptureQueriesContext(connection) as queries, transaction.atomic():
+            enforce_quotas(self.user, False)
+        sql = [query['sql'] for query in queries.captured_queries]
+        lock = next(i for i, q in enumerate(sql) if 'auth_user' in q)
+        count = next(i for i, q in enumerate(sql) if 'api_analysistask' in q)
+        self.assertLess(lock, count)
+
+    def test_per_minute_quota_returns_retry_after(self):
+        from .models import AnalysisTask, QuotaCounter
+        quotas = {'FREE': {'PER_MINUTE': 2, 'PER_DAY': 100, 'CONCURRENT': 10}}
+        with self.settings(ANALYSIS_QUOTAS=quotas):
+            self.assertIsNone(self._create_job().errors)
+            self.assertIsNone(self._create_job().errors)
+            result = self._create_job()
+
+        error = result.errors[0]
+        self.assertEqual(error.extensions['limit'], 'PER_MINUTE')
+        self.assertTrue(1 <= error.extensions['retryAfter'] <= 60)
+        self.assertEqual(AnalysisTask.objects.filter(user=self.user).count(), 2)
+        # The rejected attempt isn't counted.
+        self.assertEqual(QuotaCounter.objects.get(user=self.user, window='MINUTE').count, 2)
+
+    def test_previous_window_is_weighted_into_the_estimate(self):
+        from .quotas import QuotaExceeded, _window_start, enforce_quotas
+        from .models import QuotaCounter
+        now = timezone.now()
+        start = _window_start(now, timedelta(days=1))
+        QuotaCounter.objects.create(user=self.user, window='DAY', window_start=start - timedelta(days=1), count=1000)
+        quotas = {'FREE': {'PER_MINUTE': 100, 'PER_DAY': 20, 'CONCURRENT': 10}}
+        with self.settings(ANALYSIS_QUOTAS=quotas), self.assertRaises(QuotaExceeded) as raised:
+            enforce_quotas(self.user, is_premium=False)
+        self.assertEqual(raised.exception.extensions['limit'], 'PER_DAY')
+
+
+SAMPLE_JOB_DESCRIPTION = """
+Senior   Python Engineer
+
+Requirements:
+5+ years of Python and Django experience
+Experience with PostgreSQL and GraphQL APIs
+5+ years of Python and Django experience
+
+Responsibilities:
+Build and maintain backend services for our hiring platform.
+
+Benefits:
+Unlimited PTO, free snacks and a generous 401k match.
+
+We are an equal opportunity employer and value diversity at our company.
+"""
+
+
+class PreprocessingTests(TestCase):
+    def test_boilerplate_and_duplicates_are_removed(self):
+        from .preprocessing import preprocess_inputs
+        job_description, resume_text, stats = preprocess_inputs(SAMPLE_JOB_DESCRIPTION, 'I  write\r\nPython.', prompt_count=3)
+
+        self.assertIn('Senior Python Engineer', job_description)
+        self.assertIn('Requirements:', job_description)
+        self.assertEqual(job_description.count('5+ years of Python and Django experience'), 1)
+        self.assertNotIn('Unlimited PTO', job_description)
+        self.assertNotIn('equal opportunity', job_description)
+        self.assertEqual(resume_text, 'I write\nPython.')
+        self.assertGreater(stats['tokens_saved'], 0)
+        self.assertEqual(stats['tokens_saved'] % 3, 0)
+
+    def test_budget_keeps_the_most_important_sections(self):
+        from .preprocessing import estimate_tokens, fit_to_budget
+        text = "\n\n".join([
+            "Interests:\n" + "Chess and hiking. " * 40,
+            "Skills:\nPython, Django, PostgreSQL",
+            "Education:\n" + "BSc Computer Science. " * 40,
+        ])
+        fitted = fit_to_budget(text, 100)
+        self.assertLessEqual(estimate_tokens(fitted), 100)
+        self.assertIn('Python, Django, PostgreSQL', fitted)
+        self.assertNotIn('Chess', fitted)
+
+
+class CombinedGenerationTests(TestCase):
+    def test_parser_splits_sections_and_skips_missing_ones(self):
+        from .gemini import parse_combined_response
+        text = "Sure!\n=== ANALYSIS ===\nGood fit.\n\n=== TAILORED RESUME ===\n\n=== COVER LETTER ===\nDear team,"
+        sections = parse_combined_response(text, ['analysis_result', 'generated_resume', 'generated_cover_letter'])
+        self.assertEqual(sections, {'analysis_result': 'Good fit.', 'generated_cover_letter': 'Dear team,'})
+
+    def test_missing_sections_fall_back_to_separate_calls(self):
+        from .analysis import run_combined_generation
+        results = {}
+        generations = {
+            'analysis_result': lambda jd, resume: 'separate analysis',
+            'generated_cover_letter': lambda jd, resume: 'separate letter',
+        }
+        with patch('api.analysis.generate_combined', return_value={'analysis_result': 'combined analysis'}):
+            outcomes = run_combined_generation(
+                generations, 'jd', 'resume', lambda field, text, ok: results.update({field: text})
+            )
+        self.assertEqual(outcomes, {'analysis_result': True, 'generated_cover_letter': True})
+        self.assertEqual(results, {'analysis_result': 'combined analysis', 'generated_cover_letter': 'separate letter'})
+
+    def test_combined_call_against_fake_provider(self):
+        from .gemini import generate_combined
+        from .llm import FakeProvider, LLMClient, override_llm_client
+        fields = ['analysis_result', 'generated_resume', 'generated_cover_letter']
+        client = LLMClient(FakeProvider(RESPONSE_WORDS=5), max_retries=0, backoff_base=0, backoff_max=0, timeout=5)
+        with override_llm_client(client):
+            sections = generate_combined('Python developer', 'I write Python.', fields)
+        self.assertEqual(sorted(sections), sorted(fields))
+
+
+CREATE_BATCH_MUTATION = '''
+    mutation CreateBatchAnalysis($jobDescription: String!, $resumes: [String!]!) {
+        createBatchAnalysis(jobDescription: $jobDescription, resumes: $resumes) {
+            batch {
+                id
+                total
+                status
+            }
+        }
+    }
+'''
+
+BATCH_QUERY = '''
+    query Batch($id: UUID!) {
+        batch(id: $id) {
+            total
+            pending
+            completed
+            failed
+            progress
+            status
+            jobs {
+                id
+                status
+            }
+        }
+    }
+'''
+
+
+class BatchAnalysisTests(TestCase):
+    def setUp(self):
+        from .models import Subscription
+        self.user = get_user_model().objects.create_user(username='batchuser', password='testpassword')
+        Subscription.objects.create(user=self.user, plan='FREE')
+
+    def _create_batch(self, resumes):
+        return schema.execute(
+            CREATE_BATCH_MUTATION,
+            variables={'jobDescription': 'Python developer', 'resumes': resumes},
+            context_value=_graphql_request(self.user),
+        )
+
+    def test_batch_creates_one_job_and_task_per_resume(self):
+        from .models import AnalysisTask
+        from .ratelimit import PRIORITY_BATCH
+        result = self._create_batch(['Resume one.', 'Resume two.', 'Resume three.'])
+        self.assertIsNone(result.errors)
+        batch = result.data['createBatchAnalysis']['batch']
+        self.assertEqual(batch['total'], 3)
+        self.assertEqual(batch['status'], 'PENDING')
+        tasks = AnalysisTask.objects.filter(job__batch_id=batch['id'])
+        self.assertEqual(tasks.count(), 3)
+        self.assertTrue(all(task.priority == PRIORITY_BATCH for task in tasks))
+
+    def test_batch_shares_its_jobs_job_description(self):
+        from .models import AnalysisBatch, JobDescription
+        batch_id = self._create_batch(['Resume one.', 'Resume two.']).data['createBatchAnalysis']['batch']['id']
+        batch = AnalysisBatch.objects.get(pk=batch_id)
+        self.assertEqual(JobDescription.objects.count(), 1)
+        self.assertEqual({job.job_description_ref_id for job in batch.jobs.all()}, {batch.job_description_ref_id})
+        result = schema.execute(
+            'query($id: UUID!) { batch(id: $id) { jobDescription } }',
+            variables={'id': batch_id},
+            context_value=_graphql_request(self.user),
+        )
+        self.assertEqual(result.data['batch']['jobDescription'], 'Python developer')
+
+    def test_batch_size_is_limited_per_plan(self):
+        result = self._create_batch([f'Resume {i}.' for i in range(6)])
+        self.assertEqual(result.errors[0].extensions['limit'], 'BATCH_SIZE')
+
+    def test_batch_progress_is_read_without_n_plus_one(self):
+        from .models import AnalysisJob
+        batch_id = self._create_batch([f'Resume {i}.' for i in range(5)]).data['createBatchAnalysis']['batch']['id']
+        jobs = AnalysisJob.objects.filter(batch_id=batch_id).order_by('created_at', 'id')
+        AnalysisJob.objects.filter(pk__in=[job.pk for job in jobs[:2]]).update(status='COMPLETED')
+        AnalysisJob.objects.filter(pk=jobs[2].pk).update(status='FAILED')
+
+        with self.assertNumQueries(2):
+            result = schema.execute(BATCH_QUERY, variables={'id': batch_id}, context_value=_graphql_request(self.user))
+        self.assertIsNone(result.errors)
+        batch = result.data['batch']
+        self.assertEqual((batch['total'], batch['completed'], batch['failed'], batch['pending']), (5, 2, 1, 2))
+        self.assertAlmostEqual(batch['progress'], 0.6)
+        self.assertEqual(batch['status'], 'IN_PROGRESS')
+        self.assertEqual(len(batch['jobs']), 5)
+
+    def test_workers_respect_batch_parallelism(self):
+        from .queue import claim_next_task
+        self._create_batch([f'Resume {i}.' for i in range(4)])
+        with self.settings(ANALYSIS_QUEUE={"BATCH_MAX_PARALLEL": 2}):
+            self.assertIsNotNone(claim_next_task('worker-a'))
+            self.assertIsNotNone(claim_next_task('worker-b'))
+            self.assertIsNone(claim_next_task('worker-c'))
+
+
+JOB_IF_CHANGED_QUERY = '''
+    query Job($id: UUID!, $since: Int) {
+        job(id: $id, ifChangedSince: $since) {
+            status
+            version
+        }
+    }
+'''
+
+
+@pytest.mark.django_db(transaction=True)
+class ConditionalPollingTests(TransactionTestCase):
+    def test_version_increases_on_every_write(self):
+        from .models import AnalysisJob
+        from .queue import enqueue_analysis, process_next_task
+        job = AnalysisJob.objects.create(job_description='jd', resume_text='resume')
+        self.assertEqual(job.version, 0)
+        enqueue_analysis(job, False, False)
+        with patch('api.analysis.generate_resume_analysis', return_value='Looks good.'):
+            process_next_task('test-worker')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'COMPLETED')
+        # IN_PROGRESS, preprocessing stats, the result and the final status.
+        self.assertEqual(job.version, 4)
+
+    def test_job_query_is_empty_when_unchanged(self):
+        from .models import AnalysisJob
+        job = AnalysisJob.objects.create(job_description='jd', resume_text='resume')
+        result = schema.execute(JOB_IF_CHANGED_QUERY, variables={'id': str(job.pk), 'since': 0})
+        self.assertIsNone(result.errors)
+        self.assertIsNone(result.data['job'])
+
+        job.status = 'IN_PROGRESS'
+        job.save()
+        result = schema.execute(JOB_IF_CHANGED_QUERY, variables={'id': str(job.pk), 'since': 0})
+        self.assertEqual(result.data['job'], {'status': 'IN_PROGRESS', 'version': 1})
+
+    async def test_long_poll_returns_not_modified_on_timeout(self):
+        from .models import AnalysisJob
+        job = await AnalysisJob.objects.acreate(job_description='jd', resume_text='resume')
+        with self.settings(ANALYSIS_STREAMING={'LONG_POLL_TIMEOUT': 0.1, 'POLL_INTERVAL': 0.02}):
+            response = await self.async_client.get(f'/jobs/{job.pk}/poll', headers={'If-None-Match': '"0"'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], '"0"')
+
+    async def test_long_poll_wakes_up_on_change(self):
+        from .models import AnalysisJob
+        job = await AnalysisJob.objects.acreate(job_description='jd', resume_text='resume')
+
+        def finish():
+            AnalysisJob.objects.filter(pk=job.pk).update(status='COMPLETED', version=1)
+            connection.close()
+
+        timer = threading.Timer(0.1, finish)
+        with self.settings(ANALYSIS_STREAMING={'LONG_POLL_TIMEOUT': 5, 'POLL_INTERVAL': 0.02}):
+            started = time.monotonic()
+            timer.start()
+            response = await self.async_client.get(f'/jobs/{job.pk}/poll?version=0')
+        timer.join()
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {'id': str(job.pk), 'status': 'COMPLETED', 'version': 1})
+
+
+class ScoringTests(TestCase):
+    RESUME = (
+        "Jane Doe\n\nSummary\nBackend engineer working in Python and Django.\n\n"
+        "Experience\nBuilt REST APIs on Postgres and AWS.\n\nEducation\nBSc Computer Science"
+    )
+
+    def test_score_reports_missing_skills_and_sections(self):
+        from .scoring import score_match
+        result = score_match(SAMPLE_JOB_DESCRIPTION, self.RESUME)
+        self.assertEqual(result['matched_skills'], ['Python', 'Django', 'PostgreSQL'])
+        self.assertEqual(result['missing_skills'], ['GraphQL'])
+        self.assertIn('graphql', result['missing_keywords'])
+        # Benefits and EEO boilerplate never become keywords.
+        self.assertNotIn('snacks', result['missing_keywords'])
+        self.assertEqual(result['missing_sections'], ['skills'])
+        self.assertTrue(0 < result['score'] < 100)
+
+    def test_score_is_saved_even_when_generation_fails(self):
+        from .analysis import _run_analysis
+        from .models import AnalysisJob
+        job = AnalysisJob.objects.create(job_description=SAMPLE_JOB_DESCRIPTION, resume_text=self.RESUME)
+        with patch('api.analysis.generate_resume_analysis', side_effect=TimeoutError('LLM timed out')):
+            _run_analysis(job.pk, False, False)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertEqual(job.ats_score['missing_skills'], ['GraphQL'])
+
+
+class SkillIndexTests(TestCase):
+    def setUp(self):
+        from .skills import SKILL_LEXICON, SkillIndex
+        self.path = tempfile.mkdtemp()
+        self.index = SkillIndex.build(self.path, SKILL_LEXICON)
+
+    def test_aliases_and_normalized_forms_map_to_canonical_skills(self):
+        from .skills import tokenize
+        found = self.index.find(tokenize("Apache Spark, Node.JS, C++ and CI/CD on Google Cloud Platform"))
+        self.assertEqual(set(found), {'Spark', 'Node.js', 'C++', 'CI/CD', 'GCP'})
+
+    def test_tokenize_keeps_technology_names_whole(self):
+        from .skills import tokenize
+        self.assertEqual(
+            tokenize("C++, C#, Node.js. CI/CD - (e.g. café’s REST-APIs)... ++go"),
+            ['c++', 'c#', 'node.js', 'ci/cd', 'e.g', 'caf', 's', 'rest-apis', 'go'],
+        )
+
+    def test_journaled_alias_overrides_the_base_entry(self):
+        self.index.add_terms('Go (language)', ['go'])
+        self.assertEqual(self.index.find_in_text('go and golang'), {'Go (language)': 1, 'Go': 1})
+
+    def test_overlapping_aliases_count_once_for_the_longest(self):
+        self.assertEqual(self.index.find_in_text("apache kafka and rest api"), {'Kafka': 1, 'REST APIs': 1})
+        self.assertEqual(
+            self.index.find_in_text("Google Cloud Platform, google cloud and kafka, Kafka"),
+            {'GCP': 2, 'Kafka': 2},
+        )
+
+    def test_terms_are_added_incrementally_and_seen_by_other_processes(self):
+        from .skills import SkillIndex
+        other = SkillIndex(self.path)
+        self.index.add_terms('Svelte', ['SvelteKit'])
+        self.assertEqual(self.index.find_in_text('Built with sveltekit'), {'Svelte': 1})
+        # A second instance (another process) reads the journal on its next lookup.
+        self.assertEqual(other.find_in_text('svelte'), {'Svelte': 1})
+
+        self.index.compact()
+        self.assertEqual(SkillIndex(self.path).find_in_text('svelte'), {'Svelte': 1})
+        self.assertEqual(other.find_in_text('SvelteKit and Python'), {'Svelte': 1, 'Python': 1})
+
+    def test_terms_added_during_compaction_are_kept(self):
+        from .skills import SkillIndex
+        other = SkillIndex(self.path)
+        lexicon = self.index.lexicon
+        adder = threading.Thread(target=other.add_terms, args=('Svelte',))
+
+        def snapshot_then_add():
+            snapshot = lexicon()
+            # Another process adds a term after the snapshot, before the journal is truncated.
+            adder.start()
+            time.sleep(0.1)
+            return snapshot
+
+        with patch.object(self.index, 'lexicon', snapshot_then_add):
+            self.index.compact()
+        adder.join()
+        self.assertEqual(SkillIndex(self.path).find_in_text('svelte'), {'Svelte': 1})
+
+    def test_budget_trimming_keeps_sections_with_requested_skills(self):
+        from .preprocessing import fit_to_budget
+        resume = "Interests\nGraphQL APIs for hobby projects\n\nHobbies\nHiking and chess " + "very " * 50
+        with patch('api.preprocessing.get_skill_index', return_value=self.index):
+            fitted = fit_to_budget(resume, 15, skills={'GraphQL'})
+        self.assertIn('GraphQL', fitted)
+        self.assertNotIn('Hiking', fitted)
+
+
+MY_JOBS_QUERY = '''
+    query MyJobs($first: Int, $after: String) {
+        myJobs(first: $first, after: $after) {
+            edges {
+                node {
+                    id
+                    status
+                }
+            }
+            pageInfo {
+                hasNextPage
+                endCursor
+            }
+        }
+    }
+'''
+
+
+class MyJobsTests(TestCase):
+    def setUp(self):
+        from .models import AnalysisJob
+        self.user = get_user_model().objects.create_user(username='historyuser', password='testpassword')
+        other = get_user_model().objects.create_user(username='otheruser', password='testpassword')
+        AnalysisJob.objects.create(user=other, job_description='jd', resume_text='resume')
+        created = timezone.now()
+        self.jobs = AnalysisJob.objects.bulk_create(
+            # Two jobs share a timestamp to exercise the id tie-breaker.
+            AnalysisJob(user=self.user, job_description='jd', resume_text='resume')
+            for _ in range(5)
+        )
+        for offset, job in enumerate(self.jobs):
+            AnalysisJob.objects.filter(pk=job.pk).update(created_at=created - timedelta(minutes=min(offset, 3)))
+
+    def _page(self, first, after=None):
+        result = schema.execute(
+            MY_JOBS_QUERY, variables={'first': first, 'after': after}, context_value=_graphql_request(self.user)
+        )
+        self.assertIsNone(result.errors)
+        return result.data['myJobs']
+
+    def test_keyset_pagination_walks_all_jobs_newest_first(self):
+        from .models import AnalysisJob
+        seen, after = [], None
+        while True:
+            page = self._page(2, after)
+            seen += [edge['node']['id'] for edge in page['edges']]
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        expected = AnalysisJob.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('id', flat=True)
+        self.assertEqual(seen, [str(pk) for pk in expected])
+
+    def test_invalid_pagination_arguments_are_rejected(self):
+        def error(query, **variables):
+            result = schema.execute(query, variables=variables, context_value=_graphql_request(self.user))
+            return result.errors[0].message if result.errors else None
+
+        self.assertIn('at least 1', error(MY_JOBS_QUERY, first=0))
+        self.assertIn('at least 1', error(MY_JOBS_QUERY, first=-5))
+        self.assertEqual(len(self._page(1000)['edges']), 5)
+        bad_date = base64.urlsafe_b64encode(f"yesterday|{self.jobs[0].pk}".encode()).decode()
+        for cursor in ('not-a-cursor', bad_date, base64.urlsafe_b64encode(b'2024-01-01T00:00:00|7').decode()):
+            self.assertEqual(error(MY_JOBS_QUERY, first=2, after=cursor), 'Invalid cursor.')
+        self.assertIn('only pages forward', error('query { myJobs(last: 2) { edges { cursor } } }'))
+        self.assertIn('only pages forward', error('query { myJobs(before: "x") { edges { cursor } } }'))
+
+    def test_listing_skips_large_text_columns(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            self._page(10)
+        sql = queries.captured_queries[-1]['sql']
+        for column in ('resume_text', 'job_description', 'analysis_result', 'generated_resume'):
+            self.assertNotIn(column, sql)
+
+
+class SelectedColumnsTests(TestCase):
+    def setUp(self):
+        from .models import AnalysisJob
+        self.job = AnalysisJob.objects.create(
+            job_description='jd', resume_text='resume', status='COMPLETED', analysis_result='Looks good.'
+        )
+
+    def _columns(self, query, **variables):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            result = schema.execute(query, variables={'id': str(self.job.pk), **variables})
+        self.assertIsNone(result.errors)
+        self.assertEqual(len(queries), 1)
+        select = queries[0]['sql'].split(' FROM ')[0]
+        return {column.split('.')[-1].strip('"') for column in select[len('SELECT '):].split(', ')}
+
+    def test_status_poll_reads_only_status_columns(self):
+        columns = self._columns('query($id: UUID!) { job(id: $id) { id status version } }')
+        self.assertEqual(columns, {'id', 'status', 'version'})
+
+    def test_results_query_reads_result_columns_but_not_inputs(self):
+        columns = self._columns('''
+            query($id: UUID!) { job(id: $id) { ...Result } }
+            fragment Result on AnalysisJobType { status analysisResult generatedResume generatedCoverLetter }
+        ''')
+        self.assertEqual(columns, {'id', 'status', 'analysis_result', 'generated_resume', 'generated_cover_letter'})
+
+    def test_conditional_poll_reads_only_selected_columns(self):
+        columns = self._columns(
+            'query($id: UUID!, $since: Int) { job(id: $id, ifChangedSince: $since) { status } }', since=0
+        )
+        self.assertEqual(columns, {'id', 'status'})
+
+
+class QueryCountTests(TestCase):
+    def setUp(self):
+        from .auth import token_cache
+        from .models import Subscription
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(username='countuser', password='testpassword')
+        Subscription.objects.create(user=self.user, plan='PREMIUM')
+
+    def _post(self, query):
+        from graphql_jwt.shortcuts import get_token
+        return self.client.post(
+            '/graphql',
+            json.dumps({'query': query}),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'JWT {get_token(self.user)}',
+        )
+
+    def test_me_with_subscription_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            response = self._post('query Me { me { username isPremium subscription { plan } } }')
+        data = json.loads(response.content)['data']['me']
+        self.assertEqual(data, {'username': 'countuser', 'isPremium': True, 'subscription': {'plan': 'PREMIUM'}})
+
+    def test_subscription_loader_caches_missing_subscriptions(self):
+        from .loaders import get_loaders
+        from .models import Subscription
+        users = [self.user] + [
+            get_user_model().objects.create_user(username=f'loaderuser{i}', password='testpassword') for i in range(2)
+        ]
+        Subscription.objects.create(user=users[1], plan='FREE')
+        request = _graphql_request(self.user)
+        with self.assertNumQueries(3):
+            subscriptions = [get_loaders(request).subscriptions.load(user.pk) for user in users]
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_loaders(request).subscriptions.load(users[2].pk))
+        self.assertEqual([getattr(s, 'plan', None) for s in subscriptions], ['PREMIUM', 'FREE', None])
+
+    def test_create_job_reuses_the_authenticated_users_subscription(self):
+        from .auth import get_user_by_natural_key
+        user = get_user_by_natural_key('countuser')
+        with patch('api.schema.enforce_quotas'), self.assertNumQueries(0):
+            self.assertTrue(user.subscription.is_premium())
+        with patch('api.schema.enforce_quotas'):
+            with self.assertNumQueries(5):
+                # SAVEPOINT, job description INSERT, job INSERT, task INSERT, RELEASE SAVEPOINT.
+                result = schema.execute(
+                    CREATE_JOB_MUTATION,
+                    variables={'jobDescription': 'jd', 'resumeText': 'resume'},
+                    context_value=_graphql_request(user),
+                )
+        self.assertIsNone(result.errors)
+
+
+class AuthCacheTests(TestCase):
+    def setUp(self):
+        from graphql_jwt.shortcuts import get_token
+        from .auth import token_cache
+        from .models import Subscription
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(username='cacheuser', password='testpassword')
+        self.subscription = Subscription.objects.create(user=self.user, plan='FREE')
+        self.token = get_token(self.user)
+
+    def _post(self, query, token=None):
+        response = self.client.post(
+            '/graphql',
+            json.dumps({'query': query}),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'JWT {token or self.token}',
+        )
+        return json.loads(response.content)
+
+    def test_verified_token_is_reused_until_the_subscription_changes(self):
+        query = 'query Me { me { username isPremium } }'
+        self.assertEqual(self._post(query)['data']['me'], {'username': 'cacheuser', 'isPremium': False})
+        with self.assertNumQueries(0):
+            self.assertEqual(self._post(query)['data']['me']['isPremium'], False)
+
+        self.subscription.plan = 'PREMIUM'
+        self.subscription.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self._post(query)['data']['me']['isPremium'], True)
+
+    def test_token_auth_sets_and_logout_clears_the_refresh_cookie(self):
+        response = self.client.post(
+            '/graphql',
+            json.dumps({'query': 'mutation { tokenAuth(username: "cacheuser", password: "testpassword") { token } }'}),
+            content_type='application/json',
+        )
+        self.assertTrue(json.loads(response.content)['data']['tokenAuth']['token'])
+        cookie = response.cookies['refresh_token']
+        self.assertTrue(cookie.value)
+        self.assertTrue(cookie['httponly'])
+
+        response = self.client.post(
+            '/graphql',
+            json.dumps({'query': 'mutation { logout { success } }'}),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'JWT {self.token}',
+        )
+        self.assertEqual(response.cookies['refresh_token'].value, '')
+
+    def test_logout_and_expiry_drop_the_cached_user(self):
+        from .auth import token_cache
+        self._post('query Me { me { username } }')
+        self.assertEqual(len(token_cache), 1)
+        self._post('mutation Logout { logout { success } }')
+        self.assertEqual(len(token_cache), 0)
+
+        self._post('query Me { me { username } }')
+        with self.settings(AUTH_CACHE={'TTL': 0}):
+            token_cache.clear()
+            self._post('query Me { me { username } }')
+        self.assertEqual(len(token_cache), 0)
+
+    def test_allow_any_is_decided_once_per_operation(self):
+        from graphql_jwt.settings import jwt_settings
+        from .auth import allow_any
+        calls = []
+
+        def counting_allow_any(info, **kwargs):
+            calls.append(info.field_name)
+            return allow_any(info, **kwargs)
+
+        # A public operation name skips authentication for every root field in it...
+        with patch.object(jwt_settings, 'JWT_ALLOW_ANY_HANDLER', counting_allow_any):
+            body = self._post('query verifyToken { me { username } other: me { email } }')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(body['errors'][0]['message'], 'You do not have permission to perform this action')
+        # ...but not for the same root field in later operations.
+        self.assertEqual(self._post('query Me { me { username } }')['data']['me'], {'username': 'cacheuser'})
+
+
+class PersistedQueryTests(TestCase):
+    JOB_QUERY = 'query Job($id: UUID!) { job(id: $id) { id status } }'
+
+    def setUp(self):
+        from .persisted import document_cache
+        from .models import AnalysisJob
+        document_cache.clear()
+        self.job = AnalysisJob.objects.create(job_description='jd', resume_text='resume')
+
+    def _extensions(self, query):
+        from .persisted import query_hash
+        return {'persistedQuery': {'version': 1, 'sha256Hash': query_hash(query)}}
+
+    def _get(self, query, send_text=False):
+        params = {
+            'variables': json.dumps({'id': str(self.job.pk)}),
+            'extensions': json.dumps(self._extensions(query)),
+        }
+        if send_text:
+            params['query'] = query
+        return self.client.get('/graphql', params, HTTP_ACCEPT='application/json')
+
+    def test_unknown_hash_is_registered_by_resending_the_query(self):
+        body = {'variables': {'id': str(self.job.pk)}, 'extensions': self._extensions(self.JOB_QUERY)}
+        response = self.client.post('/graphql', body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['errors'], [{'message': 'PersistedQueryNotFound', 'extensions': {'code': 'PERSISTED_QUERY_NOT_FOUND'}}]
+        )
+
+        response = self.client.post('/graphql', {**body, 'query': self.JOB_QUERY}, content_type='application/json')
+        self.assertEqual(response.json()['data']['job']['status'], 'PENDING')
+
+        # From now on the hash alone is enough, and the document is neither parsed nor validated again.
+        with patch('api.views.parse', side_effect=AssertionError('parsed')), \
+                patch('api.views.validate', side_effect=AssertionError('validated')):
+            self.assertEqual(self._get(self.JOB_QUERY).json()['data']['job']['status'], 'PENDING')
+            response = self.client.post('/graphql', {**body, 'query': self.JOB_QUERY}, content_type='application/json')
+            self.assertEqual(response.json()['data']['job']['status'], 'PENDING')
+
+        response = self.client.post(
+            '/graphql', {**body, 'query': 'query Job($id: UUID!) { job(id: $id) { id } }'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_mutations_are_not_served_over_get(self):
+        response = self.client.get(
+            '/graphql',
+            {'query': CREATE_JOB_MUTATION, 'extensions': json.dumps(self._extensions(CREATE_JOB_MUTATION))},
+            HTTP_ACCEPT='application/json',
+        )
+        self.assertEqual(response.status_code, 405)
+
+    def test_only_finished_jobs_get_long_lived_cache_headers(self):
+        from .models import AnalysisJob, AnalysisTask
+        response = self._get(self.JOB_QUERY, send_text=True)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+
+        AnalysisJob.objects.filter(pk=self.job.pk).update(status='COMPLETED')
+        response = self._get(self.JOB_QUERY)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=86400, immutable')
+        self.assertNotIn('csrftoken', response.cookies)
+        with self.settings(PERSISTED_QUERIES={'CACHE_MAX_AGE': 60}):
+            self.assertEqual(self._get(self.JOB_QUERY)['Cache-Control'], 'public, max-age=60, immutable')
+
+        # A failed job whose task will be retried isn't final yet.
+        AnalysisJob.objects.filter(pk=self.job.pk).update(status='FAILED')
+        task = AnalysisTask.objects.create(job=self.job)
+        self.assertEqual(self._get(self.JOB_QUERY)['Cache-Control'], 'no-cache')
+        AnalysisTask.objects.filter(pk=task.pk).update(state='FAILED')
+        self.assertEqual(self._get(self.JOB_QUERY)['Cache-Control'], 'public, max-age=86400, immutable')
+
+        # Every root field has to be cacheable, and only GET responses are.
+        response = self._get('query Job($id: UUID!) { job(id: $id) { id } me { username } }', send_text=True)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        response = self.client.post(
+            '/graphql', {'query': self.JOB_QUERY, 'variables': {'id': str(self.job.pk)}}, content_type='application/json'
+        )
+        self.assertFalse(response.has_header('Cache-Control'))
+
+
+class TextCompressionTests(TestCase):
+    RESUME = 'Senior engineer. Built Django and PostgreSQL services for payments. ' * 20
+
+    def setUp(self):
+        from .compression import reset_dictionaries
+        reset_dictionaries()
+        self.addCleanup(reset_dictionaries)
+
+    def _raw(self, column, job):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT {column} FROM api_analysisjob WHERE id = %s', [job.pk.hex])
+            return cursor.fetchone()[0]
+
+    def test_long_text_is_stored_compressed_and_read_back_transparently(self):
+        from .compression import MARKER
+        from .models import AnalysisJob
+        job = AnalysisJob.objects.create(job_description='Python developer', resume_text=self.RESUME)
+        stored = self._raw('resume_text', job)
+        self.assertTrue(stored.startswith(MARKER))
+        self.assertLess(len(stored), len(self.RESUME) / 4)
+        self.assertEqual(AnalysisJob.objects.get(pk=job.pk).resume_text, self.RESUME)
+        # Short values stay plain; text that happens to start with the marker is still encoded.
+        self.assertEqual(self._raw('job_description', job), None)
+        job.analysis_result = MARKER + 'short'
+        job.save(update_fields=['analysis_result'])
+        self.assertEqual(AnalysisJob.objects.get(pk=job.pk).analysis_result, MARKER + 'short')
+
+    def test_identical_job_descriptions_share_one_row(self):
+        from .models import AnalysisJob, JobDescription
+        first = AnalysisJob.objects.create(job_description=SAMPLE_JOB_DESCRIPTION, resume_text='a')
+        second = AnalysisJob.objects.create(job_description=SAMPLE_JOB_DESCRIPTION, resume_text='b')
+        self.assertEqual(first.job_description_ref_id, second.job_description_ref_id)
+        self.assertEqual(JobDescription.objects.count(), 1)
+        self.assertEqual(AnalysisJob.objects.get(pk=second.pk).job_description, SAMPLE_JOB_DESCRIPTION)
+
+    def test_migration_command_converts_legacy_rows_and_can_be_rerun(self):
+        from django.core.management import call_command
+        from .compression import MARKER
+        from .models import AnalysisJob, JobDescription
+        jobs = [AnalysisJob.objects.create(job_description='jd', resume_text='resume') for _ in range(3)]
+        with connection.cursor() as cursor:
+            # Rows as written before compression: plain text, job description inline.
+            cursor.execute(
+                'UPDATE api_analysisjob SET job_description = %s, job_description_ref_id = NULL, resume_text = %s',
+                [SAMPLE_JOB_DESCRIPTION, self.RESUME],
+            )
+        self.assertEqual(AnalysisJob.objects.get(pk=jobs[0].pk).job_description, SAMPLE_JOB_DESCRIPTION)
+
+        call_command('compress_job_text', batch_size=2, stdout=open(os.devnull, 'w'))
+        for job in jobs:
+            self.assertIsNone(self._raw('job_description', job))
+            self.assertTrue(self._raw('resume_text', job).startswith(MARKER))
+            reloaded = AnalysisJob.objects.get(pk=job.pk)
+            self.assertEqual((reloaded.job_description, reloaded.resume_text), (SAMPLE_JOB_DESCRIPTION, self.RESUME))
+        self.assertEqual(JobDescription.objects.filter(jobs__isnull=False).distinct().count(), 1)
+
+        from io import StringIO
+        output = StringIO()
+        call_command('compress_job_text', stdout=output)
+        self.assertEqual(output.getvalue().count('rewrote 0 row(s)'), 3)
+
+    def test_dictionary_compression_round_trips(self):
+        from django.core.management import call_command
+        from .compression import ZLIB, decompress_text
+        from .models import CompressionDictionary, JobDescription
+        for n in range(12):
+            JobDescription.objects.intern(f'Acme Corp is hiring engineer number {n}.\n' + SAMPLE_JOB_DESCRIPTION)
+        call_command('train_compression_dictionary', codec='zlib', stdout=open(os.devnull, 'w'))
+        dictionary = CompressionDictionary.objects.get()
+        self.assertEqual(dictionary.codec, ZLIB)
+
+        with self.settings(TEXT_COMPRESSION={"CODEC": "zlib"}):
+            description = JobDescription.objects.intern('A new posting.\n' + SAMPLE_JOB_DESCRIPTION)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT text FROM api_jobdescription WHERE hash = %s', [description.hash])
+            stored = cursor.fetchone()[0]
+        self.assertTrue(stored.startswith(f'\x01{ZLIB}{dictionary.pk}:'))
+        self.assertEqual(decompress_text(stored), description.text)
+        self.assertEqual(JobDescription.objects.get(pk=description.pk).text, description.text)
+
+
+class RetentionTests(TestCase):
+    def _job(self, user, status, age_days, **fields):
+        from .models import AnalysisJob
+        job = AnalysisJob.objects.create(user=user, job_description='jd', resume_text='resume', status=status, **fields)
+        AnalysisJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(days=age_days))
+        return job
+
+    def test_archives_and_deletes_jobs_past_their_plan_ttl(self):
+        import gzip
+        from django.core.management import call_command
+        from .models import AnalysisJob, AnalysisTask, JobDescription, Subscription
+        free = get_user_model().objects.create_user(username='freeuser', password='testpassword')
+        premium = get_user_model().objects.create_user(username='premiumuser', password='testpassword')
+        Subscription.objects.create(user=premium, plan='PREMIUM')
+        expired = [
+            self._job(None, 'COMPLETED', 8),
+            self._job(free, 'FAILED', 31, analysis_result='Boom'),
+            self._job(premium, 'COMPLETED', 400),
+        ]
+        kept = [
+            self._job(free, 'COMPLETED', 20),
+            self._job(premium, 'COMPLETED', 60),
+            self._job(free, 'PENDING', 400),
+        ]
+        AnalysisTask.objects.create(job=expired[1], state='FAILED')
+
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('archive_analysis_jobs', archive_dir=directory, batch_size=2, stdout=open(os.devnull, 'w'))
+            [name] = os.listdir(directory)
+            with gzip.open(os.path.join(directory, name), 'rt') as archive:
+                rows = [json.loads(line) for line in archive]
+
+        self.assertEqual(sorted(row['id'] for row in rows), sorted(str(job.pk) for job in expired))
+        failed = next(row for row in rows if row['id'] == str(expired[1].pk))
+        self.assertEqual((failed['job_description'], failed['analysis_result']), ('jd', 'Boom'))
+        self.assertEqual(set(AnalysisJob.objects.values_list('pk', flat=True)), {job.pk for job in kept})
+        self.assertFalse(AnalysisTask.objects.exists())
+        # Still referenced by the kept jobs.
+        self.assertEqual(JobDescription.objects.count(), 1)
+
+    def test_dry_run_only_counts(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import AnalysisJob
+        self._job(None, 'COMPLETED', 30)
+        output = StringIO()
+        call_command('archive_analysis_jobs', dry_run=True, stdout=output)
+        self.assertIn('1 expired job(s)', output.getvalue())
+        self.assertEqual(AnalysisJob.objects.count(), 1)
+
+    def test_partitions_expire_by_whole_month_after_the_longest_ttl(self):
+        from datetime import datetime, timezone as dt_timezone
+        from .partitioning import add_months, is_partitioned, partition_name, partition_start
+        from .retention import expired_partitions
+        start = datetime(2025, 11, 1, tzinfo=dt_timezone.utc)
+        self.assertEqual(add_months(start, 2), datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(partition_start(partition_name(start)), start)
+        self.assertIsNone(partition_start('api_analysisjob_pdefault'))
+
+        partitions = [(partition_name(add_months(start, n)), add_months(start, n)) for n in range(3)]
+        now = datetime(2026, 12, 15, tzinfo=dt_timezone.utc)
+        # 365 days before now is 2025-12-15, so only November 2025 ends before the cutoff month.
+        self.assertEqual([name for name, _ in expired_partitions(partitions, now)], ['api_analysisjob_p202511'])
+        # SQLite has no partitioning; retention falls back to row deletes.
+        self.assertFalse(is_partitioned())
+
+    def test_partition_with_unfinished_jobs_is_kept(self):
+        from datetime import datetime, timezone as dt_timezone
+        from .models import AnalysisJob
+        from .retention import JobArchive, archive_partition
+        start = datetime(2025, 11, 1, tzinfo=dt_timezone.utc)
+        finished = self._job(None, 'COMPLETED', 400)
+        stuck = self._job(None, 'PENDING', 400)
+        AnalysisJob.objects.filter(pk__in=[finished.pk, stuck.pk]).update(created_at=start + timedelta(days=3))
+
+        archive = JobArchive(os.path.join(tempfile.mkdtemp(), 'archive.jsonl.gz'))
+        try:
+            self.assertEqual(archive_partition('api_analysisjob_p202511', start, archive), (1, False))
+        finally:
+            archive.close()
+        self.assertEqual(list(AnalysisJob.objects.values_list('pk', flat=True)), [stuck.pk])
+
+
+def _async_graphql_urls():
+    from django.urls import path
+    from django.views.decorators.csrf import csrf_exempt
+    from .views import AsyncGraphQLView
+    return [path('graphql', csrf_exempt(AsyncGraphQLView.as_view()))]
+
+
+# URLconf for AsyncGraphQLTests: /graphql served as it is under ASGI.
+urlpatterns = _async_graphql_urls()
+
+
+@override_settings(ROOT_URLCONF='api.tests')
+class AsyncGraphQLTests(TransactionTestCase):
+    def setUp(self):
+        from graphql_jwt.shortcuts import get_token
+        from .auth import token_cache
+        from .models import Subscription
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(username='async-user', password='pw')
+        Subscription.objects.create(user=self.user, plan='PREMIUM')
+        self.headers = {'Authorization': f'JWT {get_token(self.user)}'}
+
+    async def _post(self, query, variables=None, headers=None):
+        response = await self.async_client.post(
+            '/graphql', {'query': query, 'variables': variables or {}}, content_type='application/json', headers=headers
+        )
+        return response.status_code, json.loads(response.content)
+
+    async def test_job_and_me_are_served_on_the_event_loop(self):
+        from graphene_django.views import GraphQLView
+        from .models import AnalysisJob
+        job = await AnalysisJob.objects.acreate(job_description='jd', resume_text='resume', status='COMPLETED')
+        query = 'query($id: UUID!) { job(id: $id) { status version } me { username isPremium subscription { plan } } }'
+        with patch.object(GraphQLView, 'dispatch', side_effect=AssertionError('sync fallback')):
+            status, body = await self._post(query, {'id': str(job.pk)}, self.headers)
+        self.assertEqual(status, 200)
+        self.assertEqual(body['data']['job'], {'status': 'COMPLETED', 'version': 0})
+        self.assertEqual(
+            body['data']['me'], {'username': 'async-user', 'isPremium': True, 'subscription': {'plan': 'PREMIUM'}}
+        )
+
+    async def test_other_operations_fall_back_to_the_sync_view(self):
+        status, body = await self._post('query { me { username } }')
+        self.assertEqual(status, 200)
+        self.assertEqual(body['errors'][0]['message'], 'You do not have permission to perform this action')
+
+        status, body = await self._post(
+            CREATE_JOB_MUTATION, {'jobDescription': 'jd', 'resumeText': 'resume'}, self.headers
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(body['data']['createAnalysisJob']['job']['status'], 'PENDING')
+
+    async def test_persisted_job_query_over_get_stays_on_the_event_loop(self):
+        from graphene_django.views import GraphQLView
+        from .models import AnalysisJob
+        from .persisted import document_cache, query_hash
+        document_cache.clear()
+        job = await AnalysisJob.objects.acreate(job_description='jd', resume_text='resume', status='COMPLETED')
+        query = 'query Job($id: UUID!) { job(id: $id) { status } }'
+        await self._post(query, {'id': str(job.pk)})
+        params = {
+            'variables': json.dumps({'id': str(job.pk)}),
+            'extensions': json.dumps({'persistedQuery': {'version': 1, 'sha256Hash': query_hash(query)}}),
+        }
+        with patch.object(GraphQLView, 'dispatch', side_effect=AssertionError('sync fallback')):
+            response = await self.async_client.get('/graphql', params, headers={'Accept': 'application/json'})
+        self.assertEqual(json.loads(response.content)['data']['job'], {'status': 'COMPLETED'})
+        self.assertEqual(response['Cache-Control'], 'public, max-age=86400, immutable')
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        from .cache import reset_generation_cache
+        from .metrics import reset_metrics
+        reset_generation_cache()
+        reset_metrics()
+
+    def test_job_records_stage_and_generation_timings(self):
+        from .analysis import _run_analysis
+        from .metrics import ANALYSIS_STAGE_SECONDS, LLM_REQUEST_SECONDS, LLM_TOKENS
+        from .models import AnalysisJob
+        job = AnalysisJob.objects.create(job_description='Python developer', resume_text='I write Python.')
+        with self.settings(ANALYSIS_GENERATION_MODE='separate'), \
+                patch('api.analysis.generate_resume_analysis', return_value='Looks good.'), \
+                patch('api.analysis.generate_full_resume', side_effect=RuntimeError('quota')):
+            _run_analysis(job.pk, True, False, queue_wait=1.5)
+
+        timings = AnalysisJob.objects.get(pk=job.pk).stats['timings']
+        self.assertEqual(timings['stages_ms']['queue_wait'], 1500.0)
+        for stage in ('db_load', 'preprocessing', 'scoring', 'generation', 'db_save'):
+            self.assertIn(stage, timings['stages_ms'])
+        analysis = timings['generations']['analysis_result']
+        self.assertTrue(analysis['ok'])
+        self.assertGreater(analysis['input_tokens'], 0)
+        self.assertEqual(analysis['output_tokens'], 3)
+        self.assertIn('quota', timings['generations']['generated_resume']['error'])
+
+        self.assertEqual(ANALYSIS_STAGE_SECONDS.count(stage='queue_wait'), 1)
+        self.assertEqual(LLM_REQUEST_SECONDS.count(field='generated_resume', outcome='error'), 1)
+        self.assertEqual(LLM_TOKENS.value(field='analysis_result', direction='output'), 3)
+
+    def test_metrics_endpoint_and_resolver_timing(self):
+        from .models import AnalysisJob
+        job = AnalysisJob.objects.create(job_description='jd', resume_text='resume')
+        response = self.client.post(
+            '/graphql',
+            {'query': 'query($id: UUID!) { job(id: $id) { id status analysisResult } }', 'variables': {'id': str(job.pk)}},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+
+        # Without a token the endpoint isn't served at all.
+        with self.settings(METRICS={}):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+        with self.settings(METRICS={"TOKEN": "secret"}):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('resumeforge_graphql_resolver_seconds_count{field="Query.job"} 1', body)
+        # Plain attribute reads aren't timed.
+        self.assertNotIn('AnalysisJobType.analysisResult', body)
+
+    def test_generation_cache_lookups_are_counted(self):
+        from .cache import get_generation_cache
+        from .metrics import GENERATION_CACHE_LOOKUPS, GENERATION_CACHE_MISSES
+        cache = get_generation_cache()
+        self.assertIsNone(cache.get('analysis_result', 'jd', 'resume'))
+        cache.set('analysis_result', 'jd', 'resume', 'cached')
+        self.assertEqual(cache.get('analysis_result', 'jd', 'resume'), 'cached')
+        self.assertEqual(GENERATION_CACHE_MISSES.value(), 1)
+        self.assertEqual(GENERATION_CACHE_LOOKUPS.value(tier='locmem', result='miss'), 1)
+        self.assertEqual(GENERATION_CACHE_LOOKUPS.value(tier='database', result='miss'), 1)
+        self.assertEqual(GENERATION_CACHE_LOOKUPS.value(tier='locmem', result='hit'), 1)
+
+    def test_worker_metrics_server(self):
+        from urllib.error import HTTPError
+        from urllib.request import Request, urlopen
+        from .metrics import ANALYSIS_JOBS, serve_metrics
+        ANALYSIS_JOBS.inc(status='COMPLETED')
+        server = serve_metrics(0, host='127.0.0.1')
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with self.settings(METRICS={}):
+                with self.assertRaises(HTTPError) as caught:
+                    urlopen(url, timeout=5)
+                self.assertEqual(caught.exception.code, 404)
+            with self.settings(METRICS={"TOKEN": "secret"}):
+                with self.assertRaises(HTTPError) as caught:
+                    urlopen(url, timeout=5)
+                self.assertEqual(caught.exception.code, 401)
+                with urlopen(Request(url, headers={'Authorization': 'Bearer secret'}), timeout=5) as response:
+                    self.assertIn('resumeforge_analysis_jobs_total{status="COMPLETED"} 1', response.read().decode())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class BenchmarkReportTests(TestCase):
+    def test_regressions_are_flagged_against_a_baseline(self):
+        from .bench import compare_reports
+        def report(p95, queries):
+            return {'operations': {'me': {'latency_ms': {'p95': p95}, 'queries_per_request': {'mean': queries}}}}
+        self.assertEqual(compare_reports(report(10.0, 1.0), report(11.5, 1.0), threshold=0.2), [])
+        regressions = compare_reports(report(10.0, 1.0), report(13.0, 2.0), threshold=0.2)
+        self.assertEqual([r['metric'] for r in regressions], ['p95_ms', 'queries_per_request'])
+
+
+def _pdf(*pages):
+    """
+    A minimal PDF with one page per argument, each a list of text lines.
+    """
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for lines in pages:
+        text = b' '.join(b'(%s) Tj 0 -16 Td' % line.encode() for line in lines)
+        stream = b'BT /F1 12 Tf 72 720 Td ' + text + b' ET'
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> '
+            b'/Contents %d 0 R >>' % len(objects)
+        )
+        kids.append(b'%d 0 R' % len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(kids), len(kids))
+
+    data = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(data)
+    data += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    data += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    return data + b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+
+
+def _docx(paragraphs, pages=None):
+    import io
+    import zipfile
+    word = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+    body = ''.join(f'<w:p><w:r><w:t>{paragraph}</w:t></w:r></w:p>' for paragraph in paragraphs)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('word/document.xml', f'<w:document xmlns:w="{word}"><w:body>{body}</w:body></w:document>')
+        if pages is not None:
+            archive.writestr(
+                'docProps/app.xml',
+                '<Properties xmlns="http://schemas.openxmlformats.org/officeDocument/2006/extended-properties">'
+                f'<Pages>{pages}</Pages></Properties>',
+            )
+    return buffer.getvalue()
+
+
+class ResumeUploadTests(TestCase):
+    RESUME = [['Jane Doe, backend developer', 'Experience', 'Built Django services for payments.'], ['Skills', 'Python, PostgreSQL']]
+
+    @classmethod
+    def tearDownClass(cls):
+        from .ingestion import reset_parser_pool
+        reset_parser_pool()
+        super().tearDownClass()
+
+    def setUp(self):
+        from graphql_jwt.shortcuts import get_token
+        from .auth import token_cache
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(username='uploader', password='testpassword')
+        self.headers = {'HTTP_AUTHORIZATION': f'JWT {get_token(self.user)}'}
+
+    def _upload(self, data, name='resume.pdf', **headers):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        return self.client.post('/resumes/upload', {'file': SimpleUploadedFile(name, data)}, **{**self.headers, **headers})
+
+    def test_pdf_is_streamed_to_disk_parsed_once_and_usable_for_a_job(self):
+        from django.core.files.uploadedfile import TemporaryUploadedFile
+        from .ingestion import ingest_resume
+        from .models import AnalysisJob
+        with patch('api.views.ingest_resume', wraps=ingest_resume) as ingest:
+            response = self._upload(_pdf(*self.RESUME))
+        self.assertEqual(response.status_code, 200, response.content)
+        # Even a small upload goes to a temporary file rather than memory.
+        self.assertIsInstance(ingest.call_args.args[0], TemporaryUploadedFile)
+        body = response.json()
+        self.assertEqual((body['fileType'], body['pages'], body['cached']), ('pdf', 2, False))
+        self.assertIn('Built Django services for payments.', body['text'])
+        self.assertEqual([section['heading'] for section in body['sections']], ['', 'Experience', 'Skills'])
+
+        with patch('api.ingestion.extract_text', side_effect=AssertionError('parsed again')):
+            again = self._upload(_pdf(*self.RESUME), name='copy.pdf').json()
+        self.assertEqual((again['fileHash'], again['cached']), (body['fileHash'], True))
+
+        with patch('api.schema.enforce_quotas'):
+            result = schema.execute(
+                '''mutation($file: String!) { createAnalysisJob(jobDescription: "jd", resumeFile: $file) { job { id } } }''',
+                variables={'file': body['fileHash']},
+                context_value=_graphql_request(self.user),
+            )
+        self.assertIsNone(result.errors)
+        job = AnalysisJob.objects.get(pk=result.data['createAnalysisJob']['job']['id'])
+        self.assertEqual(job.resume_text, body['text'])
+
+    def test_docx_paragraphs_become_lines(self):
+        body = self._upload(_docx(['Jane Doe', 'EXPERIENCE', 'Built Django services.']), name='resume.docx').json()
+        self.assertEqual(body['fileType'], 'docx')
+        self.assertEqual(body['text'], 'Jane Doe\nEXPERIENCE\nBuilt Django services.')
+
+    def test_limits_and_rejections(self):
+        self.assertEqual(self._upload(_pdf(*self.RESUME), HTTP_AUTHORIZATION='').status_code, 401)
+        self.assertEqual(self._upload(b'plain text resume', name='resume.txt').status_code, 415)
+        with self.settings(RESUME_UPLOADS={'MAX_PAGES': 1}):
+            response = self._upload(_pdf(*self.RESUME))
+            self.assertEqual(response.status_code, 422)
+            self.assertIn('at most 1', response.json()['error'])
+            self.assertEqual(self._upload(_docx(['Jane Doe'], pages=3), name='resume.docx').status_code, 422)
+        with self.settings(RESUME_UPLOADS={'MAX_BYTES': 100}):
+            self.assertEqual(self._upload(_pdf(*self.RESUME)).status_code, 413)
+
+    def test_malformed_pdf_is_a_validation_error(self):
+        truncated = _pdf(*self.RESUME)[:300]
+        # pypdf raises a plain TypeError for a page tree whose /Kids isn't an array.
+        broken_tree = re.sub(rb'/Kids \[[^\]]*\]', b'/Kids 7', _pdf(*self.RESUME))
+        for data in (truncated, broken_tree):
+            response = self._upload(data)
+            self.assertEqual(response.status_code, 422, response.content)
+            self.assertIn('could not be read', response.json()['error'])
+
+    def test_docx_xml_is_read_only_up_to_the_limit(self):
+        from .parsers import ParseError, parse_docx
+        with tempfile.NamedTemporaryFile(suffix='.docx') as handle:
+            handle.write(_docx(['x' * 10000]))
+            handle.flush()
+            with self.assertRaises(ParseError):
+                parse_docx(handle.name, max_pages=10, max_xml_bytes=1000)
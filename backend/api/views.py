@@ -1,3 +1,420 @@
-from django.shortcuts import render
+import asyncio
+import inspect
+import json
+import time
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.db import connection, transaction
+from django.http.multipartparser import MultiPartParserError
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.csrf import csrf_exempt
+from graphene.utils.str_converters import to_camel_case
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, OperationType, execute, get_operation_ast, parse, validate, validate_schema
+from graphql.language.ast import FieldNode
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.utils import get_http_authorization
+
+from .analysis import streaming_setting
+from .auth import apply_response_cookies, cached_token_user
+from .ingestion import ResumeUploadHandler, UploadRejected, ingest_resume, resume_upload_setting
+from .metrics import metrics_status, render_metrics
+from .models import AnalysisJob, GenerationChunk
+from .persisted import (
+    PersistedQueryError,
+    document_cache,
+    persisted_queries_setting,
+    persisted_query_hash,
+    query_hash,
+    response_max_age,
+)
+from .preprocessing import split_sections
+
+TERMINAL_STATUSES = ('COMPLETED', 'FAILED', 'CANCELLED')
+
+# Root query fields whose resolvers have an async ORM path (see `runs_async` in api.schema).
+ASYNC_ROOT_FIELDS = {'job', 'me', '__typename'}
+RESULT_FIELDS = ('analysis_result', 'generated_resume', 'generated_cover_letter')
+
+
+def _sse(event, data, event_id=None):
+    message = f"event: {event}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+async def _job_events(job_id, last_chunk_id):
+    poll_interval = streaming_setting("POLL_INTERVAL")
+    while True:
+        # Read the status before the chunks: once it is terminal, every chunk has been written.
+        status = await AnalysisJob.objects.filter(pk=job_id).values_list('status', flat=True).afirst()
+        chunks = GenerationChunk.objects.filter(job_id=job_id, id__gt=last_chunk_id).order_by('id')
+        async for chunk_id, field, text in chunks.values_list('id', 'field', 'text'):
+            last_chunk_id = chunk_id
+            yield _sse('chunk', {'field': to_camel_case(field), 'text': text}, chunk_id)
+
+        if status is None or status in TERMINAL_STATUSES:
+            job = await AnalysisJob.objects.filter(pk=job_id).values('status', *RESULT_FIELDS).afirst()
+            yield _sse('done', {to_camel_case(key): value for key, value in (job or {}).items()})
+            return
+        await asyncio.sleep(poll_interval)
+
+
+async def stream_job(request, job_id):
+    """
+    Server-sent events for a job: `chunk` events while generations stream, then a single
+    `done` event with the final status and text. Serve through the ASGI application so the
+    connection doesn't hold a thread.
+    """
+    if not await AnalysisJob.objects.filter(pk=job_id).aexists():
+        raise Http404("Analysis job not found.")
+    try:
+        last_chunk_id = int(request.headers.get('Last-Event-ID') or 0)
+    except ValueError:
+        last_chunk_id = 0
+
+    response = StreamingHttpResponse(_job_events(job_id, last_chunk_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _etag(version):
+    return f'"{version}"'
+
+
+async def poll_job(request, job_id):
+    """
+    Long-poll for a job's status. The client sends the version it already has (`?version=N`
+    or `If-None-Match`); the request is held until the job's version moves past it or
+    LONG_POLL_TIMEOUT passes. Answers 200 with `{id, status, version}` when something
+    changed and 304 otherwise; the client then fetches the full job only on a change.
+    """
+    known = request.GET.get('version')
+    if known is None:
+        known = (request.headers.get('If-None-Match') or '').removeprefix('W/').strip('"')
+    try:
+        known = int(known)
+    except ValueError:
+        known = -1
+
+    poll_interval = streaming_setting("POLL_INTERVAL")
+    deadline = time.monotonic() + streaming_setting("LONG_POLL_TIMEOUT")
+    while True:
+        job = await AnalysisJob.objects.filter(pk=job_id).values('status', 'version').afirst()
+        if job is None:
+            raise Http404("Analysis job not found.")
+        if job['version'] != known:
+            break
+        # Terminal jobs won't change again, so there is no point in holding the request.
+        if job['status'] in TERMINAL_STATUSES or time.monotonic() >= deadline:
+            response = HttpResponse(status=304)
+            response['ETag'] = _etag(job['version'])
+            return response
+        await asyncio.sleep(poll_interval)
+
+    response = JsonResponse({'id': str(job_id), 'status': job['status'], 'version': job['version']})
+    response['ETag'] = _etag(job['version'])
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def metrics(request):
+    """
+    This process's metrics in the Prometheus text format (see api.metrics).
+    """
+    status = metrics_status(request.headers.get('Authorization'))
+    if status == 404:
+        raise Http404
+    if status != 200:
+        return HttpResponse(status=status)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# Bytes of multipart framing allowed on top of RESUME_UPLOADS["MAX_BYTES"].
+UPLOAD_OVERHEAD = 64 * 1024
+
+
+def _request_user(request):
+    # A JWT, as for /graphql; a session login (e.g. the admin) works too.
+    if get_http_authorization(request) is not None:
+        try:
+            return authenticate(request=request)
+        except JSONWebTokenError:
+            return None
+    return request.user if request.user.is_authenticated else None
+
+
+@csrf_exempt
+def upload_resume(request):
+    """
+    Accepts a PDF or DOCX resume as the multipart field `file` and answers with its text,
+    its sections and `fileHash`, to pass as createAnalysisJob's `resumeFile`. The body is
+    streamed to a temporary file and cut off at RESUME_UPLOADS["MAX_BYTES"]; text is
+    extracted in the parser process pool, once per distinct file (see api.ingestion).
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    if _request_user(request) is None:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        content_length = 0
+    max_bytes = resume_upload_setting("MAX_BYTES")
+    too_large = JsonResponse({'error': f'Files are limited to {max_bytes // (1024 * 1024)} MB.'}, status=413)
+    if content_length > max_bytes + UPLOAD_OVERHEAD:
+        return too_large
+
+    # Must be set before anything reads the body; CSRF checks would (hence csrf_exempt).
+    handler = ResumeUploadHandler(request)
+    request.upload_handlers = [handler]
+    try:
+        upload = request.FILES.get('file')
+    except MultiPartParserError:
+        upload = None
+    if handler.too_large:
+        return too_large
+    if upload is None:
+        return JsonResponse({'error': 'Send the resume as the multipart field "file".'}, status=400)
+
+    try:
+        resume_file, cached = ingest_resume(upload)
+    except UploadRejected as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    return JsonResponse({
+        'fileHash': resume_file.sha256,
+        'fileType': resume_file.file_type,
+        'pages': resume_file.pages,
+        'text': resume_file.text,
+        'sections': [{'heading': heading, 'text': text} for heading, text in split_sections(resume_file.text)],
+        'cached': cached,
+    })
+
+
+class PersistedGraphQLView(GraphQLView):
+    """
+    GraphQLView with automatic persisted queries and a document cache. Clients may send
+    `extensions.persistedQuery.sha256Hash` instead of the query text (Apollo's protocol,
+    over GET for read queries), and the parsed, validated document of every query is kept
+    in `api.persisted.document_cache`, so a repeated query (e.g. the results page poll)
+    is neither parsed nor validated again.
+
+    GET responses whose root fields were all marked with `api.persisted.mark_cacheable`
+    are public and long-lived for a reverse proxy; other GET responses are `no-cache`.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        # Set by tokenAuth and logout (see api.auth.set_response_cookie).
+        apply_response_cookies(request, response)
+        return self.add_cache_headers(request, response)
+
+    def add_cache_headers(self, request, response):
+        if request.method != 'GET':
+            return response
+        max_age = getattr(request, 'graphql_max_age', None)
+        if max_age is None or response.status_code != 200:
+            patch_cache_control(response, no_cache=True)
+            return response
+        patch_cache_control(response, public=True, max_age=max_age, immutable=True)
+        # ensure_csrf_cookie's cookie would make the response per-client.
+        response.cookies.pop(settings.CSRF_COOKIE_NAME, None)
+        return response
+
+    @staticmethod
+    def format_error(error):
+        if isinstance(error, PersistedQueryError):
+            return {"message": error.message, "extensions": {"code": error.code}}
+        return GraphQLView.format_error(error)
+
+    def get_document(self, request, data, query):
+        """
+        (document, errors) for the request's query, from the document cache when possible.
+        A persisted query sent without its text can only be answered from the cache.
+        """
+        persisted = persisted_query_hash(request, data)
+        if persisted is not None:
+            if not persisted_queries_setting("ENABLED"):
+                raise PersistedQueryError("PersistedQueryNotSupported", "PERSISTED_QUERY_NOT_SUPPORTED")
+            if query and query_hash(query) != persisted:
+                raise HttpError(HttpResponseBadRequest("provided sha does not match query"))
+        key = persisted or query_hash(query)
+        document = document_cache.get(key)
+        if document is not None:
+            return document, []
+        if not query:
+            raise PersistedQueryError("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+
+        try:
+            document = parse(query)
+        except Exception as e:
+            return None, [e]
+        errors = validate(
+            self.schema.graphql_schema, document, self.validation_rules, graphene_settings.MAX_VALIDATION_ERRORS
+        )
+        if not errors:
+            document_cache.set(key, document)
+        return document, errors
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        if not query and persisted_query_hash(request, data) is None:
+            # Nothing to look up: GraphiQL, or the usual "Must provide query string." error.
+            return super().execute_graphql_request(request, data, query, variables, operation_name, show_graphiql)
+        result = self._execute_document(request, data, query, variables, operation_name, show_graphiql)
+        request.graphql_max_age = response_max_age(request, result)
+        return result
+
+    def _execute_document(self, request, data, query, variables, operation_name, show_graphiql):
+        # GraphQLView.execute_graphql_request with parse/validate replaced by get_document.
+        schema = self.schema.graphql_schema
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        document, errors = self.get_document(request, data, query)
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+        if request.method.lower() == "get" and operation_ast is not None and operation_ast.operation != OperationType.QUERY:
+            if show_graphiql:
+                return None
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"], f"Can only perform a {operation_ast.operation.value} operation from a POST request."
+                )
+            )
+
+        try:
+            execute_options = {
+                "root_value": self.get_root_value(request),
+                "context_value": self.get_context(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "middleware": self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options["execution_context_class"] = self.execution_context_class
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            return execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+class AsyncGraphQLView(PersistedGraphQLView):
+    """
+    GraphQLView for the ASGI application. Queries that only select ASYNC_ROOT_FIELDS are
+    executed on the event loop with the async ORM; everything else (mutations, other
+    fields, batches, GraphiQL) runs the regular sync view in a worker thread, unchanged.
+    """
+
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            prepared = self._prepare_async(request)
+        except HttpError:
+            prepared = None
+        if prepared is not None and await self._authenticate_async(request):
+            document, variables, operation_name = prepared
+            result = await self.execute_graphql_request_async(request, document, variables, operation_name)
+            request.graphql_max_age = response_max_age(request, result)
+            content, status_code = self._encode_result(request, result)
+            response = HttpResponse(status=status_code, content=content, content_type="application/json")
+            return self.add_cache_headers(request, response)
+        return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+    def _prepare_async(self, request):
+        """
+        Returns (document, variables, operation_name) when the request can be served on the
+        async path, else None.
+        """
+        if request.method not in ("GET", "POST") or self.batch:
+            return None
+        data = self.parse_body(request)
+        if self.graphiql and self.can_display_graphiql(request, data):
+            return None
+        query, variables, operation_name, _ = self.get_graphql_params(request, data)
+        if not query and persisted_query_hash(request, data) is None:
+            return None
+        document, errors = self.get_document(request, data, query)
+        if errors:
+            return None
+        operation = get_operation_ast(document, operation_name)
+        if operation is None or operation.operation != OperationType.QUERY:
+            return None
+        selections = operation.selection_set.selections
+        if not all(isinstance(node, FieldNode) and node.name.value in ASYNC_ROOT_FIELDS for node in selections):
+            return None
+        return document, variables, operation_name
+
+    async def _authenticate_async(self, request):
+        """
+        Resolves the user up front, so that the JWT middleware has nothing left to do
+        synchronously during execution. False when the token doesn't authenticate; the sync
+        view then produces the usual error.
+        """
+        request.user = await request.auser()
+        token = get_http_authorization(request)
+        if request.user.is_anonymous and token is not None:
+            try:
+                # A cached token needs neither a thread nor a query.
+                user = cached_token_user(token) or await sync_to_async(authenticate)(request=request)
+            except JSONWebTokenError:
+                return False
+            if user is None:
+                return False
+            request.user = user
+        request.graphql_async = True
+        return True
+
+    async def execute_graphql_request_async(self, request, document, variables, operation_name):
+        # `document` comes from get_document, already validated.
+        try:
+            result = execute(
+                self.schema.graphql_schema,
+                document,
+                root_value=self.get_root_value(request),
+                context_value=self.get_context(request),
+                variable_values=variables,
+                operation_name=operation_name,
+                middleware=self.get_middleware(request),
+            )
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    def _encode_result(self, request, result):
+        # Same response shape and status codes as GraphQLView.get_response.
+        response = {}
+        status_code = 200
+        if result.errors:
+            response["errors"] = [self.format_error(e) for e in result.errors]
+        if result.errors and any(not getattr(e, "path", None) for e in result.errors):
+            status_code = 400
+        else:
+            response["data"] = result.data
+        return self.json_encode(request, response), status_code
@@ -2,6 +2,11 @@
 ASGI config for resumeforge_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Streaming endpoints (``/jobs/<id>/stream``) are async views and should be served
+through this entry point, e.g. ``uvicorn resumeforge_backend.asgi:application`` or
+``gunicorn resumeforge_backend.asgi:application -k uvicorn.workers.UvicornWorker``.
+``/graphql`` is served by the async GraphQL view here (see GRAPHQL_ASYNC), so a single
+worker process can hold many in-flight requests.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -12,5 +17,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'resumeforge_backend.settings')
+os.environ.setdefault('GRAPHQL_ASYNC', 'True')
 
 application = get_asgi_application()
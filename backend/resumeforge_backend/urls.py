@@ -1,12 +1,19 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenVerifyView
+from api.views import AsyncGraphQLView, PersistedGraphQLView, metrics, poll_job, stream_job, upload_resume
+
+graphql_view = AsyncGraphQLView if settings.GRAPHQL_ASYNC else PersistedGraphQLView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('graphql', csrf_exempt(graphql_view.as_view(graphiql=True))),
+    path('jobs/<uuid:job_id>/stream', stream_job, name='job_stream'),
+    path('jobs/<uuid:job_id>/poll', poll_job, name='job_poll'),
+    path('metrics', metrics, name='metrics'),
+    path('resumes/upload', upload_resume, name='resume_upload'),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
@@ -4,9 +4,13 @@ import { useEffect } from 'react';
 import { useParams } from 'next/navigation';
 import { useQuery } from '@apollo/client/react';
 import { GET_ANALYSIS_JOB, GET_ME } from '@/lib/queries';
+import { API_BASE_URL } from '@/lib/apollo';
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { Skeleton } from "@/components/ui/skeleton";
 
+// Statuses a job never leaves; the poll endpoint answers these immediately.
+const TERMINAL_STATUSES = ['COMPLETED', 'FAILED', 'CANCELLED'];
+
 export default function ResultsPage() {
   const params = useParams();
   const jobId = params.job_id as string;
@@ -14,16 +18,39 @@ export default function ResultsPage() {
   const { data: userData, loading: userLoading } = useQuery(GET_ME);
   const isPremium = (userData as any)?.me?.isPremium || false;
 
-  const { data, loading, error, startPolling, stopPolling } = useQuery(GET_ANALYSIS_JOB, {
+  const { data, loading, error, refetch } = useQuery(GET_ANALYSIS_JOB, {
     variables: { id: jobId },
-    pollInterval: 2000, // Poll every 2 seconds
   });
 
+  const jobStatus = (data as any)?.job?.status;
+  const jobVersion = (data as any)?.job?.version;
+
+  // Long-poll for status changes and only refetch the (large) job when its version moves.
   useEffect(() => {
-    if ((data as any)?.job?.status === 'COMPLETED' || (data as any)?.job?.status === 'FAILED') {
-      stopPolling();
+    if (jobVersion === undefined || TERMINAL_STATUSES.includes(jobStatus)) {
+      return;
     }
-  }, [data, stopPolling]);
+    const controller = new AbortController();
+    const waitForChange = async () => {
+      try {
+        const res = await fetch(`${API_BASE_URL}/jobs/${jobId}/poll?version=${jobVersion}`, {
+          signal: controller.signal,
+        });
+        if (res.status === 200) {
+          await refetch();
+        } else if (res.status === 304) {
+          waitForChange();
+        }
+      } catch (err) {
+        if (!controller.signal.aborted) {
+          // Back off briefly on network errors before trying again.
+          setTimeout(waitForChange, 2000);
+        }
+      }
+    };
+    waitForChange();
+    return () => controller.abort();
+  }, [jobId, jobStatus, jobVersion, refetch]);
 
   if (loading && !data) {
     return (
@@ -82,6 +109,17 @@ export default function ResultsPage() {
           <CardTitle>Analysis Job Status: {job.status}</CardTitle>
         </CardHeader>
         <CardContent>
+          {job.atsScore && (
+            <div className="mb-6">
+              <h2 className="text-xl font-semibold mb-2">ATS Match Score: {job.atsScore.score}/100</h2>
+              {job.atsScore.missingSkills.length > 0 && (
+                <p className="mb-1">Missing skills: {job.atsScore.missingSkills.join(', ')}</p>
+              )}
+              {job.atsScore.missingKeywords.length > 0 && (
+                <p className="text-sm text-gray-600">Missing keywords: {job.atsScore.missingKeywords.join(', ')}</p>
+              )}
+            </div>
+          )}
           {job.status === 'COMPLETED' && (
             <div>
               <h2 className="text-xl font-semibold mb-2">Analysis Result:</h2>
@@ -118,6 +156,9 @@ export default function ResultsPage() {
           {job.status === 'FAILED' && (
             <p className="text-red-500">The analysis job failed. Please try again.</p>
           )}
+          {job.status === 'CANCELLED' && (
+            <p className="text-gray-600">The analysis job was cancelled.</p>
+          )}
         </CardContent>
       </Card>
     </div>
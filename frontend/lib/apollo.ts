@@ -1,12 +1,24 @@
 import { ApolloClient, InMemoryCache, createHttpLink, from, Observable, FetchResult } from "@apollo/client";
 import { setContext } from "@apollo/client/link/context";
 import { onError } from "@apollo/client/link/error";
+import { createPersistedQueryLink } from "@apollo/client/link/persisted-queries";
 import { useAuthStore } from "./authStore";
 
+export const API_BASE_URL = "https://resumeforgeai-zawv.onrender.com";
+
 const httpLink = createHttpLink({
-  uri: "https://resumeforgeai-zawv.onrender.com/graphql",
+  uri: `${API_BASE_URL}/graphql`,
 });
 
+// Queries are sent as their SHA-256 hash (GET, so finished jobs can be served from a cache);
+// the server asks for the full text the first time it sees a hash.
+const sha256 = async (query: string): Promise<string> => {
+  const digest = await crypto.subtle.digest("SHA-256", new TextEncoder().encode(query));
+  return Array.from(new Uint8Array(digest), (byte) => byte.toString(16).padStart(2, "0")).join("");
+};
+
+const persistedQueryLink = createPersistedQueryLink({ sha256, useGETForHashedQueries: true });
+
 const authLink = setContext((_, { headers }) => {
   const { accessToken } = useAuthStore.getState();
   return {
@@ -74,7 +86,7 @@ const errorLink = onError(
 );
 
 const client = new ApolloClient({
-  link: from([errorLink, authLink, httpLink]),
+  link: from([errorLink, authLink, persistedQueryLink, httpLink]),
   cache: new InMemoryCache(),
 });
 
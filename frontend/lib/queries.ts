@@ -9,6 +9,12 @@ export const GET_ANALYSIS_JOB = gql`
       generatedResume
       generatedCoverLetter
       createdAt
+      version
+      atsScore {
+        score
+        missingSkills
+        missingKeywords
+      }
     }
   }
 `;